@@ -0,0 +1,129 @@
+"""
+エンドポイントごとの同時実行数の制限（アドミッション制御）。
+
+DBが遅くなると同期エンドポイントの処理がスレッドプールに溜まり、接続プールを使い切って
+軽い商品検索まで待たされます。ルートごとに同時実行数の上限と待ち行列の長さ・待ち時間の上限を設け、
+超えたリクエストは処理を始める前に 503 (Retry-After 付き) で断ります。
+
+待機はイベントループ上で行うため、待っている間はスレッドプールのスレッドもDB接続も使いません。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from contextlib import suppress
+
+from fastapi import HTTPException
+
+
+class Overloaded(Exception):
+  """同時実行数と待ち行列が上限に達しているか、待ち時間の上限を超えた"""
+
+
+class AdmissionLimiter:
+  """
+  同時実行数の上限付きの待ち行列（先着順）。
+
+  Args:
+    name: 制限の名前（監視用）
+    max_concurrent: 同時に処理するリクエスト数の上限
+    max_queue: 処理待ちにできるリクエスト数の上限（超えた分は即座に断る）
+    queue_timeout: 処理待ちの最大秒数（超えたら断る）
+  """
+
+  def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+    self.name = name
+    self.max_concurrent = max_concurrent
+    self.max_queue = max_queue
+    self.queue_timeout = queue_timeout
+    self.active = 0
+    self._waiters: deque[asyncio.Future[None]] = deque()
+    self.admitted = 0
+    self.rejected = 0
+    self.timed_out = 0
+
+  @property
+  def queued(self) -> int:
+    return len(self._waiters)
+
+  async def acquire(self) -> None:
+    if self.active < self.max_concurrent and not self._waiters:
+      self.active += 1
+      self.admitted += 1
+      return
+    if len(self._waiters) >= self.max_queue:
+      self.rejected += 1
+      raise Overloaded(f"{self.name}: 待ち行列が上限 ({self.max_queue}) に達しています")
+
+    waiter = asyncio.get_running_loop().create_future()
+    self._waiters.append(waiter)
+    try:
+      await asyncio.wait_for(waiter, self.queue_timeout)
+    except (TimeoutError, asyncio.CancelledError) as e:
+      with suppress(ValueError):
+        self._waiters.remove(waiter)
+      # 枠を譲られた直後に打ち切られた場合は、その枠を次の待機者へ回す
+      if waiter.done() and not waiter.cancelled():
+        self.release()
+      if isinstance(e, asyncio.CancelledError):
+        raise
+      self.timed_out += 1
+      raise Overloaded(f"{self.name}: 待ち時間が上限 ({self.queue_timeout}秒) を超えました") from e
+    self.admitted += 1
+
+  def release(self) -> None:
+    # 待機中のリクエストがあれば、枠をそのまま渡す（active は変えない）
+    while self._waiters:
+      waiter = self._waiters.popleft()
+      if not waiter.done():
+        waiter.set_result(None)
+        return
+    self.active -= 1
+
+  def stats(self) -> dict:
+    return {
+      "max_concurrent": self.max_concurrent,
+      "max_queue": self.max_queue,
+      "queue_timeout_seconds": self.queue_timeout,
+      "active": self.active,
+      "queued": self.queued,
+      "admitted": self.admitted,
+      "rejected": self.rejected,
+      "timed_out": self.timed_out,
+    }
+
+
+def limiter_from_env(name: str, max_concurrent: int, max_queue: int, queue_timeout: float) -> AdmissionLimiter:
+  """ADMISSION_<NAME>_CONCURRENCY / _QUEUE / _QUEUE_SECONDS で上書きできる制限を作る。"""
+  prefix = f"ADMISSION_{name.upper()}"
+  return AdmissionLimiter(
+    name,
+    max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrent))),
+    max_queue=int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+    queue_timeout=float(os.getenv(f"{prefix}_QUEUE_SECONDS", str(queue_timeout))),
+  )
+
+
+def admission(limiter: AdmissionLimiter, retry_after: int = 1):
+  """
+  ルートの dependencies に指定する依存関数を返す。
+  上限を超えた場合は 503 Service Unavailable と Retry-After を返す。
+  """
+
+  async def _admit():
+    try:
+      await limiter.acquire()
+    except Overloaded as e:
+      raise HTTPException(
+        status_code=503,
+        detail="混雑しているため処理できませんでした。しばらくしてから再度お試しください。",
+        headers={"Retry-After": str(retry_after)},
+      ) from e
+    try:
+      yield
+    finally:
+      limiter.release()
+
+  return _admit
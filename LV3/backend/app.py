@@ -1,22 +1,120 @@
 # database.pyからモデル定義とDBセッション取得関数をインポート
-from datetime import datetime
+import asyncio
+import base64
+import json
+import os
+from collections import defaultdict
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import date, datetime, timedelta
 from math import floor
 
 import database
+import ean13
+from admission import admission, limiter_from_env
+from barcode_image import RENDER_VERSION, barcode_cache_control, barcode_etag, render_ean13_png
+from cache import LRUCache
+from catalog import Catalog, CatalogChange
+from catalog_export import EXPORT_FORMATS, EXPORT_TABLES, build_export_query, export_stream
+from deadline import DeadlineExceeded, RouteDeadline, install_statement_timeouts
 from database import (
+  CartQuoteLine,
+  CartQuoteResponse,
   PurchaseRequest,
   PurchaseResponse,
+  ReceiptItem,
+  ReceiptResponse,
   Transaction,
+  TransactionArchive,
   TransactionDetail,
+  TransactionDetailArchive,
+  TransactionListItem,
+  TransactionListResponse,
   get_db,
+  get_read_db,
 )
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session  # noqa: TC002
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from inventory import InsufficientStockError, decrement_stock
+from product_resolution import resolve_product, resolve_products
+from singleflight import SingleFlight
+from sqlalchemy import Row, and_, func, or_, select, union_all
+from sqlalchemy.orm import Session, joinedload  # noqa: TC002
 
 # --- FastAPIアプリケーションの初期化 ---
 app = FastAPI()
 
+# 消費税率と税額計算（四捨五入相当）
+TAX_RATE = 0.10
+
+
+def calculate_tax(total_without_tax: int, tax_rate: float = TAX_RATE) -> int:
+  """税抜合計に対する税額を計算する（floor(total * rate + 0.5)）。"""
+  return floor(total_without_tax * tax_rate + 0.5)
+
+
+# 確定済みの取引（レシート）は変更されないため、初回取得後はメモリに保持する
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPT_CACHE_SIZE", "1024"))
+receipt_cache = LRUCache(maxsize=RECEIPT_CACHE_SIZE)
+
+# 商品カタログのメモリ上スナップショット（カート見積りなどの読み取り専用処理で使用）
+catalog = Catalog()
+
+# 同じ商品コードの同時検索は1回のクエリにまとめる（開店直後やカタログ更新直後の集中対策）
+product_lookups: SingleFlight[Row | None] = SingleFlight()
+
+# ルートごとの同時実行数の制限（購入処理が詰まっても商品検索は処理できるよう、別々の枠を持つ）
+# DB接続プールはデフォルトで最大15接続（pool_size=5 + max_overflow=10）
+admission_limiters = {
+  "purchases": limiter_from_env("purchases", max_concurrent=8, max_queue=32, queue_timeout=2.0),
+  "products": limiter_from_env("products", max_concurrent=16, max_queue=64, queue_timeout=0.5),
+  "exports": limiter_from_env("exports", max_concurrent=2, max_queue=2, queue_timeout=5.0),
+}
+
+# ルートごとの処理期限（秒）。期限までの残り時間をDBのステートメントタイムアウトとして適用する
+install_statement_timeouts()
+route_deadlines = {
+  "products": RouteDeadline("products", 2.0),
+  "products_with_local": RouteDeadline("products_with_local", 30.0),
+  "purchases": RouteDeadline("purchases", 5.0),
+  "purchase_history": RouteDeadline("purchase_history", 10.0),
+  "receipt": RouteDeadline("receipt", 2.0),
+  "cart_quote": RouteDeadline("cart_quote", 5.0),
+}
+
+
+@app.exception_handler(DeadlineExceeded)
+def handle_deadline_exceeded(request: Request, exc: DeadlineExceeded):  # noqa: ARG001
+  return JSONResponse(status_code=504, content={"detail": "処理時間の上限を超えました。しばらくしてから再度お試しください。"})
+
+
+# 商品情報レスポンスのキャッシュ有効期間（秒）。CDN (Azure Front Door) とブラウザがこの期間キャッシュする
+PRODUCT_CACHE_MAX_AGE = int(os.getenv("PRODUCT_CACHE_MAX_AGE", "60"))
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "60"))
+
+# 変更フィードがカタログの変更を確認する間隔と、接続維持用のコメントを送る間隔（秒）
+CATALOG_FEED_POLL_SECONDS = float(os.getenv("CATALOG_FEED_POLL_SECONDS", "0.5"))
+CATALOG_FEED_HEARTBEAT_SECONDS = float(os.getenv("CATALOG_FEED_HEARTBEAT_SECONDS", "15"))
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+  """If-None-Match ヘッダが ETag に一致するか（弱い比較。複数指定と "*" に対応）。"""
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def catalog_cache_headers(db: Session, max_age: int) -> dict[str, str]:
+  """
+  商品カタログのバージョンから決まるキャッシュヘッダを返す。
+  カタログが確認間隔内であればDBには問い合わせない。
+  """
+  catalog.ensure_fresh(db)
+  return {"ETag": f'"{catalog.etag}"', "Cache-Control": f"public, max-age={max_age}"}
+
 # --- CORS (Cross-Origin Resource Sharing) ミドルウェアの設定 ---
 # フロントエンド(Next.js)が http://localhost:3000 から
 # バックエンド(FastAPI)の http://localhost:8000 へアクセスするのを許可します。
@@ -42,20 +140,31 @@ app.add_middleware(
 # "/api/v1/products/{product_id}" は、このAPIのURLパスです。
 # {product_id} は、URLの一部として渡される動的な値（パスパラメータ）です。
 # response_model=database.ProductSchema は、このAPIが返すJSONの形式を定義します。
-@app.get("/api/v1/products/{product_id}", response_model=database.ProductSchema)
-def get_product(product_id: str, db: Session = Depends(get_db)):  # noqa: B008, FAST002
+@app.get(
+  "/api/v1/products/{product_id}",
+  response_model=database.ProductSchema,
+  dependencies=[Depends(route_deadlines["products"]), Depends(admission(admission_limiters["products"]))],
+)
+def get_product(
+  product_id: str,
+  response: Response,
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+  if_none_match: str | None = Header(None),
+):
   """
   指定された商品コードに基づいて、商品を検索するAPI。
-  まず商品マスタを検索し、見つからなければローカル拡張マスタを検索する。
+  商品マスタとローカル拡張マスタを1回のクエリで検索し、商品マスタを優先する。
+  ETagは商品カタログのバージョンから決まり、If-None-Match が一致すればDBを参照せずに304を返す。
+  カタログのブルームフィルタで確実に未登録と分かる商品コード（会員カード・クーポンなど）は、商品を検索せずに404を返す。
   """
   print(f"商品コード検索: {product_id}")  # 動作確認用のログ
 
-  # 1. まずは通常の商品マスタ (productsテーブル) を検索
-  product = db.query(database.Product).filter(database.Product.product_id == product_id).first()
+  headers = catalog_cache_headers(db, PRODUCT_CACHE_MAX_AGE)
+  if etag_matches(if_none_match, headers["ETag"]):
+    return Response(status_code=304, headers=headers)
 
-  # 2. もし商品マスタに見つからなければ、ローカル拡張マスタ (local_productsテーブル) を検索
-  if not product:
-    product = db.query(database.LocalProduct).filter(database.LocalProduct.product_id == product_id).first()
+  # 1-2. 商品マスタ → ローカル拡張マスタの優先順で検索（UNION ALL の1クエリ）
+  product = lookup_product(db, product_id)
 
   # 3. どちらのテーブルにも商品が見つからなかった場合
   if not product:
@@ -64,28 +173,115 @@ def get_product(product_id: str, db: Session = Depends(get_db)):  # noqa: B008,
 
   # 4. 商品が見つかった場合は、その情報を返す
   # (FastAPIが自動でProductSchemaの形式に変換してJSONで返してくれます)
+  response.headers.update(headers)
   return product
 
 
-@app.post("/api/v1/purchases", response_model=PurchaseResponse)
+def lookup_product(db: Session, product_id: str) -> Row | None:
+  """
+  商品コードから商品を解決する（商品検索APIとスキャン用WebSocketで共通）。
+  ブルームフィルタで確実に未登録と分かる商品コードは商品を検索しない（フィルタの作成後に書き込まれた商品があれば検索する）。
+  同じ商品コードを検索中のリクエストがあれば、クエリを発行せずにその結果を受け取る。
+  """
+  if catalog.definitely_absent(db, product_id):
+    return None
+  return product_lookups.do(product_id, lambda: resolve_product(db, product_id))
+
+
+def scan_reply(db: Session, message: dict) -> dict:
+  """スキャン用WebSocketの1メッセージを処理し、同じ id を付けた応答を返す。"""
+  request_id = message.get("id")
+  product_id = message.get("product_id")
+  if not isinstance(product_id, str) or not product_id:
+    return {"id": request_id, "status": 400, "detail": "product_id を指定してください"}
+
+  try:
+    catalog.ensure_fresh(db)
+    product = lookup_product(db, product_id)
+  finally:
+    # 次のスキャンまで接続を保持しない
+    db.close()
+  if product is None:
+    return {"id": request_id, "status": 404, "detail": "商品が見つかりません"}
+  return {"id": request_id, "status": 200, "product": database.ProductSchema.model_validate(product).model_dump()}
+
+
+@app.websocket("/api/v1/scan")
+async def scan_products(
+  websocket: WebSocket,
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+):
+  """
+  バーコードスキャン用のWebSocket。
+  レジは接続を開いたまま {"id": 任意の値, "product_id": "JANコード"} を送り、
+  同じ id を付けた {"id", "status", "product"} または {"id", "status", "detail"} を受け取る。
+  応答を待たずに続けて送信でき（パイプライン）、応答は受信順に返す。
+  """
+  await websocket.accept()
+  try:
+    while True:
+      try:
+        message = await websocket.receive_json()
+      except json.JSONDecodeError:
+        await websocket.send_json({"id": None, "status": 400, "detail": "JSON形式で送信してください"})
+        continue
+      if not isinstance(message, dict):
+        await websocket.send_json({"id": None, "status": 400, "detail": "JSON形式で送信してください"})
+        continue
+      await websocket.send_json(await run_in_threadpool(scan_reply, db, message))
+  except WebSocketDisconnect:
+    pass
+
+
+@app.get("/api/v1/products/{product_id}/barcode.png")
+def get_product_barcode(
+  product_id: str,
+  dpi: int = Query(300, ge=72, le=600),
+  text: bool = True,  # noqa: FBT001, FBT002
+  v: str | None = None,
+  if_none_match: str | None = Header(None),
+):
+  """
+  商品コード (JAN) のEAN-13バーコード画像をPNGで返すAPI。
+  画像はメモリ上で生成してLRUキャッシュに保持する。
+  URLに現在の描画バージョン (v) を含む場合だけ immutable で返し、それ以外はETagで再検証させる。
+  """
+  if not ean13.validate([product_id])[0]:
+    raise HTTPException(status_code=400, detail=f"EAN-13として不正な商品コードです: {product_id}")
+
+  etag = barcode_etag(product_id, dpi, text)
+  headers = {"ETag": etag, "Cache-Control": barcode_cache_control(v), "X-Barcode-Render-Version": RENDER_VERSION}
+  if etag_matches(if_none_match, etag):
+    return Response(status_code=304, headers=headers)
+
+  return Response(content=render_ean13_png(product_id, dpi, text), media_type="image/png", headers=headers)
+
+
+@app.post(
+  "/api/v1/purchases",
+  response_model=PurchaseResponse,
+  dependencies=[Depends(route_deadlines["purchases"]), Depends(admission(admission_limiters["purchases"]))],
+)
 def create_purchase(payload: PurchaseRequest, db: Session = Depends(get_db)):  # noqa: B008, FAST002
   """購入処理API: 商品コードと数量のリストを受け取り取引を確定する。"""
-  tax_rate = 0.10
+  tax_rate = TAX_RATE
   if not payload.items:
     raise HTTPException(status_code=400, detail="リクエストが無効です。itemsが空です。")
 
   total_without_tax = 0
   details: list[TransactionDetail] = []
+  # 在庫の引き当て数量 {(店舗ID, 商品コード): 数量}（同じ商品は合算）
+  requested_stock: defaultdict[tuple[str, str], int] = defaultdict(int)
 
   for item in payload.items:
     if item.quantity <= 0:
       raise HTTPException(status_code=400, detail=f"リクエストが無効です。数量が不正: {item.quantity}")
 
-    # 商品検索 (通常→ローカル)
-    product = (db.query(database.Product).filter(database.Product.product_id == item.product_id).first()) or (
-      db.query(database.LocalProduct).filter(database.LocalProduct.product_id == item.product_id).first()
-    )
+  # 商品検索 (通常→ローカル): 全明細の商品コードを1回のクエリで解決
+  products = resolve_products(db, [item.product_id for item in payload.items])
 
+  for item in payload.items:
+    product = products.get(item.product_id)
     if not product:
       raise HTTPException(
         status_code=400,
@@ -94,6 +290,9 @@ def create_purchase(payload: PurchaseRequest, db: Session = Depends(get_db)):  #
 
     line_total = product.price * item.quantity
     total_without_tax += line_total
+    # ローカル拡張マスタの商品はその店舗の在庫、通常マスタの商品はリクエストの店舗の在庫から引き当てる
+    stock_store_id = product.store_id if product.is_local else payload.store_id
+    requested_stock[(stock_store_id, product.product_id)] += item.quantity
     details.append(
       TransactionDetail(
         product_id=product.product_id,
@@ -103,6 +302,12 @@ def create_purchase(payload: PurchaseRequest, db: Session = Depends(get_db)):  #
       ),
     )
 
+  # 在庫を1本のUPDATE文で一括減算（不足があれば取引全体を確定しない）
+  try:
+    decrement_stock(db, requested_stock)
+  except InsufficientStockError as e:
+    raise HTTPException(status_code=409, detail=f"在庫が不足しています: {e}") from e
+
   # 取引ヘッダ保存
   transaction = Transaction(total_price=total_without_tax, transaction_code=None)
   db.add(transaction)
@@ -116,7 +321,7 @@ def create_purchase(payload: PurchaseRequest, db: Session = Depends(get_db)):  #
   db.commit()
 
   # レスポンス用計算
-  tax_amount = floor(total_without_tax * tax_rate + 0.5)
+  tax_amount = calculate_tax(total_without_tax, tax_rate)
   total_with_tax = total_without_tax + tax_amount
 
   # 簡易トランザクションID生成 & 永続化
@@ -136,41 +341,343 @@ def create_purchase(payload: PurchaseRequest, db: Session = Depends(get_db)):  #
   )
 
 
-@app.get("/api/v1/products-with-local")
-def get_products_with_local(db: Session = Depends(get_db)):  # noqa: B008, FAST002
+def encode_cursor(created_at: datetime, transaction_id: int) -> str:
+  """キーセットページングのカーソル（最後に返した行の created_at, id）を文字列化する。"""
+  raw = json.dumps([created_at.isoformat(), transaction_id]).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+  try:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    created_at, transaction_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(transaction_id)
+  except (ValueError, TypeError) as e:
+    raise HTTPException(status_code=400, detail="cursorが不正です") from e
+
+
+@app.get(
+  "/api/v1/purchases",
+  response_model=TransactionListResponse,
+  dependencies=[Depends(route_deadlines["purchase_history"])],
+)
+def list_purchases(  # noqa: PLR0913
+  limit: int = Query(50, ge=1, le=200),
+  cursor: str | None = None,
+  date_from: date | None = None,
+  date_to: date | None = None,
+  min_total: int | None = None,
+  max_total: int | None = None,
+  include_summary: bool = False,  # noqa: FBT001, FBT002
+  include_archive: bool = False,  # noqa: FBT001, FBT002
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+):
+  """
+  取引履歴を新しい順に返すAPI。
+  (created_at, id) のキーセットページングのため、何ページ目でも同じコストで取得できる。
+  include_summary=true の場合、明細行数と数量合計を同じクエリ内のサブクエリで集計する。
+  include_archive=true の場合、アーカイブ済みの取引も含める（各テーブルから limit+1 件ずつ取得して併合する）。
+  """
+
+  def page_query(header, detail):
+    columns = [header.id, header.transaction_code, header.total_price, header.created_at]
+    if include_summary:
+      columns += [
+        select(func.count(detail.id)).where(detail.transaction_id == header.id).scalar_subquery().label("line_count"),
+        select(func.coalesce(func.sum(detail.quantity), 0))
+        .where(detail.transaction_id == header.id)
+        .scalar_subquery()
+        .label("item_quantity"),
+      ]
+    stmt = select(*columns)
+
+    if cursor is not None:
+      cursor_created_at, cursor_id = decode_cursor(cursor)
+      stmt = stmt.where(
+        or_(
+          header.created_at < cursor_created_at,
+          and_(header.created_at == cursor_created_at, header.id < cursor_id),
+        ),
+      )
+    if date_from is not None:
+      stmt = stmt.where(header.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+      stmt = stmt.where(header.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if min_total is not None:
+      stmt = stmt.where(header.total_price >= min_total)
+    if max_total is not None:
+      stmt = stmt.where(header.total_price <= max_total)
+    # 1件多く取得して次ページの有無を判定する
+    return stmt.order_by(header.created_at.desc(), header.id.desc()).limit(limit + 1)
+
+  stmt = page_query(Transaction, TransactionDetail)
+  if include_archive:
+    # 各テーブルの (created_at, id) インデックスで上位 limit+1 件ずつ取り出し、併合して並べ直す
+    merged = union_all(
+      select(stmt.subquery()),
+      select(page_query(TransactionArchive, TransactionDetailArchive).subquery()),
+    ).subquery()
+    stmt = select(merged).order_by(merged.c.created_at.desc(), merged.c.id.desc()).limit(limit + 1)
+
+  rows = db.execute(stmt).all()
+  has_next = len(rows) > limit
+  rows = rows[:limit]
+
+  items = [TransactionListItem(**row._mapping) for row in rows]
+  next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_next else None
+  return TransactionListResponse(items=items, next_cursor=next_cursor)
+
+
+@app.get(
+  "/api/v1/purchases/{transaction_code}",
+  response_model=ReceiptResponse,
+  dependencies=[Depends(route_deadlines["receipt"])],
+)
+def get_purchase(transaction_code: str, db: Session = Depends(get_db)):  # noqa: B008, FAST002
+  """
+  取引コードを指定して確定済みの取引（レシート）を取得するAPI。
+  取引ヘッダと明細を1回のクエリ（JOIN）で取得し、結果はキャッシュする。
+  購入直後のレシート表示でレプリカの反映遅延に当たらないよう、プライマリから読む。
+  """
+  cached = receipt_cache.get(transaction_code)
+  if cached is not None:
+    return cached
+
+  # transaction_code のユニークインデックスで検索し、明細は JOIN で同時に読み込む
+  # 見つからなければアーカイブ済みの取引を検索する
+  for model in (Transaction, TransactionArchive):
+    stmt = select(model).options(joinedload(model.details)).where(model.transaction_code == transaction_code)
+    transaction = db.execute(stmt).unique().scalar_one_or_none()
+    if transaction is not None:
+      break
+  else:
+    raise HTTPException(status_code=404, detail="取引が見つかりません")
+
+  items = [
+    ReceiptItem(
+      product_id=d.product_id,
+      product_name=d.product_name,
+      unit_price=d.unit_price,
+      quantity=d.quantity,
+      line_total=d.unit_price * d.quantity,
+    )
+    for d in sorted(transaction.details, key=lambda d: d.id)
+  ]
+  tax_amount = calculate_tax(transaction.total_price)
+  receipt = ReceiptResponse(
+    transaction_code=transaction.transaction_code,
+    created_at=transaction.created_at,
+    total_price_without_tax=transaction.total_price,
+    tax_amount=tax_amount,
+    total_price_with_tax=transaction.total_price + tax_amount,
+    tax_rate=TAX_RATE,
+    items_count=len(items),
+    items=items,
+  )
+  receipt_cache.set(transaction_code, receipt)
+  return receipt
+
+
+@app.post(
+  "/api/v1/cart/quote",
+  response_model=CartQuoteResponse,
+  dependencies=[Depends(route_deadlines["cart_quote"])],
+)
+def quote_cart(payload: PurchaseRequest, db: Session = Depends(get_read_db)):  # noqa: B008, FAST002
+  """
+  カート見積りAPI: 購入処理と同じ規則で明細金額・税抜合計・税額・税込合計を計算する。
+  メモリ上の商品カタログを参照し、取引の書き込みは行わない。
+  """
+  if not payload.items:
+    raise HTTPException(status_code=400, detail="リクエストが無効です。itemsが空です。")
+
+  catalog.ensure_fresh(db)
+  products = catalog.get_many([item.product_id for item in payload.items])
+  lines: list[CartQuoteLine] = []
+  for item, product in zip(payload.items, products, strict=True):
+    if item.quantity <= 0:
+      raise HTTPException(status_code=400, detail=f"リクエストが無効です。数量が不正: {item.quantity}")
+    if product is None:
+      raise HTTPException(
+        status_code=400,
+        detail=f"リクエストが無効です。商品コード '{item.product_id}' は存在しません。",
+      )
+    lines.append(
+      CartQuoteLine(
+        product_id=product.product_id,
+        product_name=product.product_name,
+        unit_price=product.price,
+        quantity=item.quantity,
+        line_total=product.price * item.quantity,
+      ),
+    )
+
+  subtotal = sum(line.line_total for line in lines)
+  tax_amount = calculate_tax(subtotal)
+  return CartQuoteResponse(
+    lines=lines,
+    subtotal=subtotal,
+    tax_amount=tax_amount,
+    total=subtotal + tax_amount,
+    tax_rate=TAX_RATE,
+    items_count=len(lines),
+  )
+
+
+@app.get("/api/v1/products-with-local", dependencies=[Depends(route_deadlines["products_with_local"])])
+def get_products_with_local(
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+  if_none_match: str | None = Header(None),
+  accept_encoding: str | None = Header(None),
+):
   """
   商品マスタとローカル拡張マスタを結合して全商品を取得するAPI。
+  レスポンスはカタログの再読み込み時にエンコード・圧縮済みのバイト列をそのまま返す。
+  ETagは商品カタログのバージョンから決まり、If-None-Match が一致すればDBを参照せずに304を返す。
   """
   try:
-    # 商品マスタから全商品を取得
-    products = db.query(database.Product).all()
-
-    # ローカル拡張マスタから全商品を取得
-    local_products = db.query(database.LocalProduct).all()
-
-    # 結果リストを作成（通常商品 + ローカル商品）
-    result = [
-      {
-        "PRD_ID": p.product_id,
-        "PRD_NAME": p.product_name,
-        "PRD_PRICE": p.price,
-        "LOCAL_PRD_NAME": None,
-        "DISPLAY_ORDER": None,
-        "IS_LOCAL": False,
-      }
-      for p in products
-    ] + [
-      {
-        "PRD_ID": lp.product_id,
-        "PRD_NAME": lp.product_name,
-        "PRD_PRICE": lp.price,
-        "LOCAL_PRD_NAME": lp.product_name,
-        "DISPLAY_ORDER": None,
-        "IS_LOCAL": True,
-      }
-      for lp in local_products
-    ]
+    headers = catalog_cache_headers(db, CATALOG_CACHE_MAX_AGE)
+  except DeadlineExceeded:
+    raise
   except Exception as e:
     raise HTTPException(status_code=500, detail=str(e)) from e
+
+  # 連番 → スナップショットの順に読む（変更フィードをこの連番から再開すれば取りこぼしがない）
+  headers["X-Catalog-Sequence"] = catalog.event_id(catalog.sequence)
+  body, encoding = catalog.snapshot.select(accept_encoding)
+  headers["Vary"] = "Accept-Encoding"
+  if encoding:
+    # 圧縮形式ごとに本文が異なるため、ETagも区別する
+    headers["ETag"] = f'"{catalog.etag}-{encoding}"'
+    headers["Content-Encoding"] = encoding
+  if etag_matches(if_none_match, headers["ETag"]):
+    headers.pop("Content-Encoding", None)
+    return Response(status_code=304, headers=headers)
+
+  return Response(content=body, media_type="application/json", headers=headers)
+
+
+def format_sse(event: str, data: dict, event_id: str | None = None) -> str:
+  """Server-Sent Events の1イベント分の文字列を作る。"""
+  lines = [f"event: {event}"]
+  if event_id is not None:
+    lines.append(f"id: {event_id}")
+  lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+  return "\n".join(lines) + "\n\n"
+
+
+def format_change(change: CatalogChange) -> str:
+  if change.entry is None:
+    data = {"PRD_ID": change.product_id}
   else:
-    return {"products": result}
+    data = {
+      "PRD_ID": change.product_id,
+      "PRD_NAME": change.entry.product_name,
+      "PRD_PRICE": change.entry.price,
+      "IS_LOCAL": change.entry.is_local,
+    }
+  return format_sse(change.op, data, catalog.event_id(change.sequence))
+
+
+async def catalog_change_events(
+  cursor: int | None,
+  refresh: Callable[[], None],
+  is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[str]:
+  """
+  カタログの変更を確認し、連番 cursor より後の変更をSSEイベントとして送り続ける。
+
+  Args:
+    cursor: 最後に受け取った連番（None は初回接続、-1 は続きから再開できないイベントID）
+    refresh: カタログの変更を確認する関数（スレッドプールで実行する）
+    is_disconnected: クライアントが切断したかを返す関数
+  """
+  idle = 0.0
+  while not await is_disconnected():
+    await run_in_threadpool(refresh)
+    changes = None if cursor is None else catalog.changes_since(cursor)
+    if changes is None:
+      # 初回接続は sync、続きを送れない再接続は reset。どちらも現在の連番から購読を始める
+      event = "sync" if cursor is None else "reset"
+      cursor = catalog.sequence
+      yield format_sse(event, {"sequence": cursor}, catalog.event_id(cursor))
+      idle = 0.0
+    elif changes:
+      for change in changes:
+        yield format_change(change)
+      cursor = changes[-1].sequence
+      idle = 0.0
+    elif idle >= CATALOG_FEED_HEARTBEAT_SECONDS:
+      yield ": keep-alive\n\n"
+      idle = 0.0
+    await asyncio.sleep(CATALOG_FEED_POLL_SECONDS)
+    idle += CATALOG_FEED_POLL_SECONDS
+
+
+@app.get("/api/v1/catalog/changes")
+async def catalog_changes(
+  request: Request,
+  since: str | None = None,
+  last_event_id: str | None = Header(None),
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+):
+  """
+  商品カタログの変更フィード (Server-Sent Events)。
+  商品の追加・変更 (upsert) と削除 (delete) を連番付きで送る。
+  再接続時は Last-Event-ID ヘッダ（EventSourceが自動で付与）または since で指定したイベントIDの続きから送る。
+  続きを送れない場合（別のワーカー・再起動前のイベントIDを含む）は reset イベントを送るので、
+  クライアントは全商品を取得し直す。
+  """
+  event_id = last_event_id or since
+  cursor = None if event_id is None else catalog.parse_event_id(event_id)
+
+  def refresh() -> None:
+    # 変更の確認が済んだら接続をプールへ返す（セッションは次の確認で再利用する）
+    try:
+      catalog.ensure_fresh(db)
+    finally:
+      db.close()
+
+  # プロキシ (nginx等) のバッファリングを無効にし、変更を即座に届ける
+  headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  return StreamingResponse(
+    catalog_change_events(cursor, refresh, request.is_disconnected),
+    media_type="text/event-stream",
+    headers=headers,
+  )
+
+
+@app.get("/api/v1/admission")
+def get_admission_stats():
+  """ルートごとの同時実行数の上限・処理中の数・待ち行列の長さ・拒否数を返す（監視用）。"""
+  return {name: limiter.stats() for name, limiter in admission_limiters.items()}
+
+
+@app.get("/api/v1/exports/{table_name}", dependencies=[Depends(admission(admission_limiters["exports"]))])
+def export_table(
+  table_name: str,
+  fmt: str = Query("csv", alias="format"),
+  gzip: bool = False,  # noqa: FBT001, FBT002
+  date_from: date | None = None,
+  date_to: date | None = None,
+  db: Session = Depends(get_read_db),  # noqa: B008, FAST002
+):
+  """
+  商品マスタ・取引データを CSV / NDJSON でストリーミング出力するAPI。
+  サーバーサイドカーソルで少しずつ読み出すため、件数が多くてもメモリ使用量は一定。
+  """
+  if table_name not in EXPORT_TABLES:
+    raise HTTPException(status_code=404, detail=f"出力対象のテーブルが存在しません: {table_name}")
+  if fmt not in EXPORT_FORMATS:
+    raise HTTPException(status_code=400, detail=f"出力形式が不正です: {fmt}")
+  try:
+    build_export_query(table_name, date_from, date_to)
+  except ValueError as e:
+    raise HTTPException(status_code=400, detail=str(e)) from e
+
+  filename = f"{table_name}.{fmt}" + (".gz" if gzip else "")
+  return StreamingResponse(
+    export_stream(db, table_name, fmt, gzip, date_from, date_to),
+    media_type="application/gzip" if gzip else EXPORT_FORMATS[fmt],
+    headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+  )
@@ -0,0 +1,156 @@
+"""
+取引データのアーカイブコマンド（ホット/コールド分離）。
+
+保持期間 (ARCHIVE_RETENTION_DAYS) を過ぎた取引を transactions / transaction_details から
+transactions_archive / transaction_details_archive へ移動します。
+移動は (created_at, id) の古い順にチャンク単位で行い、チャンクごとに短いトランザクションでコミットするため、
+営業中に実行してもPOS側のロック待ちはチャンク1回分で済みます。
+ホットテーブルを小さく保つことで、登録処理のインデックス更新や集計がバッファプールに収まります。
+
+移動した取引は、取引履歴API (include_archive=true) とレシート取得API、データ出力から引き続き参照できます。
+
+使用例:
+  python archive.py                      # 保持期間を過ぎた取引をすべて移動
+  python archive.py --retention-days 30 --chunk-size 500
+  python archive.py --every 3600         # 1時間ごとに繰り返し実行（常駐）
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from database import Transaction, TransactionArchive, TransactionDetail, TransactionDetailArchive, engine
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine  # noqa: TC002
+
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+DEFAULT_CHUNK_SIZE = 1_000
+
+TRANSACTION_COLUMNS = ["id", "transaction_code", "total_price", "created_at"]
+DETAIL_COLUMNS = ["id", "transaction_id", "product_id", "product_name", "unit_price", "quantity"]
+
+
+@dataclass
+class ArchiveReport:
+  """アーカイブ結果の集計"""
+
+  transactions: int = 0
+  details: int = 0
+  chunks: int = 0
+  elapsed: float = 0.0
+
+
+def archive_chunk(conn, cutoff: datetime, chunk_size: int) -> tuple[int, int]:  # noqa: ANN001
+  """
+  cutoff より前の取引を最大 chunk_size 件移動する（呼び出し側のトランザクション内で実行）。
+
+  Returns:
+    (移動した取引数, 移動した明細数)
+  """
+  # 最新の取引は移動しない（SQLiteは最大の id が消えると id を再利用し、アーカイブ側と重複するため）
+  max_id = select(func.max(Transaction.id)).scalar_subquery()
+  ids = (
+    conn.execute(
+      select(Transaction.id)
+      .where(Transaction.created_at < cutoff, Transaction.id < max_id)
+      .order_by(Transaction.created_at, Transaction.id)
+      .limit(chunk_size),
+    )
+    .scalars()
+    .all()
+  )
+  if not ids:
+    return 0, 0
+
+  conn.execute(
+    insert(TransactionArchive).from_select(
+      TRANSACTION_COLUMNS,
+      select(*[Transaction.__table__.c[name] for name in TRANSACTION_COLUMNS]).where(Transaction.id.in_(ids)),
+    ),
+  )
+  details = conn.execute(
+    insert(TransactionDetailArchive).from_select(
+      DETAIL_COLUMNS,
+      select(*[TransactionDetail.__table__.c[name] for name in DETAIL_COLUMNS]).where(
+        TransactionDetail.transaction_id.in_(ids),
+      ),
+    ),
+  ).rowcount
+  conn.execute(delete(TransactionDetail).where(TransactionDetail.transaction_id.in_(ids)))
+  conn.execute(delete(Transaction).where(Transaction.id.in_(ids)))
+  return len(ids), details
+
+
+def archive_transactions(
+  bind: Engine = engine,
+  retention_days: int = ARCHIVE_RETENTION_DAYS,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  pause: float = 0.0,
+  now: datetime | None = None,
+  progress: bool = False,  # noqa: FBT001, FBT002
+) -> ArchiveReport:
+  """
+  保持期間を過ぎた取引をすべてアーカイブテーブルへ移動する。
+
+  Args:
+    bind: 接続先エンジン
+    retention_days: ホットテーブルに残す日数
+    chunk_size: 1トランザクションで移動する取引数
+    pause: チャンク間の待機秒数（本番DBへの負荷を抑える）
+    now: 基準日時（テスト用。省略時は現在時刻）
+    progress: チャンクごとに進捗を表示するか
+
+  Returns:
+    ArchiveReport
+  """
+  cutoff = (now or datetime.now()) - timedelta(days=retention_days)  # noqa: DTZ005
+  report = ArchiveReport()
+  start = time.perf_counter()
+  while True:
+    with bind.begin() as conn:
+      moved, details = archive_chunk(conn, cutoff, chunk_size)
+    if moved == 0:
+      break
+    report.transactions += moved
+    report.details += details
+    report.chunks += 1
+    if progress:
+      print(f"  {report.transactions:,}件の取引を移動しました")
+    if pause:
+      time.sleep(pause)
+  report.elapsed = time.perf_counter() - start
+  return report
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="保持期間を過ぎた取引をアーカイブテーブルへ移動")
+  parser.add_argument("--retention-days", type=int, default=ARCHIVE_RETENTION_DAYS, help="ホットテーブルに残す日数")
+  parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1トランザクションで移動する取引数")
+  parser.add_argument("--pause", type=float, default=0.0, help="チャンク間の待機秒数")
+  parser.add_argument("--every", type=float, default=None, metavar="SECONDS", help="指定秒ごとに繰り返し実行する")
+  args = parser.parse_args(argv)
+
+  while True:
+    print(f"アーカイブを開始します: {args.retention_days}日より前の取引")
+    report = archive_transactions(
+      retention_days=args.retention_days,
+      chunk_size=args.chunk_size,
+      pause=args.pause,
+      progress=True,
+    )
+    print(
+      f"アーカイブ完了: 取引 {report.transactions:,}件 / 明細 {report.details:,}件 "
+      f"({report.chunks}チャンク) {report.elapsed:.2f}秒",
+    )
+    if args.every is None:
+      return 0
+    time.sleep(args.every)
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+EAN-13バーコード画像をメモリ上で生成するモジュール。
+
+一時ファイルを使わずにPNGのバイト列を生成し、(JANコード, オプション) をキーとした
+件数・合計バイト数の上限付きのLRUキャッシュ (cache.LRUCache) に保持します。バーコード画像はJANコードと
+描画オプションだけで決まるため、一度生成した画像は再印刷時にそのまま返せます。
+描画設定 (DEFAULT_OPTIONS) と python-barcode のバージョンから描画バージョン (RENDER_VERSION) を計算し、
+ETagに含めます。`immutable` で1年間キャッシュさせるのは、URLに現在の描画バージョン (?v=) を含む場合だけです。
+ブラウザやCDNは immutable の応答を再検証しないため、設定を変えたときはURLが変わることで取り直されます。
+バージョンを含まないURLは短い期間 (BARCODE_MAX_AGE_SECONDS) だけキャッシュさせ、以降はETagで再検証させます。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+
+import barcode
+from barcode.writer import ImageWriter
+from cache import LRUCache
+
+# LRUキャッシュに保持する画像の最大件数と、画像の合計バイト数の上限
+BARCODE_CACHE_SIZE = int(os.getenv("BARCODE_CACHE_SIZE", "1024"))
+BARCODE_CACHE_BYTES = int(os.getenv("BARCODE_CACHE_BYTES", str(32 * 2**20)))
+# 描画バージョンを含まないURLの画像をキャッシュさせる秒数
+BARCODE_MAX_AGE_SECONDS = int(os.getenv("BARCODE_MAX_AGE_SECONDS", "3600"))
+
+# debug/barcode_generator/generate_barcodes.py と同じ描画設定
+DEFAULT_OPTIONS = {
+  "module_width": 0.4,  # バーの幅（mm）
+  "module_height": 15.0,  # バーの高さ（mm）
+  "quiet_zone": 6.5,  # 余白（mm）
+  "font_size": 10,
+  "text_distance": 5,
+  "background": "white",
+  "foreground": "black",
+}
+
+# 描画結果を左右する設定のダイジェスト（ETagとURLの ?v= に使う）
+RENDER_VERSION = hashlib.sha1(
+  json.dumps([DEFAULT_OPTIONS, barcode.version], sort_keys=True).encode(),
+  usedforsecurity=False,
+).hexdigest()[:16]
+
+barcode_cache = LRUCache(maxsize=BARCODE_CACHE_SIZE, maxbytes=BARCODE_CACHE_BYTES)
+
+
+def render_ean13_png(jan_code: str, dpi: int = 300, write_text: bool = True) -> bytes:  # noqa: FBT001, FBT002
+  """
+  EAN-13バーコードをPNGのバイト列として生成する。
+
+  Args:
+    jan_code: 検証済みのJANコード（13桁）
+    dpi: 解像度
+    write_text: バーコード下にJANコードを印字するか
+
+  Returns:
+    PNG画像のバイト列
+  """
+  key = (jan_code, dpi, write_text)
+  png = barcode_cache.get(key)
+  if png is None:
+    ean = barcode.get("ean13", jan_code, writer=ImageWriter())
+    buffer = io.BytesIO()
+    ean.write(buffer, options={**DEFAULT_OPTIONS, "dpi": dpi, "write_text": write_text})
+    png = buffer.getvalue()
+    barcode_cache.set(key, png)
+  return png
+
+
+def barcode_etag(jan_code: str, dpi: int, write_text: bool) -> str:  # noqa: FBT001
+  """描画条件と描画設定から決まる強いETagを返す（画像の内容はこれらだけで一意に決まる）。"""
+  digest = hashlib.sha1(
+    f"{jan_code}:{dpi}:{int(write_text)}:{RENDER_VERSION}".encode(),
+    usedforsecurity=False,
+  ).hexdigest()
+  return f'"{digest[:16]}"'
+
+
+def barcode_cache_control(version: str | None) -> str:
+  """URLの描画バージョンが現在のものなら1年間 immutable、それ以外は短い期間だけキャッシュさせる。"""
+  if version == RENDER_VERSION:
+    return "public, max-age=31536000, immutable"
+  return f"public, max-age={BARCODE_MAX_AGE_SECONDS}, must-revalidate"
@@ -0,0 +1,112 @@
+"""
+商品カタログの検索ベンチマーク。
+
+合成したJANコードのカタログで、1商品あたりのメモリと検索速度を比較します。
+
+  - dict:        {商品コード: CatalogEntry} の辞書（比較用）
+  - get:         セグメントの1件ずつの検索 (CatalogSegment.get)
+  - basket:      かご単位のまとめて検索 (CatalogSegment.find_many、数値キー索引)
+  - batch:       大量の商品コードのまとめて検索 (find_many)
+  - batch (S13): 比較用に、同じ件数を商品コードの文字列配列で二分探索
+
+検索する商品コードの一部 (--miss) はカタログにないコード（会員カード・誤読など）にします。
+
+使用例:
+  python benchmarks/catalog_lookup.py --skus 1000000
+  python benchmarks/catalog_lookup.py --skus 100000 --basket 10 --lookups 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from catalog_segment import KEY_WIDTH, CatalogEntry, CatalogSegment, encode_segment  # noqa: E402
+from ean13 import fix  # noqa: E402
+
+
+def make_codes(count: int, rng: np.random.Generator) -> list[str]:
+  """チェックディジットの正しい、重複のないJANコードを count 件作る。"""
+  bodies = rng.choice(10**9, size=count, replace=False) + 490_000_000_000
+  return fix([f"{body:012d}" for body in bodies])[0].tolist()
+
+
+def rate(label: str, lookups: int, elapsed: float) -> None:
+  print(f"{label:>12}: {lookups / elapsed:14,.0f}件/秒")
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="商品カタログの検索ベンチマーク")
+  parser.add_argument("--skus", type=int, default=1_000_000, help="カタログの商品数")
+  parser.add_argument("--lookups", type=int, default=200_000, help="検索する商品コードの件数")
+  parser.add_argument("--basket", type=int, default=20, help="かご1つあたりの明細数")
+  parser.add_argument("--miss", type=float, default=0.1, help="カタログにない商品コードの割合")
+  args = parser.parse_args()
+
+  rng = np.random.default_rng(0)
+  codes = make_codes(args.skus, rng)
+  rows = [(code, f"商品{i}", 100 + i % 900, i % 10 == 0) for i, code in enumerate(codes)]
+
+  # 辞書は商品コード・商品名の文字列も含めて計測する（DBから読み込んだ場合と同じく、行ごとに新しい文字列を作る）
+  tracemalloc.start()
+  baseline = {}
+  for code, name, price, is_local in rows:
+    code = code.encode().decode()  # noqa: PLW2901
+    baseline[code] = CatalogEntry(code, name.encode().decode(), price, is_local)
+  dict_bytes = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+
+  start = time.perf_counter()
+  segment = CatalogSegment(encode_segment(rows))
+  built = time.perf_counter() - start
+
+  index_bytes = segment.numeric_keys.nbytes + segment.numeric_rows.nbytes
+  print(f"商品数 {args.skus:,}件（セグメントの作成 {built:.2f}秒）")
+  print(f"{'dict':>12}: {dict_bytes / args.skus:8.1f}バイト/商品 ({dict_bytes / 2**20:8.1f}MiB)")
+  print(
+    f"{'segment':>12}: {segment.nbytes / args.skus:8.1f}バイト/商品 ({segment.nbytes / 2**20:8.1f}MiB、"
+    f"うち数値キー索引 {index_bytes / args.skus:.1f}バイト/商品)",
+  )
+
+  misses = make_codes(int(args.lookups * args.miss), np.random.default_rng(1))
+  queries = [codes[i] for i in rng.integers(0, args.skus, args.lookups - len(misses))] + misses
+  rng.shuffle(queries)
+  baskets = [queries[i : i + args.basket] for i in range(0, len(queries), args.basket)]
+  print(f"検索 {len(queries):,}件（うちカタログにない商品コード {len(misses):,}件、かご {args.basket}明細）")
+
+  start = time.perf_counter()
+  expected = [baseline.get(code) for code in queries]
+  rate("dict", len(queries), time.perf_counter() - start)
+
+  start = time.perf_counter()
+  found = [segment.get(code) for code in queries]
+  rate("get", len(queries), time.perf_counter() - start)
+  assert found == expected
+
+  start = time.perf_counter()
+  found = [entry for basket in baskets for entry in segment.get_many(basket)]
+  rate("basket", len(queries), time.perf_counter() - start)
+  assert found == expected
+
+  start = time.perf_counter()
+  positions = segment.find_many(queries)
+  rate("batch", len(queries), time.perf_counter() - start)
+
+  start = time.perf_counter()
+  keys = np.array(queries, dtype=f"S{KEY_WIDTH}")
+  i = np.minimum(np.searchsorted(segment.codes, keys), len(segment.codes) - 1)
+  by_string = np.where(segment.codes[i] == keys, i, -1)
+  rate("batch (S13)", len(queries), time.perf_counter() - start)
+  assert (positions == by_string).all()
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
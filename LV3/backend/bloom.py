@@ -0,0 +1,112 @@
+"""
+登録済み商品コードのブルームフィルタ。
+
+会員カード・クーポン・読み取りミスなど、カタログにないバーコードのスキャンは
+商品検索APIで404になるまでDBを検索します。両マスタの全商品コードからブルームフィルタを作っておけば、
+「確実に存在しない」商品コードはDBもカタログも参照せずに判定できます。
+存在すると判定された場合（誤判定の確率は CATALOG_BLOOM_FP_RATE）は、従来どおりDBを検索します。
+
+ハッシュは商品コードの数値キー（catalog_segment.numeric_keys）を splitmix64 で混ぜた64ビット値から、
+ダブルハッシュ法で k 個のビット位置を作ります。作成はNumPyでまとめて、判定は1件ずつPythonの整数で行います。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from collections.abc import Sequence
+
+import numpy as np
+from catalog_segment import numeric_key, numeric_keys
+
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(x):  # noqa: ANN001, ANN202
+  """uint64 の配列の各要素を混ぜる（桁あふれは2^64で折り返す）。"""
+  x = x + np.uint64(0x9E3779B97F4A7C15)
+  x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+  x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+  return x ^ (x >> np.uint64(31))
+
+
+def _splitmix64_int(x: int) -> int:
+  """_splitmix64 の1件版（Pythonの整数）。"""
+  x = (x + 0x9E3779B97F4A7C15) & _MASK64
+  x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+  x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+  return x ^ (x >> 31)
+
+
+def _text_key(product_id: str) -> int:
+  """数字以外を含む商品コードのキー。"""
+  return int.from_bytes(hashlib.blake2b(product_id.encode(), digest_size=8).digest(), "little")
+
+
+def hash_keys(product_ids: Sequence[str] | np.ndarray) -> np.ndarray:
+  """商品コードの列を64ビットのハッシュ値の配列に変換する。"""
+  keys, numeric = numeric_keys(product_ids)
+  for i in np.flatnonzero(~numeric):
+    keys[i] = _text_key(str(product_ids[i]))
+  with np.errstate(over="ignore"):
+    return _splitmix64(keys)
+
+
+def hash_key(product_id: str) -> int:
+  """hash_keys の1件版。"""
+  key = numeric_key(product_id)
+  return _splitmix64_int(_text_key(product_id) if key is None else key)
+
+
+class BloomFilter:
+  """
+  商品コードの集合のブルームフィルタ（追加は作成時のみ）。
+
+  Args:
+    bits: ビット配列（リトルエンディアンでパックしたもの）。bytes・memoryview はそのまま参照する
+      （catalog_segment のセグメントに格納したビット配列を、ワーカー間で共有する）
+    size: ビット数 m
+    hashes: ハッシュ関数の数 k
+    count: 登録した商品コードの件数
+  """
+
+  def __init__(self, bits: np.ndarray | bytes | memoryview, size: int, hashes: int, count: int):
+    self._bits = bits.tobytes() if isinstance(bits, np.ndarray) else bits
+    self.size = size
+    self.hashes = hashes
+    self.count = count
+
+  @classmethod
+  def build(cls, product_ids: Sequence[str] | np.ndarray, fp_rate: float) -> BloomFilter:
+    """商品コードの列から、誤判定の確率が fp_rate になる大きさのフィルタを作る。"""
+    count = len(product_ids)
+    # m = -n ln(p) / (ln 2)^2, k = (m / n) ln 2
+    size = max(64, math.ceil(-max(count, 1) * math.log(fp_rate) / math.log(2) ** 2))
+    hashes = max(1, round(size / max(count, 1) * math.log(2)))
+    bits = np.zeros(size, dtype=bool)
+    if count:
+      h = hash_keys(product_ids)
+      h1 = h & np.uint64(0xFFFFFFFF)
+      h2 = (h >> np.uint64(32)) | np.uint64(1)
+      for i in range(hashes):
+        bits[(h1 + np.uint64(i) * h2) % np.uint64(size)] = True
+    return cls(np.packbits(bits, bitorder="little"), size, hashes, count)
+
+  def __contains__(self, product_id: str) -> bool:
+    """False なら確実に未登録。True は登録済みか、誤判定。"""
+    h = hash_key(product_id)
+    h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+    bits, size = self._bits, self.size
+    for i in range(self.hashes):
+      position = (h1 + i * h2) % size
+      if not bits[position >> 3] & (1 << (position & 7)):
+        return False
+    return True
+
+  @property
+  def bits(self) -> bytes:
+    return bytes(self._bits)
+
+  @property
+  def nbytes(self) -> int:
+    return len(self._bits)
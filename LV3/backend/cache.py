@@ -0,0 +1,75 @@
+"""
+プロセス内キャッシュのユーティリティ。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable
+from threading import Lock
+from typing import Any
+
+
+class LRUCache:
+  """
+  件数上限付きのスレッドセーフなLRUキャッシュ。
+
+  FastAPIの同期エンドポイントはスレッドプールで並行実行されるため、ロックで保護する。
+  maxbytes を指定すると、値の大きさ (sizeof) の合計にも上限を設ける（画像など大きさの揃わない値向け）。
+  """
+
+  def __init__(self, maxsize: int = 1024, maxbytes: int | None = None, sizeof: Callable[[Any], int] = len):
+    self.maxsize = maxsize
+    self.maxbytes = maxbytes
+    self._sizeof = sizeof
+    self._data: OrderedDict[Any, Any] = OrderedDict()
+    self._lock = Lock()
+    self.nbytes = 0
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, default=None):
+    with self._lock:
+      if key in self._data:
+        self._data.move_to_end(key)
+        self.hits += 1
+        return self._data[key]
+      self.misses += 1
+      return default
+
+  def set(self, key, value) -> None:
+    if self.maxbytes is not None and self._sizeof(value) > self.maxbytes:
+      return  # 上限より大きい値は保持しない（他の値をすべて追い出すことになるため）
+    with self._lock:
+      self._discard(key)
+      self._data[key] = value
+      if self.maxbytes is not None:
+        self.nbytes += self._sizeof(value)
+      while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+        self._discard(next(iter(self._data)))
+
+  def pop(self, key, default=None):
+    with self._lock:
+      if key not in self._data:
+        return default
+      value = self._data[key]
+      self._discard(key)
+      return value
+
+  def _discard(self, key) -> None:
+    if key in self._data and self.maxbytes is not None:
+      self.nbytes -= self._sizeof(self._data[key])
+    self._data.pop(key, None)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._data.clear()
+      self.nbytes = 0
+      self.hits = 0
+      self.misses = 0
+
+  def __len__(self) -> int:
+    return len(self._data)
+
+  def __contains__(self, key) -> bool:
+    return key in self._data
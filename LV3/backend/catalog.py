@@ -0,0 +1,401 @@
+"""
+商品カタログのメモリ上スナップショット。
+
+商品マスタ (products) とローカル拡張マスタ (local_products) を1つの辞書にまとめ、
+「通常マスタ優先 → ローカル拡張」の規則で解決済みの状態で保持します。
+
+カタログの変更は1日に数回程度のため、一定間隔 (CATALOG_REFRESH_SECONDS、既定1秒) ごとに
+変更番号 (catalog_version) と両テーブルの最終更新日時のフィンガープリントだけを問い合わせ
+（主キーと updated_at の索引で1行ずつ読むだけで、商品数によらず一定）、変化があった場合のみ再読み込みします。
+MySQLの DATETIME は秒単位のため、同じ秒の上書きや削除は最終更新日時に現れません。
+商品マスタを書き込む処理（catalog_import など）は database.bump_catalog_version で変更番号を増やします。
+確認と再読み込みはバックグラウンドのスレッドで行い、リクエストの処理時間には含まれません。
+変更がスナップショットと変更フィードに現れるまでの遅れは、最大で CATALOG_REFRESH_SECONDS と再読み込みの時間の和です
+（確認は次のリクエストか変更フィードのポーリングを契機に始まるため、アクセスのない間は確認しません）。
+再読み込みのたびに version が増えます。etag はフィンガープリントから計算するため、
+同じデータを読み込んだ別プロセス・別インスタンスでも同じ値になり、HTTPのETagとして使えます。
+
+全商品一覧 (/api/v1/products-with-local) のレスポンスも再読み込み時に一度だけJSONへ変換し、
+gzip・brotli で圧縮したバイト列と合わせて snapshot に保持します。
+差し替えが終わるまでは、前回のスナップショット・etag・ブルームフィルタをそのまま使います。
+
+再読み込みのたびに解決済みの商品を前回と比較し、追加・変更 (upsert) と削除 (delete) を
+連番 (sequence) 付きの変更履歴に記録します。レジは変更フィード (/api/v1/catalog/changes) で
+最後に受け取った連番以降の変更だけを受け取れます。
+連番はプロセスごとに数えるため、イベントIDには起動ごとのエポック (epoch) を付けます（"エポック-連番"）。
+別のワーカーや再起動前のイベントIDからは再開せず、全件の再取得を求めます。
+
+解決済みの商品は Python の辞書ではなく、固定幅の配列で表したセグメント (catalog_segment) に保持します。
+CATALOG_SEGMENT_DIR を指定すると、セグメントは etag ごとのファイルとして書き出され、
+同じサーバーの全ワーカーが同じファイルをメモリマップで共有します（最初に気づいたワーカーが作り、他はそれを開くだけ）。
+全商品一覧の圧縮済みレスポンス (snapshot) はレスポンスの本文として bytes で渡すため、ワーカーごとに持ちます
+（圧縮後のバイト列だけで、作成に使う商品の辞書のリストは作成後に解放されます）。
+
+セグメントを作るときに全商品コードのブルームフィルタ (bloom) も作ってセグメントに格納し（ワーカー間で共有）、
+商品検索APIは確実に存在しない商品コードを商品のクエリなしで404にします。
+フィルタは最後の確認以降に追加された商品を知らないため、フィルタにない商品コードでも
+確認時点 (watermark) 以降に更新された商品があれば（updated_at の索引で1件だけ探す）、従来どおりDBを検索します。
+書き込みがなかったという確認結果は refresh_seconds の間使い回すため、未登録の商品コードが続いてもクエリは増えません。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock, Thread
+
+import brotli
+from bloom import BloomFilter
+from catalog_segment import (
+  CatalogEntry,
+  CatalogSegment,
+  build_lock,
+  encode_segment,
+  open_segment,
+  publish_segment,
+  segment_path,
+)
+from database import CatalogVersion, LocalProduct, Product
+from product_resolution import all_product_rows
+from singleflight import SingleFlight
+from sqlalchemy import Connection, DateTime, Engine, exists, func, or_, select
+from sqlalchemy.orm import Session
+
+# 変更の確認間隔（秒）。確認は変更番号と最終更新日時を索引で読むだけなので、短くしてもDBの負荷は小さい
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "1"))
+# brotliの圧縮レベル。11は9の約80倍の時間がかかる割に約2割しか小さくならない（5万商品で 0.09秒 / 8秒）
+CATALOG_BROTLI_QUALITY = int(os.getenv("CATALOG_BROTLI_QUALITY", "9"))
+# 変更フィードで再送できる変更の件数。これより古い連番からの再開は全件の再取得が必要になる
+CATALOG_CHANGELOG_SIZE = int(os.getenv("CATALOG_CHANGELOG_SIZE", "10000"))
+# 解決済みの商品セグメントを書き出すディレクトリ。空なら各プロセスのメモリ上に持つ
+CATALOG_SEGMENT_DIR = os.getenv("CATALOG_SEGMENT_DIR", "")
+# 未登録の商品コードを判定するブルームフィルタの誤判定率。0 ならフィルタを作らない
+CATALOG_BLOOM_FP_RATE = float(os.getenv("CATALOG_BLOOM_FP_RATE", "0.01"))
+# 確認時点より前に書き込まれ、確認後にコミットされた更新を見逃さないための余裕（秒）
+CATALOG_WRITE_MARGIN_SECONDS = float(os.getenv("CATALOG_WRITE_MARGIN_SECONDS", "60"))
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogChange:
+  """変更履歴の1件（op は "upsert" または "delete"。delete の entry は None）"""
+
+  sequence: int
+  op: str
+  product_id: str
+  entry: CatalogEntry | None
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+  """全商品一覧のエンコード済みレスポンス（Content-Encoding ごと）"""
+
+  identity: bytes
+  gzip: bytes
+  br: bytes
+
+  @classmethod
+  def build(cls, content: dict) -> CatalogSnapshot:
+    # StarletteのJSONResponseと同じ形式でエンコードする
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    return cls(
+      identity=body,
+      gzip=gzip.compress(body, compresslevel=9, mtime=0),
+      br=brotli.compress(body, quality=CATALOG_BROTLI_QUALITY, mode=brotli.MODE_TEXT),
+    )
+
+  def select(self, accept_encoding: str | None) -> tuple[bytes, str | None]:
+    """Accept-Encoding に応じて (本文, Content-Encoding) を返す。brotli → gzip → 無圧縮の順に選ぶ。"""
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding in ("br", "gzip"):
+      if accepted.get(encoding, accepted.get("*", 0)) > 0:
+        return getattr(self, encoding), encoding
+    return self.identity, None
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+  """Accept-Encoding ヘッダを {エンコーディング: q値} に変換する。"""
+  accepted: dict[str, float] = {}
+  for part in (header or "").split(","):
+    name, _, params = part.strip().partition(";")
+    if not name:
+      continue
+    q = 1.0
+    key, _, value = params.strip().partition("=")
+    if key.strip() == "q":
+      try:
+        q = float(value)
+      except ValueError:
+        q = 0.0
+    accepted[name.strip().lower()] = q
+  return accepted
+
+
+def catalog_fingerprint(db: Session) -> tuple[tuple, datetime]:
+  """
+  カタログの変更番号と両テーブルの最終更新日時（いずれも主キー・索引で1行だけ読む）と、
+  DBの現在時刻を1回のクエリで取得する。
+  """
+  row = db.execute(
+    select(
+      select(CatalogVersion.version).where(CatalogVersion.id == 1).scalar_subquery(),
+      select(func.max(Product.updated_at)).scalar_subquery(),
+      select(func.max(LocalProduct.updated_at)).scalar_subquery(),
+      func.now(type_=DateTime),
+    ),
+  ).one()
+  return tuple(row[:-1]), row[-1]
+
+
+def written_since(db: Session, since: datetime) -> bool:
+  """since 以降に追加・更新された商品があるか（updated_at の索引で1件だけ探す）。"""
+  return db.scalar(
+    select(or_(*[exists().where(model.updated_at >= since) for model in (Product, LocalProduct)])),
+  )
+
+
+class Catalog:
+  """商品カタログのスナップショットを保持し、変更があれば読み直す。"""
+
+  def __init__(
+    self,
+    refresh_seconds: float = CATALOG_REFRESH_SECONDS,
+    changelog_size: int = CATALOG_CHANGELOG_SIZE,
+    segment_dir: str | Path | None = CATALOG_SEGMENT_DIR,
+    bloom_fp_rate: float = CATALOG_BLOOM_FP_RATE,
+  ):
+    self.refresh_seconds = refresh_seconds
+    self.segment_dir = Path(segment_dir) if segment_dir else None
+    self.bloom_fp_rate = bloom_fp_rate
+    self.bloom: BloomFilter | None = None
+    self.write_margin = timedelta(seconds=CATALOG_WRITE_MARGIN_SECONDS)
+    # この時刻以降に書き込まれた商品は、ブルームフィルタに含まれていない可能性がある
+    self._watermark: datetime | None = None
+    self._stale_watermark: datetime | None = None
+    # 書き込みがなかった確認の結果 (watermark, 確認した時刻)。refresh_seconds の間は確認し直さない
+    self._clean_probe: tuple[datetime, float] | None = None
+    self._probes: SingleFlight[bool] = SingleFlight()
+    self._lock = Lock()
+    self._reloading: Thread | None = None
+    self._entries: CatalogSegment = CatalogSegment(encode_segment([]))
+    self._fingerprint: tuple | None = None
+    self._checked_at = 0.0
+    self.version = 0
+    self.etag = ""
+    self.snapshot: CatalogSnapshot | None = None
+    self.sequence = 0
+    self.epoch = secrets.token_hex(4)
+    self._changes: deque[CatalogChange] = deque(maxlen=changelog_size)
+
+  def ensure_fresh(self, db: Session) -> None:
+    """
+    前回の確認から refresh_seconds 以上経過していれば、変更の有無を確認する。
+
+    初回（と invalidate の後）はこのリクエストで読み込む。読み込み済みであれば、変更の確認・読み直しと
+    レスポンスの圧縮はバックグラウンドのスレッドで行い、リクエストはクエリを発行せずに
+    差し替えまで現在のスナップショットを返し続ける。
+    """
+    if self._fingerprint is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+      return
+    if self._fingerprint is None:
+      with self._lock:
+        if self._fingerprint is None:
+          self._refresh(db)
+      return
+    # 他のスレッドが確認・再読み込み中なら何もしない。ロックは確認のスレッドが終了時に解放する
+    if not self._lock.acquire(blocking=False):
+      return
+    try:
+      self._reloading = Thread(
+        target=self._refresh_in_background,
+        args=(db.get_bind(),),
+        name="catalog-refresh",
+        daemon=True,
+      )
+      self._reloading.start()
+    except BaseException:
+      self._lock.release()
+      raise
+
+  def _refresh_in_background(self, bind: Engine | Connection) -> None:
+    try:
+      with Session(bind=bind) as db:
+        self._refresh(db)
+    except Exception as e:  # noqa: BLE001
+      # 現在のスナップショットを使い続け、refresh_seconds 後に再試行する
+      print(f"商品カタログの再読み込みに失敗しました: {e!r}")
+      self._checked_at = time.monotonic()
+    finally:
+      self._lock.release()
+
+  def _refresh(self, db: Session) -> None:
+    if self._fingerprint is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+      return
+    fingerprint, checked_at = catalog_fingerprint(db)
+    if fingerprint == self._fingerprint:
+      self._mark_checked(checked_at)
+    else:
+      self._reload(db, fingerprint, checked_at)
+
+  def wait_for_reload(self, timeout: float | None = None) -> None:
+    """バックグラウンドの確認・再読み込みが実行中なら、終わるまで待つ。"""
+    if self._reloading is not None:
+      self._reloading.join(timeout)
+
+  def _reload(self, db: Session, fingerprint: tuple, checked_at: datetime) -> None:
+    etag = hashlib.sha1(repr(fingerprint).encode(), usedforsecurity=False).hexdigest()[:16]
+    self._load(db, etag)
+    self._fingerprint = fingerprint
+    self.version += 1
+    self.etag = etag
+    self._mark_checked(checked_at)
+
+  def _mark_checked(self, checked_at: datetime) -> None:
+    # ここまでの書き込みはフィルタに反映済み（フィンガープリントが同じか、読み直した）
+    self._watermark = checked_at - self.write_margin
+    self._checked_at = time.monotonic()
+
+  def _load(self, db: Session, etag: str) -> None:
+    entries = self._open_segment(db, etag)
+    # 全商品一覧は両マスタの行をそのまま並べる（通常商品 + ローカル商品）
+    products = [
+      {
+        "PRD_ID": row.product_id,
+        "PRD_NAME": row.product_name,
+        "PRD_PRICE": row.price,
+        "LOCAL_PRD_NAME": row.product_name if row.is_local else None,
+        "DISPLAY_ORDER": None,
+        "IS_LOCAL": row.is_local,
+      }
+      for row in entries.rows()
+    ]
+    snapshot = CatalogSnapshot.build({"products": products})
+    # ブルームフィルタはセグメント内のビット配列をそのまま参照する
+    bloom_size, bloom_hashes, bloom_count = entries.bloom_params
+    bloom = BloomFilter(entries.bloom_bits, bloom_size, bloom_hashes, bloom_count) if bloom_size else None
+
+    # セグメントごと差し替えるため、読み取り側はロック不要
+    previous, initial = self._entries, self.snapshot is None
+    self._entries = entries
+    self.bloom = bloom
+    self.snapshot = snapshot
+    # 変更履歴は差し替えの後に記録する（連番→スナップショットの順に読めば、取りこぼしは起きず再送になるだけ）
+    # 初回の読み込みは変更として記録しない
+    if not initial:
+      self._record_changes(previous, entries)
+
+  def _open_segment(self, db: Session, etag: str) -> CatalogSegment:
+    """etag のセグメントを開く。共有ディレクトリに他のワーカーが作ったものがあれば、DBを読まずにそれを使う。"""
+    if self.segment_dir is None:
+      return CatalogSegment(self._encode_segment(db))
+    path = segment_path(self.segment_dir, etag)
+    segment = self._open_published(path)
+    if segment is not None:
+      return segment
+    # 同時に気づいた他のワーカーが作成中なら、その完了を待って開く
+    with build_lock(self.segment_dir):
+      segment = self._open_published(path)
+      if segment is not None:
+        return segment
+      return open_segment(publish_segment(self.segment_dir, etag, self._encode_segment(db)))
+
+  @staticmethod
+  def _open_published(path: Path) -> CatalogSegment | None:
+    if path.exists():
+      # 形式の異なる古いバージョンのセグメントは作り直す
+      with suppress(ValueError):
+        return open_segment(path)
+    return None
+
+  def _encode_segment(self, db: Session) -> bytes:
+    rows = [(row.product_id, row.product_name, row.price, row.is_local) for row in all_product_rows(db)]
+    product_ids = sorted({row[0] for row in rows})
+    bloom = BloomFilter.build(product_ids, self.bloom_fp_rate) if self.bloom_fp_rate > 0 else None
+    return encode_segment(rows, bloom)
+
+  def _record_changes(self, old: CatalogSegment, new: CatalogSegment) -> None:
+    for product_id, entry in new.items():
+      if old.get(product_id) != entry:
+        self._append_change("upsert", product_id, entry)
+    for product_id in old.keys() - new.keys():
+      self._append_change("delete", product_id, None)
+
+  def _append_change(self, op: str, product_id: str, entry: CatalogEntry | None) -> None:
+    self._changes.append(CatalogChange(self.sequence + 1, op, product_id, entry))
+    self.sequence += 1
+
+  def event_id(self, sequence: int) -> str:
+    """変更フィードのイベントID（"エポック-連番"）。"""
+    return f"{self.epoch}-{sequence}"
+
+  def parse_event_id(self, event_id: str) -> int:
+    """
+    イベントIDから連番を取り出す。
+    別のプロセス（他のワーカー・再起動前）のイベントIDや不正な値は -1（続きから再開できない）。
+    """
+    epoch, _, sequence = event_id.partition("-")
+    if epoch != self.epoch or not sequence.isdigit():
+      return -1
+    return int(sequence)
+
+  def changes_since(self, sequence: int) -> list[CatalogChange] | None:
+    """
+    連番 sequence より後の変更を返す。
+    履歴から消えた古い連番や、再起動などで現在より先の連番が指定された場合は None（全件の再取得が必要）。
+    """
+    current = self.sequence
+    if sequence < 0 or sequence > current:
+      return None
+    if sequence == current:
+      return []
+    changes = list(self._changes)
+    if not changes or changes[0].sequence > sequence + 1:
+      return None
+    return [change for change in changes if change.sequence > sequence]
+
+  def get(self, product_id: str) -> CatalogEntry | None:
+    return self._entries.get(product_id)
+
+  def definitely_absent(self, db: Session, product_id: str) -> bool:
+    """
+    True なら商品コードは確実に未登録（商品のクエリは不要）。
+    ブルームフィルタになくても、フィルタの作成後に書き込まれた商品があれば False（DBで確認する）。
+    書き込みの確認は refresh_seconds に1回だけ行い、その間の未登録の商品コードはDBに問い合わせない
+    （確認後に追加された商品は、カタログの変更と同じく最大 refresh_seconds 遅れて見つかる）。
+    """
+    bloom, watermark = self.bloom, self._watermark
+    if bloom is None or watermark is None or product_id in bloom:
+      return False
+    if watermark == self._stale_watermark:
+      return False
+    clean = self._clean_probe
+    if clean is not None and clean[0] == watermark and time.monotonic() - clean[1] < self.refresh_seconds:
+      return True
+    # 同時に届いた未登録の商品コードは、1回の確認を共有する
+    checked_at = time.monotonic()
+    if self._probes.do(watermark, lambda: written_since(db, watermark)):
+      self._stale_watermark = watermark
+      return False
+    self._clean_probe = (watermark, checked_at)
+    return True
+
+  def get_many(self, product_ids: list[str]) -> list[CatalogEntry | None]:
+    """かごの商品コードをまとめて検索する（見つからない要素は None）。"""
+    return self._entries.get_many(product_ids)
+
+  def invalidate(self) -> None:
+    """次回アクセス時に必ず読み直す。"""
+    with self._lock:
+      self._fingerprint = None
+      self._checked_at = 0.0
+
+  def __len__(self) -> int:
+    return len(self._entries)
@@ -0,0 +1,188 @@
+"""
+商品カタログ・取引データのストリーミング出力。
+
+products / local_products / transactions / transaction_details（およびアーカイブテーブル）を
+サーバーサイドカーソル (yield_per / stream_results) で少しずつ読み出し、
+CSV または NDJSON として逐次出力します。gzip圧縮も逐次行うため、
+1年分の売上を出力してもメモリ使用量は一定です。
+
+使用例:
+  python catalog_export.py products -o products.csv
+  python catalog_export.py transactions --format ndjson --gzip --date-from 2025-01-01 --date-to 2025-12-31 -o sales.ndjson.gz
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from database import (
+  LocalProduct,
+  Product,
+  SessionLocal,
+  Transaction,
+  TransactionArchive,
+  TransactionDetail,
+  TransactionDetailArchive,
+)
+from sqlalchemy import select
+from sqlalchemy.orm import Session  # noqa: TC002
+
+EXPORT_TABLES = {
+  "products": Product.__table__,
+  "local_products": LocalProduct.__table__,
+  "transactions": Transaction.__table__,
+  "transaction_details": TransactionDetail.__table__,
+  "transactions_archive": TransactionArchive.__table__,
+  "transaction_details_archive": TransactionDetailArchive.__table__,
+}
+
+# 取引明細テーブル → 日付範囲の基準にする取引ヘッダテーブル
+DETAIL_HEADERS = {
+  "transaction_details": "transactions",
+  "transaction_details_archive": "transactions_archive",
+}
+
+EXPORT_FORMATS = {
+  "csv": "text/csv; charset=utf-8",
+  "ndjson": "application/x-ndjson",
+}
+
+DEFAULT_BATCH_SIZE = 1_000
+
+
+def build_export_query(table_name: str, date_from: date | None = None, date_to: date | None = None):
+  """
+  出力用のSELECT文を組み立てる。
+
+  取引系テーブルのみ日付範囲 (date_from 以上、date_to 以下の日) で絞り込める。
+  取引明細は取引ヘッダの created_at を基準にする。
+  """
+  if table_name not in EXPORT_TABLES:
+    raise ValueError(f"出力対象のテーブルが不正です: {table_name}")
+  table = EXPORT_TABLES[table_name]
+  stmt = select(table)
+
+  if date_from is None and date_to is None:
+    return stmt.order_by(*table.primary_key.columns)
+
+  if table_name in ("transactions", "transactions_archive"):
+    created_at = table.c.created_at
+  elif table_name in DETAIL_HEADERS:
+    headers = EXPORT_TABLES[DETAIL_HEADERS[table_name]]
+    stmt = stmt.join(headers, headers.c.id == table.c.transaction_id)
+    created_at = headers.c.created_at
+  else:
+    raise ValueError("日付範囲の指定は取引ヘッダ・取引明細（アーカイブを含む）のみ可能です")
+
+  if date_from is not None:
+    stmt = stmt.where(created_at >= datetime.combine(date_from, time.min))
+  if date_to is not None:
+    stmt = stmt.where(created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+  return stmt.order_by(*table.primary_key.columns)
+
+
+def iter_rows(
+  db: Session,
+  table_name: str,
+  date_from: date | None = None,
+  date_to: date | None = None,
+  batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[dict]:
+  """サーバーサイドカーソルで batch_size 件ずつ行を取り出すジェネレータ。"""
+  stmt = build_export_query(table_name, date_from, date_to)
+  result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+  for row in result.mappings():
+    yield dict(row)
+
+
+def _json_default(value):
+  if isinstance(value, datetime | date):
+    return value.isoformat()
+  raise TypeError(f"JSONに変換できない値です: {value!r}")
+
+
+def encode_rows(rows: Iterable[dict], columns: list[str], fmt: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+  """行を CSV / NDJSON のバイト列に変換する。batch_size 行ごとにまとめて出力する。"""
+  if fmt not in EXPORT_FORMATS:
+    raise ValueError(f"出力形式が不正です: {fmt}")
+
+  buffer = io.StringIO()
+  writer = csv.writer(buffer) if fmt == "csv" else None
+  if writer is not None:
+    writer.writerow(columns)
+
+  count = 0
+  for row in rows:
+    if writer is not None:
+      writer.writerow([v.isoformat() if isinstance(v, datetime) else v for v in (row[c] for c in columns)])
+    else:
+      buffer.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+      buffer.write("\n")
+    count += 1
+    if count % batch_size == 0:
+      yield buffer.getvalue().encode("utf-8")
+      buffer.seek(0)
+      buffer.truncate()
+
+  if buffer.tell():
+    yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+  """バイト列のストリームを逐次gzip圧縮する。"""
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzipヘッダ付き
+  for chunk in chunks:
+    compressed = compressor.compress(chunk)
+    if compressed:
+      yield compressed
+  yield compressor.flush()
+
+
+def export_stream(
+  db: Session,
+  table_name: str,
+  fmt: str = "csv",
+  gzip: bool = False,
+  date_from: date | None = None,
+  date_to: date | None = None,
+  batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[bytes]:
+  """テーブルの内容を指定形式のバイト列ストリームとして返す。"""
+  columns = [c.name for c in EXPORT_TABLES[table_name].columns]
+  chunks = encode_rows(iter_rows(db, table_name, date_from, date_to, batch_size), columns, fmt, batch_size)
+  return gzip_stream(chunks) if gzip else chunks
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="商品カタログ・取引データのストリーミング出力")
+  parser.add_argument("table", choices=sorted(EXPORT_TABLES), help="出力対象のテーブル")
+  parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv", help="出力形式")
+  parser.add_argument("--gzip", action="store_true", help="gzip圧縮して出力する")
+  parser.add_argument("--date-from", type=date.fromisoformat, default=None, help="取引日の開始 (YYYY-MM-DD)")
+  parser.add_argument("--date-to", type=date.fromisoformat, default=None, help="取引日の終了 (YYYY-MM-DD)")
+  parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="1回に読み出す行数")
+  # database.py が接続先を標準出力に表示するため、出力先はファイルのみとする
+  parser.add_argument("-o", "--output", type=Path, required=True, help="出力ファイル")
+  args = parser.parse_args(argv)
+
+  db = SessionLocal()
+  try:
+    stream = export_stream(db, args.table, args.format, args.gzip, args.date_from, args.date_to, args.batch_size)
+    with args.output.open("wb") as out:
+      for chunk in stream:
+        out.write(chunk)
+  finally:
+    db.close()
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
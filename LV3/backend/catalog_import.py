@@ -0,0 +1,216 @@
+"""
+商品カタログ一括取込コマンド。
+
+仕入先のCSV/TSVをチャンク単位でストリーミング読み込みし、JANコードを検証したうえで
+products / local_products テーブルへ一括UPSERTします。
+チャンクごとに短いトランザクションでコミットするため、POS側のロック待ちは最小限です。
+
+使用例:
+  python catalog_import.py supplier.csv
+  python catalog_import.py store_items.tsv --table local_products --store-id S001
+  python catalog_import.py supplier.csv --jan-column JANコード --name-column 商品名 --price-column 価格
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import ean13
+from database import LocalProduct, Product, bump_catalog_version, engine
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine  # noqa: TC002
+
+TABLES = {
+  "products": Product.__table__,
+  "local_products": LocalProduct.__table__,
+}
+
+DEFAULT_CHUNK_SIZE = 5_000
+NAME_MAX_LENGTH = 100
+
+
+@dataclass
+class ImportReport:
+  """取込結果の集計"""
+
+  total: int = 0
+  upserted: int = 0
+  fixed: int = 0
+  skipped_rows: list[tuple[int, str]] = field(default_factory=list)
+  elapsed: float = 0.0
+
+  @property
+  def skipped(self) -> int:
+    return self.total - self.upserted
+
+  @property
+  def rows_per_sec(self) -> float:
+    return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def build_upsert(dialect_name: str, table_name: str):
+  """
+  DB方言ごとのネイティブなUPSERT文を組み立てる。
+
+  - SQLite: INSERT ... ON CONFLICT (product_id) DO UPDATE
+  - MySQL:  INSERT ... ON DUPLICATE KEY UPDATE
+  """
+  table = TABLES[table_name]
+  update_columns = ["product_name", "price"] + (["store_id"] if table_name == "local_products" else [])
+
+  if dialect_name == "sqlite":
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+      index_elements=[table.c.product_id],
+      set_={**{c: stmt.excluded[c] for c in update_columns}, "updated_at": func.now()},
+    )
+  if dialect_name == "mysql":
+    stmt = mysql_insert(table)
+    return stmt.on_duplicate_key_update(
+      **{c: stmt.inserted[c] for c in update_columns},
+      updated_at=func.now(),
+    )
+  raise ValueError(f"未対応のデータベースです: {dialect_name}")
+
+
+def import_catalog(
+  path: Path,
+  table_name: str = "products",
+  bind: Engine = engine,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  jan_column: str = "product_id",
+  name_column: str = "product_name",
+  price_column: str = "price",
+  store_id: str = "default_store",
+  delimiter: str | None = None,
+  fix_check_digit: bool = False,
+  max_reported: int = 100,
+  progress: bool = False,
+) -> ImportReport:
+  """
+  CSV/TSVファイルを読み込み、指定テーブルへチャンク単位でUPSERTする。
+
+  Args:
+    path: 入力ファイル
+    table_name: 取込先テーブル (products / local_products)
+    bind: 接続先エンジン
+    chunk_size: 1トランザクションあたりの行数
+    jan_column / name_column / price_column: 入力ファイルの列名
+    store_id: local_products に取り込む場合の店舗ID
+    delimiter: 区切り文字 (None の場合は拡張子から判定)
+    fix_check_digit: Trueの場合、チェックディジット誤りを修正して取り込む
+    max_reported: スキップ行を記録する最大件数
+    progress: チャンクごとの進捗を表示するか
+
+  Returns:
+    ImportReport
+  """
+  if table_name not in TABLES:
+    raise ValueError(f"取込先テーブルが不正です: {table_name}")
+
+  upsert = build_upsert(bind.dialect.name, table_name)
+  report = ImportReport()
+  start = time.perf_counter()
+
+  for header, rows, codes in ean13.iter_csv_chunks(path, jan_column, chunk_size, delimiter):
+    try:
+      name_index = header.index(name_column)
+      price_index = header.index(price_column)
+    except ValueError as e:
+      raise ValueError(f"必要な列がヘッダに存在しません: {header}") from e
+
+    valid = ean13.validate(codes)
+    if fix_check_digit:
+      fixed_codes, fixable = ean13.fix(codes)
+      report.fixed += int((fixable & ~valid).sum())
+      codes = fixed_codes.tolist()
+      valid = fixable
+
+    # 同一チャンク内の重複JANは後勝ち
+    batch: dict[str, dict] = {}
+    accepted = 0
+    for i, (row, code, ok) in enumerate(zip(rows, codes, valid, strict=True)):
+      line_no = report.total + i + 2  # ヘッダ行を1行目とする
+      reason = None
+      if not ok:
+        reason = f"JANコード不正: {code!r}"
+      else:
+        try:
+          name = row[name_index].strip()
+          price = int(row[price_index])
+        except (IndexError, ValueError):
+          reason = "商品名または価格が不正"
+        else:
+          if not name or len(name) > NAME_MAX_LENGTH or price < 0:
+            reason = "商品名または価格が不正"
+      if reason is not None:
+        if len(report.skipped_rows) < max_reported:
+          report.skipped_rows.append((line_no, reason))
+        continue
+
+      values = {"product_id": code, "product_name": name, "price": price}
+      if table_name == "local_products":
+        values["store_id"] = store_id
+      batch[code] = values
+      accepted += 1
+
+    if batch:
+      # チャンク単位の短いトランザクション
+      with bind.begin() as conn:
+        conn.execute(upsert, list(batch.values()))
+        # 同じ秒の上書きは最終更新日時が変わらないため、変更番号でアプリのカタログに知らせる
+        bump_catalog_version(conn)
+    report.upserted += accepted
+    report.total += len(rows)
+
+    if progress:
+      elapsed = time.perf_counter() - start
+      print(f"  {report.total:,}行処理済み ({report.total / elapsed:,.0f}行/秒)")
+
+  report.elapsed = time.perf_counter() - start
+  return report
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="商品カタログ (CSV/TSV) の一括取込")
+  parser.add_argument("path", type=Path, help="入力CSV/TSVファイル")
+  parser.add_argument("--table", choices=sorted(TABLES), default="products", help="取込先テーブル")
+  parser.add_argument("--store-id", default="default_store", help="local_products の店舗ID")
+  parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1トランザクションあたりの行数")
+  parser.add_argument("--jan-column", default="product_id", help="JANコードの列名")
+  parser.add_argument("--name-column", default="product_name", help="商品名の列名")
+  parser.add_argument("--price-column", default="price", help="税抜価格の列名")
+  parser.add_argument("--delimiter", default=None, help="区切り文字 (デフォルト: 拡張子から判定)")
+  parser.add_argument("--fix-check-digit", action="store_true", help="チェックディジット誤りを修正して取り込む")
+  args = parser.parse_args(argv)
+
+  print(f"カタログ取込を開始します: {args.path} -> {args.table}")
+  report = import_catalog(
+    args.path,
+    table_name=args.table,
+    chunk_size=args.chunk_size,
+    jan_column=args.jan_column,
+    name_column=args.name_column,
+    price_column=args.price_column,
+    store_id=args.store_id,
+    delimiter=args.delimiter,
+    fix_check_digit=args.fix_check_digit,
+    progress=True,
+  )
+  for line_no, reason in report.skipped_rows:
+    print(f"✗ {line_no}行目: {reason}")
+  print(
+    f"取込完了: {report.total:,}行 (登録/更新 {report.upserted:,}件, 修正 {report.fixed:,}件, "
+    f"スキップ {report.skipped:,}件) {report.elapsed:.2f}秒 / {report.rows_per_sec:,.0f}行/秒",
+  )
+  return 0 if report.skipped == 0 else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+商品カタログのコンパクトな読み取り専用セグメント。
+
+商品マスタとローカル拡張マスタの全行を、次の固定幅の配列と商品名の連結バイト列として1つのバッファに格納します。
+- 商品コード: 固定幅 (UTF-8、商品コード → 優先順位の順に整列)。幅は13バイトか、それより長い商品コードがあればその長さ
+- 価格: int32
+- 区分: uint8 (0=通常マスタ, 1=ローカル拡張)
+- 商品名のオフセット: uint32 (件数+1個)
+- 商品名: UTF-8 を連結したバイト列
+- 数値キー索引: 数字だけの商品コードを uint64 にした整列済み配列と、対応する行の位置 (int32)
+- ブルームフィルタのビット配列（bloom.BloomFilter。作成時に指定した場合のみ）
+
+検索は NumPy の二分探索 (searchsorted) で行い、Pythonのオブジェクトは検索結果の1件分しか作りません。
+かご全体の商品コードは find_many でまとめて検索できます（JANは数値キー索引、英字を含む商品コードは文字列の配列）。
+CATALOG_SEGMENT_DIR を指定すると、セグメントをファイルに書き出してメモリマップで開きます。
+ファイル名はカタログの etag から決まり、一時ファイルに書き出してから os.replace で公開するため、
+同じサーバー上のuvicornワーカーは同じファイル（OSのページキャッシュ上の同じメモリ）を
+ブルームフィルタも含めて共有し、
+書き込み途中のファイルを読むこともありません。
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+  from bloom import BloomFilter
+
+try:
+  import fcntl
+except ImportError:  # Windows（ローカル開発）ではワーカー間の排他を行わない
+  fcntl = None
+
+MAGIC = b"POSCAT03"
+# 商品コードの最小の幅（JAN）。数値キーにできる桁数の上限でもある
+KEY_WIDTH = 13
+# ヘッダ: マジック, 行数, 商品名バイト列の長さ, 数値キー索引の件数, 商品コードの幅,
+# ブルームフィルタのビット数・ハッシュ関数の数・登録件数（ビット数 0 はフィルタなし）
+HEADER = struct.Struct("<8sQQQQQQQ")
+ALIGN = 8
+# 数値キーの上位8ビットに桁数を入れ、先頭の0だけが違う商品コード（"0123" と "123"）を区別する
+_LENGTH_SHIFT = 56
+_ZERO = ord("0")
+_POWERS = 10 ** np.arange(KEY_WIDTH, dtype=np.int64)
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+  """解決済みの商品情報"""
+
+  product_id: str
+  product_name: str
+  price: int
+  is_local: bool
+
+
+def _aligned(size: int) -> int:
+  return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _layout(count: int, numeric_count: int, names_size: int, width: int, bloom_size: int) -> tuple[int, ...]:
+  """各配列の開始位置とバッファ全体の長さを返す。"""
+  keys = HEADER.size
+  prices = keys + _aligned(count * width)
+  flags = prices + _aligned(count * 4)
+  offsets = flags + _aligned(count)
+  numeric_keys = offsets + _aligned((count + 1) * 4)
+  numeric_rows = numeric_keys + numeric_count * 8
+  bloom = numeric_rows + _aligned(numeric_count * 4)
+  names = bloom + _aligned((bloom_size + 7) // 8)
+  return keys, prices, flags, offsets, numeric_keys, numeric_rows, bloom, names, names + names_size
+
+
+def numeric_keys(codes: Sequence[str] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  """
+  商品コードの列をまとめて uint64 の数値キーに変換する。
+
+  Returns:
+    (数値キー, 変換できたか) の配列。数字以外を含む・空・13桁を超える商品コードは変換できない
+  """
+  # Unicode配列をコードポイント (uint32) として参照する（1文字分の余裕で14桁以上を判定する）
+  raw = np.asarray(codes, dtype=f"U{KEY_WIDTH + 1}").reshape(-1).view(np.uint32).reshape(-1, KEY_WIDTH + 1)
+  lengths = np.count_nonzero(raw, axis=1)
+  digits = raw[:, :KEY_WIDTH].astype(np.int64) - _ZERO
+  present = np.arange(KEY_WIDTH) < lengths[:, None]
+  valid = (lengths > 0) & (lengths <= KEY_WIDTH) & np.all(~present | ((digits >= 0) & (digits <= 9)), axis=1)
+
+  # 各桁の位取り (10^(桁数-1-位置))。13桁までなので int64 に収まる
+  places = np.where(present, _POWERS[np.clip(lengths[:, None] - 1 - np.arange(KEY_WIDTH), 0, KEY_WIDTH - 1)], 0)
+  values = (np.where(valid[:, None], digits, 0) * places).sum(axis=1).astype(np.uint64)
+  keys = values | (lengths.astype(np.uint64) << np.uint64(_LENGTH_SHIFT))
+  return np.where(valid, keys, np.uint64(0)), valid
+
+
+def encode_segment(
+  rows: Iterable[tuple[str, str, int, bool]],
+  bloom: BloomFilter | None = None,
+) -> bytes:
+  """
+  (商品コード, 商品名, 価格, ローカル拡張か) の行からセグメントのバイト列を作る。
+  同じ商品コードは通常マスタの行が先に並ぶ（検索では先頭の行を採用する）。
+  bloom を指定すると、そのビット配列もセグメントに格納する。
+  """
+  rows = sorted(rows, key=lambda row: (row[0], row[3]))
+  count = len(rows)
+  names = [row[1].encode() for row in rows]
+  name_offsets = np.zeros(count + 1, dtype="<u4")
+  np.cumsum([len(name) for name in names], out=name_offsets[1:])
+  names_blob = b"".join(names)
+
+  # 商品コードの幅は最も長い商品コードに合わせる（切り詰めると別の商品コードと一致してしまう）
+  encoded = [row[0].encode() for row in rows]
+  width = max([KEY_WIDTH, *map(len, encoded)])
+  codes = np.array(encoded, dtype=f"S{width}")
+  # 数値キー索引は解決済みの行（商品コードごとの先頭行）のうち、数字だけの商品コードを対象にする
+  resolved = _first_rows(codes)
+  keys, valid = numeric_keys(np.char.decode(codes[resolved], "utf-8"))
+  order = np.argsort(keys[valid], kind="stable")
+  index_keys = keys[valid][order]
+  index_rows = resolved[valid][order].astype("<i4")
+  numeric_count = len(index_keys)
+  bloom_bits = b"" if bloom is None else bloom.bits
+
+  keys_at, prices_at, flags_at, offsets_at, nkeys_at, nrows_at, bloom_at, names_at, size = _layout(
+    count,
+    numeric_count,
+    len(names_blob),
+    width,
+    0 if bloom is None else bloom.size,
+  )
+  buffer = bytearray(size)
+  HEADER.pack_into(
+    buffer,
+    0,
+    MAGIC,
+    count,
+    len(names_blob),
+    numeric_count,
+    width,
+    *((0, 0, 0) if bloom is None else (bloom.size, bloom.hashes, bloom.count)),
+  )
+  buffer[keys_at : keys_at + count * width] = codes.tobytes()
+  buffer[prices_at : prices_at + count * 4] = np.array([row[2] for row in rows], dtype="<i4").tobytes()
+  buffer[flags_at : flags_at + count] = np.array([row[3] for row in rows], dtype="u1").tobytes()
+  buffer[offsets_at : offsets_at + (count + 1) * 4] = name_offsets.tobytes()
+  buffer[nkeys_at : nkeys_at + numeric_count * 8] = index_keys.astype("<u8").tobytes()
+  buffer[nrows_at : nrows_at + numeric_count * 4] = index_rows.tobytes()
+  buffer[bloom_at : bloom_at + len(bloom_bits)] = bloom_bits
+  buffer[names_at:size] = names_blob
+  return bytes(buffer)
+
+
+def _first_rows(codes: np.ndarray) -> np.ndarray:
+  """整列済みの商品コードの配列から、商品コードごとの先頭行の位置を返す。"""
+  if not len(codes):
+    return np.zeros(0, dtype=np.intp)
+  return np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+
+
+def numeric_key(product_id: str) -> int | None:
+  """numeric_keys の1件版。変換できなければ None。"""
+  if not (0 < len(product_id) <= KEY_WIDTH and product_id.isascii() and product_id.isdigit()):
+    return None
+  return int(product_id) | len(product_id) << _LENGTH_SHIFT
+
+
+class CatalogSegment(Mapping[str, CatalogEntry]):
+  """
+  セグメントのバッファ（bytes または mmap）を読み取り専用で参照する。
+  商品コード → 解決済みの CatalogEntry の Mapping として使える（同じ商品コードは通常マスタ優先）。
+  """
+
+  def __init__(self, buffer):  # noqa: ANN001
+    magic, count, names_size, numeric_count, width, bloom_size, bloom_hashes, bloom_count = HEADER.unpack_from(
+      buffer,
+      0,
+    )
+    if magic != MAGIC:
+      raise ValueError("商品カタログのセグメントではありません")
+    keys_at, prices_at, flags_at, offsets_at, nkeys_at, nrows_at, bloom_at, names_at, size = _layout(
+      count,
+      numeric_count,
+      names_size,
+      width,
+      bloom_size,
+    )
+    self._buffer = buffer
+    self.nbytes = size
+    self.width = width
+    self.codes = np.frombuffer(buffer, dtype=f"S{width}", count=count, offset=keys_at)
+    self.prices = np.frombuffer(buffer, dtype="<i4", count=count, offset=prices_at)
+    self.flags = np.frombuffer(buffer, dtype="u1", count=count, offset=flags_at)
+    self.name_offsets = np.frombuffer(buffer, dtype="<u4", count=count + 1, offset=offsets_at)
+    self.numeric_keys = np.frombuffer(buffer, dtype="<u8", count=numeric_count, offset=nkeys_at)
+    self.numeric_rows = np.frombuffer(buffer, dtype="<i4", count=numeric_count, offset=nrows_at)
+    self.names = memoryview(buffer)[names_at:size]
+    # ブルームフィルタのビット配列 (ビット数, ハッシュ関数の数, 登録件数)。複製せずにバッファを参照する
+    self.bloom_bits = memoryview(buffer)[bloom_at : bloom_at + (bloom_size + 7) // 8]
+    self.bloom_params = (bloom_size, bloom_hashes, bloom_count)
+    # 同じ商品コードの2行目以降（ローカル拡張側）を除いた、解決済みの行の位置
+    self._resolved = _first_rows(self.codes)
+
+  def _entry(self, i: int) -> CatalogEntry:
+    start, end = self.name_offsets[i], self.name_offsets[i + 1]
+    return CatalogEntry(
+      self.codes[i].decode(),
+      bytes(self.names[start:end]).decode(),
+      int(self.prices[i]),
+      bool(self.flags[i]),
+    )
+
+  def find(self, product_id: str) -> int:
+    """商品コードの先頭行（通常マスタ優先）の位置を返す。見つからなければ -1。"""
+    key = product_id.encode()
+    if len(key) > self.width:
+      return -1
+    i = int(np.searchsorted(self.codes, key, side="left"))
+    if i < len(self.codes) and self.codes[i] == key:
+      return i
+    return -1
+
+  def find_many(self, product_ids: Sequence[str]) -> np.ndarray:
+    """
+    複数の商品コードをまとめて検索し、先頭行（通常マスタ優先）の位置の配列を返す。見つからない要素は -1。
+    数字だけの商品コードは数値キー索引、それ以外は商品コードの配列を二分探索する。
+    """
+    found = np.full(len(product_ids), -1, dtype=np.int64)
+    if not len(product_ids):
+      return found
+    keys, numeric = numeric_keys(product_ids)
+    if len(self.numeric_keys) and numeric.any():
+      at = np.flatnonzero(numeric)
+      i = np.searchsorted(self.numeric_keys, keys[at])
+      hit = i < len(self.numeric_keys)
+      hit[hit] = self.numeric_keys[i[hit]] == keys[at][hit]
+      found[at[hit]] = self.numeric_rows[i[hit]]
+
+    others = np.flatnonzero(~numeric)
+    if len(others) and len(self.codes):
+      codes = np.array([product_ids[j].encode() for j in others], dtype=f"S{self.width + 1}")
+      fits = np.char.str_len(codes) <= self.width
+      i = np.searchsorted(self.codes, codes.astype(f"S{self.width}"))
+      hit = fits & (i < len(self.codes))
+      hit[hit] = self.codes[i[hit]] == codes[hit].astype(f"S{self.width}")
+      found[others[hit]] = i[hit]
+    return found
+
+  def get_many(self, product_ids: Sequence[str]) -> list[CatalogEntry | None]:
+    """複数の商品コードをまとめて検索する（かごの明細など）。見つからない要素は None。"""
+    found = self.find_many(product_ids)
+    hits = found[found >= 0]
+    # 見つかった行の列をまとめて取り出し、Pythonの値への変換を1回ずつで済ませる
+    codes = self.codes[hits].tolist()
+    prices = self.prices[hits].tolist()
+    flags = self.flags[hits].tolist()
+    starts = self.name_offsets[hits].tolist()
+    ends = self.name_offsets[hits + 1].tolist()
+    names = self.names
+    entries = iter(
+      [
+        CatalogEntry(code.decode(), str(names[start:end], "utf-8"), price, bool(flag))
+        for code, price, flag, start, end in zip(codes, prices, flags, starts, ends, strict=True)
+      ],
+    )
+    return [None if i < 0 else next(entries) for i in found.tolist()]
+
+  def __getitem__(self, product_id: str) -> CatalogEntry:
+    i = self.find(product_id)
+    if i < 0:
+      raise KeyError(product_id)
+    return self._entry(i)
+
+  def __iter__(self) -> Iterator[str]:
+    return (key.decode() for key in self.codes[self._resolved])
+
+  def __len__(self) -> int:
+    return len(self._resolved)
+
+  def product_ids(self) -> np.ndarray:
+    """全商品コード（重複なし）の配列。"""
+    return np.char.decode(self.codes[self._resolved], "utf-8")
+
+  def rows(self) -> Iterator[CatalogEntry]:
+    """全行（同じ商品コードの通常マスタとローカル拡張の両方）を、通常マスタ → ローカル拡張の順に返す。"""
+    for is_local in (0, 1):
+      for i in np.flatnonzero(self.flags == is_local):
+        yield self._entry(int(i))
+
+
+def segment_path(directory: Path, etag: str) -> Path:
+  return directory / f"catalog-{etag}.seg"
+
+
+def publish_segment(directory: Path, etag: str, data: bytes) -> Path:
+  """セグメントを一時ファイルに書き出し、os.replace で公開する（他のワーカーは完成したファイルだけを見る）。"""
+  directory.mkdir(parents=True, exist_ok=True)
+  path = segment_path(directory, etag)
+  tmp = path.with_suffix(f".{os.getpid()}.tmp")
+  with tmp.open("wb") as f:
+    f.write(data)
+    f.flush()
+    os.fsync(f.fileno())
+  tmp.replace(path)
+  # 古いセグメントを削除する（他のワーカーが開いているファイルも、マップ済みの内容は閉じるまで読める）
+  for old in directory.glob("catalog-*.seg"):
+    if old != path:
+      with suppress(OSError):
+        old.unlink()
+  return path
+
+
+@contextmanager
+def build_lock(directory: Path) -> Iterator[None]:
+  """
+  セグメントを作るワーカーを1つにするためのファイルロック。
+  カタログの変更に同時に気づいたワーカーは順に待ち、先のワーカーが公開したセグメントを開く（全件の読み込みは1回）。
+  """
+  directory.mkdir(parents=True, exist_ok=True)
+  with (directory / "catalog.lock").open("a") as f:
+    if fcntl is not None:
+      fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def open_segment(path: Path) -> CatalogSegment:
+  """公開済みのセグメントをメモリマップで開く。"""
+  with path.open("rb") as f:
+    return CatalogSegment(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,117 @@
+"""
+リクエストごとの処理期限（デッドライン）と、DBのステートメントタイムアウトへの反映。
+
+ルートごとに設定した秒数から処理期限を決め、そのリクエスト内で発行するSQLに残り時間を上限として適用します。
+- MySQL: SELECT には MAX_EXECUTION_TIME ヒント、更新系には innodb_lock_wait_timeout（ロック待ち）を設定
+- SQLite: プログレスハンドラで期限を過ぎた文を中断
+
+期限を過ぎた場合は DeadlineExceeded を送出します。セッションは get_db の終了処理でロールバックされ、
+接続はプールへ戻ります。処理期限はコンテキスト変数で持つため、スレッドプールで実行される同期エンドポイントにも引き継がれます。
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+# SQLiteのプログレスハンドラを呼び出す間隔（仮想マシンの命令数）
+SQLITE_PROGRESS_STEPS = 1000
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+  """リクエストの処理期限を過ぎた"""
+
+
+class RouteDeadline:
+  """
+  ルートの dependencies に指定して、リクエストの処理期限を設定する。
+
+  同期の依存関数はスレッドプールの別コンテキストで実行されるため、非同期関数として呼び出させる。
+
+  Args:
+    name: ルートの名前（環境変数 DEADLINE_<NAME>_SECONDS で上書き可能）
+    seconds: 処理期限（秒）。None または 0 以下なら期限なし
+  """
+
+  def __init__(self, name: str, seconds: float | None):
+    self.name = name
+    self.seconds = float(os.getenv(f"DEADLINE_{name.upper()}_SECONDS", str(seconds or 0))) or None
+
+  async def __call__(self) -> None:
+    if self.seconds and self.seconds > 0:
+      _deadline.set(time.monotonic() + self.seconds)
+
+
+def remaining() -> float | None:
+  """処理期限までの残り秒数（期限なしは None）。"""
+  deadline = _deadline.get()
+  return None if deadline is None else deadline - time.monotonic()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001, ARG001, PLR0913
+  left = remaining()
+  if left is None:
+    return statement, parameters
+  if left <= 0:
+    raise DeadlineExceeded("処理時間の上限を超えました")
+
+  dialect = conn.dialect.name
+  if dialect == "sqlite":
+    deadline = _deadline.get()
+    cursor.connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+  elif dialect == "mysql":
+    if statement.lstrip()[:6].upper() == "SELECT":
+      statement = statement.lstrip()
+      statement = f"SELECT /*+ MAX_EXECUTION_TIME({max(1, int(left * 1000))}) */{statement[6:]}"
+    else:
+      # 更新系はロック待ちの上限を残り時間に合わせる（秒単位、最小1秒）
+      lock_wait = max(1, math.ceil(left))
+      if conn.info.get("innodb_lock_wait_timeout") != lock_wait:
+        with cursor.connection.cursor() as c:
+          c.execute(f"SET SESSION innodb_lock_wait_timeout = {lock_wait}")
+        conn.info["innodb_lock_wait_timeout"] = lock_wait
+  return statement, parameters
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001, ARG001, PLR0913
+  if conn.dialect.name == "sqlite" and _deadline.get() is not None:
+    cursor.connection.set_progress_handler(None, 0)
+
+
+def _handle_error(context) -> None:  # noqa: ANN001
+  if _deadline.get() is None:
+    return
+  # エラー時は after_cursor_execute が呼ばれないため、ここでプログレスハンドラを外す（ロールバックを中断させない）
+  if context.dialect is not None and context.dialect.name == "sqlite" and context.connection is not None:
+    context.connection.connection.dbapi_connection.set_progress_handler(None, 0)
+  # 中断・タイムアウトによるDBのエラーは、期限を過ぎていれば DeadlineExceeded に置き換える
+  if remaining() <= 0:
+    raise DeadlineExceeded("処理時間の上限を超えました") from context.original_exception
+
+
+def _reset_on_checkin(dbapi_connection, connection_record) -> None:  # noqa: ANN001
+  # 変更したロック待ちの上限は、接続をプールへ戻すときにサーバーの既定値に戻す
+  if connection_record is not None and connection_record.info.pop("innodb_lock_wait_timeout", None) is not None:
+    cursor = dbapi_connection.cursor()
+    try:
+      cursor.execute("SET SESSION innodb_lock_wait_timeout = DEFAULT")
+    finally:
+      cursor.close()
+
+
+def install_statement_timeouts() -> None:
+  """すべてのエンジンにステートメントタイムアウトを適用するイベントを登録する（処理期限がないSQLには影響しない）。"""
+  if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+    return
+  event.listen(Engine, "before_cursor_execute", _before_cursor_execute, retval=True)
+  event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+  event.listen(Engine, "handle_error", _handle_error)
+  event.listen(Pool, "checkin", _reset_on_checkin)
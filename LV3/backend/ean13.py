@@ -0,0 +1,226 @@
+"""
+EAN-13 (JAN) コードの一括検証・チェックディジット修正モジュール。
+
+1件ずつPythonのループで計算する代わりに、JANコードの列全体を
+NumPyの数字行列 (N x 13) に変換し、重み付き和でまとめて計算します。
+大きなCSVはチャンク単位でストリーミング処理するため、メモリ使用量は一定です。
+debug/barcode_generator からは packages/ean13 のパッケージ (pos-ean13) として使います。
+
+使用例:
+  python ean13.py supplier.csv --column JANコード
+  python ean13.py supplier.csv --column JANコード --fix fixed.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+# EAN-13の重み: 左から奇数桁×1、偶数桁×3 (チェックディジットを除く12桁)
+WEIGHTS = np.array([1, 3] * 6, dtype=np.int32)
+
+# 1文字分の余裕を持たせ、14文字以上の入力を「長すぎる」と判定できるようにする
+_WIDTH = 14
+_ZERO = ord("0")
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _code_matrix(codes: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+  """
+  文字列の列を (数字行列, 文字数) に変換する。
+
+  Unicode配列をコードポイント (uint32) として直接参照するため、
+  Pythonレベルのループは発生しない。数字以外の文字は -1 以下または 10 以上になる。
+  """
+  raw = np.asarray(codes, dtype=f"U{_WIDTH}").view(np.uint32).reshape(-1, _WIDTH)
+  lengths = np.count_nonzero(raw, axis=1)
+  digits = raw[:, :13].astype(np.int64) - _ZERO
+  return digits, lengths
+
+
+def _weighted_check(digits: np.ndarray) -> np.ndarray:
+  """先頭12桁からチェックディジットを計算する。"""
+  return (10 - (digits[:, :12] @ WEIGHTS) % 10) % 10
+
+
+def validate(codes: Sequence[str]) -> np.ndarray:
+  """
+  JANコードの列をまとめて検証する。
+
+  Args:
+    codes: JANコード文字列の列
+
+  Returns:
+    各要素が正しいEAN-13ならTrueとなるbool配列
+  """
+  if len(codes) == 0:
+    return np.zeros(0, dtype=bool)
+  digits, lengths = _code_matrix(codes)
+  all_digits = ((digits >= 0) & (digits <= 9)).all(axis=1)
+  ok = (lengths == 13) & all_digits
+  return ok & (_weighted_check(np.where(ok[:, None], digits, 0)) == digits[:, 12])
+
+
+def fix(codes: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+  """
+  12桁または13桁のJANコードに正しいチェックディジットを付与する。
+
+  Args:
+    codes: JANコード文字列の列 (12桁: チェックディジットなし / 13桁: 付き)
+
+  Returns:
+    (修正後コード配列, 修正可能だったかを表すbool配列)。修正不能な要素は空文字列。
+  """
+  if len(codes) == 0:
+    return np.zeros(0, dtype="U13"), np.zeros(0, dtype=bool)
+  digits, lengths = _code_matrix(codes)
+  body_ok = ((digits[:, :12] >= 0) & (digits[:, :12] <= 9)).all(axis=1)
+  last_ok = (lengths == 12) | ((digits[:, 12] >= 0) & (digits[:, 12] <= 9))
+  fixable = ((lengths == 12) | (lengths == 13)) & body_ok & last_ok
+
+  body = np.where(fixable[:, None], digits[:, :12], 0)
+  out = np.zeros((len(body), 13), dtype=np.uint32)
+  out[:, :12] = body + _ZERO
+  out[:, 12] = _weighted_check(body) + _ZERO
+  fixed = out.view("U13").reshape(-1)
+  return np.where(fixable, fixed, ""), fixable
+
+
+@dataclass
+class ValidationReport:
+  """CSV一括検証の集計結果"""
+
+  total: int = 0
+  valid: int = 0
+  fixed: int = 0
+  invalid_rows: list[tuple[int, str]] = field(default_factory=list)
+  elapsed: float = 0.0
+
+  @property
+  def invalid(self) -> int:
+    return self.total - self.valid - self.fixed
+
+  @property
+  def rows_per_sec(self) -> float:
+    return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def iter_csv_chunks(
+  path: Path,
+  column: str,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  delimiter: str | None = None,
+  encoding: str = "utf-8",
+) -> Iterator[tuple[list[str], list[list[str]], list[str]]]:
+  """
+  CSV/TSVをチャンク単位で読み込むジェネレータ。
+
+  Args:
+    path: 入力ファイル
+    column: JANコードの列名
+    chunk_size: 1チャンクの行数
+    delimiter: 区切り文字 (None の場合は拡張子 .tsv ならタブ、それ以外はカンマ)
+    encoding: 文字コード
+
+  Yields:
+    (ヘッダ, 行のリスト, JANコードのリスト)
+  """
+  if delimiter is None:
+    delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+  with path.open(encoding=encoding, newline="") as f:
+    reader = csv.reader(f, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+      return
+    if column not in header:
+      raise ValueError(f"列 '{column}' がヘッダに存在しません: {header}")
+    index = header.index(column)
+
+    rows: list[list[str]] = []
+    for row in reader:
+      rows.append(row)
+      if len(rows) >= chunk_size:
+        yield header, rows, [r[index] if index < len(r) else "" for r in rows]
+        rows = []
+    if rows:
+      yield header, rows, [r[index] if index < len(r) else "" for r in rows]
+
+
+def validate_csv(
+  path: Path,
+  column: str,
+  fix_output: Path | None = None,
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  delimiter: str | None = None,
+  max_reported: int = 100,
+) -> ValidationReport:
+  """
+  CSVのJANコード列をチャンク単位で一括検証する。
+
+  fix_output を指定した場合は、チェックディジットを修正した列で置き換えたCSVを書き出す。
+  修正できない行はそのまま出力し、レポートの invalid_rows に記録する (先頭 max_reported 件まで)。
+  """
+  report = ValidationReport()
+  start = time.perf_counter()
+  out_file = None
+  writer = None
+  try:
+    for header, rows, codes in iter_csv_chunks(path, column, chunk_size, delimiter):
+      ok = validate(codes)
+      if fix_output is not None:
+        if writer is None:
+          out_file = fix_output.open("w", encoding="utf-8", newline="")
+          writer = csv.writer(out_file, delimiter=delimiter or ("\t" if path.suffix.lower() == ".tsv" else ","))
+          writer.writerow(header)
+        fixed, fixable = fix(codes)
+        repaired = fixable & ~ok
+        index = header.index(column)
+        for i in np.flatnonzero(repaired):
+          rows[i][index] = str(fixed[i])
+        writer.writerows(rows)
+        report.fixed += int(repaired.sum())
+        bad = ~(ok | fixable)
+      else:
+        bad = ~ok
+
+      for i in np.flatnonzero(bad)[: max(0, max_reported - len(report.invalid_rows))]:
+        # ヘッダ行を1行目として数えた行番号
+        report.invalid_rows.append((report.total + int(i) + 2, codes[i]))
+      report.valid += int(ok.sum())
+      report.total += len(codes)
+  finally:
+    if out_file is not None:
+      out_file.close()
+  report.elapsed = time.perf_counter() - start
+  return report
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description="JANコード (EAN-13) の一括検証・チェックディジット修正")
+  parser.add_argument("path", type=Path, help="入力CSV/TSVファイル")
+  parser.add_argument("--column", default="JANコード", help="JANコードの列名 (デフォルト: JANコード)")
+  parser.add_argument("--fix", type=Path, default=None, help="チェックディジットを修正したCSVの出力先")
+  parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1チャンクの行数")
+  parser.add_argument("--delimiter", default=None, help="区切り文字 (デフォルト: 拡張子から判定)")
+  args = parser.parse_args(argv)
+
+  report = validate_csv(args.path, args.column, args.fix, args.chunk_size, args.delimiter)
+  for line_no, code in report.invalid_rows:
+    print(f"✗ {line_no}行目: {code!r}")
+  print(
+    f"検証完了: {report.total}件 (正常 {report.valid}件, 修正 {report.fixed}件, 不正 {report.invalid}件) "
+    f"{report.elapsed:.2f}秒 / {report.rows_per_sec:,.0f}行/秒",
+  )
+  return 0 if report.invalid == 0 else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
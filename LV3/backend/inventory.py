@@ -0,0 +1,80 @@
+"""
+在庫の引き当て処理。
+
+購入処理の全明細を1本の条件付きUPDATE文でまとめて減算します。
+「読み取り → 計算 → 書き込み」を行わないため、同じ商品を複数のレジが同時に販売しても
+行ロックの保持時間はUPDATE文1回分で済みます。
+UPDATE文は在庫が要求数量以上の行だけを減算し、更新行数が在庫行の数に満たなければ
+在庫不足としてロールバックするため、どの在庫も減りません。
+CHECK制約 (quantity >= 0) の違反はDBごとに例外の種類が異なる（MySQLは errno 3819 が
+OperationalError になる）ため、在庫不足の判定には使いません（制約は最後の安全策として残します）。
+
+在庫行が存在しない商品は在庫管理の対象外として扱い、減算も在庫切れ判定も行いません。
+"""
+
+from __future__ import annotations
+
+from database import Stock
+from sqlalchemy import and_, case, func, select, tuple_, update
+from sqlalchemy.orm import Session  # noqa: TC002
+
+
+class InsufficientStockError(Exception):
+  """在庫不足で引き当てできなかった明細"""
+
+  def __init__(self, shortages: list[tuple[str, str, int, int]]):
+    # (店舗ID, 商品コード, 要求数量, 現在の在庫数)
+    self.shortages = shortages
+    super().__init__(", ".join(f"{product_id}（在庫 {stock} / 要求 {qty}）" for _, product_id, qty, stock in shortages))
+
+
+def decrement_stock(db: Session, requested: dict[tuple[str, str], int]) -> int:
+  """
+  (店舗ID, 商品コード) ごとの要求数量を在庫から一括で減算する。
+
+  トランザクションのコミットは呼び出し側で行う。在庫不足の場合はロールバックして
+  InsufficientStockError を送出する。
+
+  Args:
+    db: DBセッション
+    requested: {(店舗ID, 商品コード): 数量}
+
+  Returns:
+    減算した在庫行の数（在庫管理対象の明細数）
+  """
+  if not requested:
+    return 0
+
+  keys = list(requested)
+  delta = case(
+    *[(and_(Stock.store_id == store_id, Stock.product_id == product_id), qty) for (store_id, product_id), qty in requested.items()],
+    else_=0,
+  )
+  in_request = tuple_(Stock.store_id, Stock.product_id).in_(keys)
+  stmt = (
+    update(Stock)
+    .where(in_request, Stock.quantity >= delta)
+    .values(quantity=Stock.quantity - delta, updated_at=func.now())
+    .execution_options(synchronize_session=False)
+  )
+  updated = db.execute(stmt).rowcount
+  # 在庫が足りず更新されなかった行があれば、減算済みの行も含めて取り消す
+  tracked = db.execute(select(func.count()).select_from(Stock).where(in_request)).scalar_one()
+  if updated < tracked:
+    db.rollback()
+    raise InsufficientStockError(find_shortages(db, requested))
+  return updated
+
+
+def find_shortages(db: Session, requested: dict[tuple[str, str], int]) -> list[tuple[str, str, int, int]]:
+  """在庫が要求数量に満たない明細を返す（引き当て失敗時のエラーメッセージ用）。"""
+  rows = db.execute(
+    select(Stock.store_id, Stock.product_id, Stock.quantity).where(
+      tuple_(Stock.store_id, Stock.product_id).in_(list(requested)),
+    ),
+  )
+  return [
+    (store_id, product_id, requested[(store_id, product_id)], quantity)
+    for store_id, product_id, quantity in rows
+    if quantity < requested[(store_id, product_id)]
+  ]
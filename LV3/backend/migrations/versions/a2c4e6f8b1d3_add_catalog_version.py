@@ -0,0 +1,31 @@
+"""add catalog_version table
+
+Revision ID: a2c4e6f8b1d3
+Revises: f1a9c3e7d2b5
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "a2c4e6f8b1d3"
+down_revision: str | None = "f1a9c3e7d2b5"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+  # 商品マスタの変更番号（カタログの変更検出用。一括取込などの書き込みで増やす）
+  catalog_version = op.create_table(
+    "catalog_version",
+    sa.Column("id", sa.Integer(), primary_key=True, nullable=False),
+    sa.Column("version", sa.Integer(), nullable=False),
+    sa.Column("updated_at", sa.DateTime(), nullable=True),
+  )
+  op.bulk_insert(catalog_version, [{"id": 1, "version": 0}])
+
+
+def downgrade() -> None:
+  op.drop_table("catalog_version")
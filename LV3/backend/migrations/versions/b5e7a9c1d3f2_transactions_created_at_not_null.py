@@ -0,0 +1,37 @@
+"""transactions.created_at NOT NULL
+
+Revision ID: b5e7a9c1d3f2
+Revises: a2c4e6f8b1d3
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "b5e7a9c1d3f2"
+down_revision: str | None = "a2c4e6f8b1d3"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+# 作成日時のない既存の取引に入れる値。取引履歴 (created_at DESC) でこれまでどおり最後に並ぶ
+LEGACY_CREATED_AT = "1970-01-01 00:00:00"
+
+
+def upgrade() -> None:
+  # キーセットページングのカーソルに使うため、created_at を必須にする
+  for table in ("transactions", "transactions_archive"):
+    op.execute(
+      sa.text(f"UPDATE {table} SET created_at = :legacy WHERE created_at IS NULL").bindparams(
+        legacy=LEGACY_CREATED_AT,
+      ),
+    )
+    with op.batch_alter_table(table) as batch_op:
+      batch_op.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+  for table in ("transactions_archive", "transactions"):
+    with op.batch_alter_table(table) as batch_op:
+      batch_op.alter_column("created_at", existing_type=sa.DateTime(), nullable=True)
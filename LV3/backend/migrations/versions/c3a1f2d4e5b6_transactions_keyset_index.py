@@ -0,0 +1,34 @@
+"""transactions (created_at, id) keyset index
+
+Revision ID: c3a1f2d4e5b6
+Revises: 8bfbd45359dd
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision: str = "c3a1f2d4e5b6"
+down_revision: str | None = "8bfbd45359dd"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+  # 取引履歴のキーセットページング (created_at DESC, id DESC) 用
+  op.create_index("ix_transactions_created_at_id", "transactions", ["created_at", "id"], unique=False)
+  # 明細件数の集計（相関サブクエリ）用。MySQLは外部キーにインデックスを自動で作るため重複させない
+  if op.get_bind().dialect.name != "mysql":
+    op.create_index(
+      op.f("ix_transaction_details_transaction_id"),
+      "transaction_details",
+      ["transaction_id"],
+      unique=False,
+    )
+
+
+def downgrade() -> None:
+  if op.get_bind().dialect.name != "mysql":
+    op.drop_index(op.f("ix_transaction_details_transaction_id"), table_name="transaction_details")
+  op.drop_index("ix_transactions_created_at_id", table_name="transactions")
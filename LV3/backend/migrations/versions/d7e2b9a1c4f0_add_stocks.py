@@ -0,0 +1,32 @@
+"""add stocks table
+
+Revision ID: d7e2b9a1c4f0
+Revises: c3a1f2d4e5b6
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "d7e2b9a1c4f0"
+down_revision: str | None = "c3a1f2d4e5b6"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    "stocks",
+    sa.Column("store_id", sa.String(length=50), primary_key=True, nullable=False),
+    sa.Column("product_id", sa.String(length=13), primary_key=True, nullable=False),
+    sa.Column("quantity", sa.Integer(), nullable=False),
+    sa.Column("updated_at", sa.DateTime(), nullable=True),
+    # 在庫がマイナスになる更新はDB側で拒否する
+    sa.CheckConstraint("quantity >= 0", name="ck_stocks_quantity_nonnegative"),
+  )
+
+
+def downgrade() -> None:
+  op.drop_table("stocks")
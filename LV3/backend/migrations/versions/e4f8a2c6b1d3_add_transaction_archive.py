@@ -0,0 +1,52 @@
+"""add transaction archive tables
+
+Revision ID: e4f8a2c6b1d3
+Revises: d7e2b9a1c4f0
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "e4f8a2c6b1d3"
+down_revision: str | None = "d7e2b9a1c4f0"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    "transactions_archive",
+    sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False, nullable=False),
+    sa.Column("transaction_code", sa.String(length=50), nullable=True),
+    sa.Column("total_price", sa.Integer(), nullable=False),
+    sa.Column("created_at", sa.DateTime(), nullable=True),
+    sa.Column("archived_at", sa.DateTime(), nullable=True),
+    sa.UniqueConstraint("transaction_code"),
+  )
+  op.create_index("ix_transactions_archive_created_at_id", "transactions_archive", ["created_at", "id"])
+  op.create_table(
+    "transaction_details_archive",
+    sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False, nullable=False),
+    sa.Column("transaction_id", sa.Integer(), nullable=False),
+    sa.Column("product_id", sa.String(length=50), nullable=False),
+    sa.Column("product_name", sa.String(length=100), nullable=False),
+    sa.Column("unit_price", sa.Integer(), nullable=False),
+    sa.Column("quantity", sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(["transaction_id"], ["transactions_archive.id"], ondelete="CASCADE"),
+  )
+  # MySQLは外部キーにインデックスを自動で作るため重複させない
+  if op.get_bind().dialect.name != "mysql":
+    op.create_index(
+      "ix_transaction_details_archive_transaction_id",
+      "transaction_details_archive",
+      ["transaction_id"],
+    )
+
+
+def downgrade() -> None:
+  op.drop_table("transaction_details_archive")
+  op.drop_index("ix_transactions_archive_created_at_id", table_name="transactions_archive")
+  op.drop_table("transactions_archive")
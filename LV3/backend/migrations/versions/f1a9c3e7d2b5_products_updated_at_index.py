@@ -0,0 +1,26 @@
+"""products / local_products updated_at index
+
+Revision ID: f1a9c3e7d2b5
+Revises: e4f8a2c6b1d3
+Create Date: 2026-10-18
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision: str = "f1a9c3e7d2b5"
+down_revision: str | None = "e4f8a2c6b1d3"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade() -> None:
+  # ブルームフィルタ作成後に書き込まれた商品の確認 (catalog.written_since) 用
+  op.create_index(op.f("ix_products_updated_at"), "products", ["updated_at"], unique=False)
+  op.create_index(op.f("ix_local_products_updated_at"), "local_products", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+  op.drop_index(op.f("ix_local_products_updated_at"), table_name="local_products")
+  op.drop_index(op.f("ix_products_updated_at"), table_name="products")
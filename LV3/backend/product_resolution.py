@@ -0,0 +1,86 @@
+"""
+商品コードの解決（通常マスタ優先 → ローカル拡張）。
+
+商品マスタ (products) とローカル拡張マスタ (local_products) を UNION ALL でまとめ、
+優先順位 (precedence: 通常マスタ=0, ローカル拡張=1) の小さい行を採用します。
+商品API・購入処理・商品カタログはすべてこのモジュールで商品を解決するため、優先順位の規則はここにだけ書きます。
+
+文はモジュールの読み込み時に1度だけ組み立て、値はバインドパラメータで渡します。
+SQLAlchemyのコンパイル済みキャッシュにより、SQLへの変換もエンジンごとに1回で済みます。
+"""
+
+from __future__ import annotations
+
+from database import LocalProduct, Product
+from sqlalchemy import Row, String, bindparam, false, literal_column, null, select, true, union_all
+from sqlalchemy.orm import Session  # noqa: TC002
+
+MASTER_PRECEDENCE = 0
+LOCAL_PRECEDENCE = 1
+
+
+def _master_columns():
+  return (
+    Product.product_id,
+    Product.product_name,
+    Product.price,
+    null().cast(String(50)).label("store_id"),
+    false().label("is_local"),
+    literal_column(str(MASTER_PRECEDENCE)).label("precedence"),
+  )
+
+
+def _local_columns():
+  return (
+    LocalProduct.product_id,
+    LocalProduct.product_name,
+    LocalProduct.price,
+    LocalProduct.store_id,
+    true().label("is_local"),
+    literal_column(str(LOCAL_PRECEDENCE)).label("precedence"),
+  )
+
+
+# 1件の解決: 各テーブルを主キーで検索し、優先順位の高い1行だけを返す（1往復）
+_resolved_one = union_all(
+  select(*_master_columns()).where(Product.product_id == bindparam("product_id")),
+  select(*_local_columns()).where(LocalProduct.product_id == bindparam("product_id")),
+).subquery("resolved")
+RESOLVE_ONE = select(_resolved_one).order_by(_resolved_one.c.precedence).limit(1)
+
+# 複数件の解決: 購入明細の商品コードをまとめて検索する（expanding で IN 句の要素数に依存しない）
+_resolved_many = union_all(
+  select(*_master_columns()).where(Product.product_id.in_(bindparam("product_ids", expanding=True))),
+  select(*_local_columns()).where(LocalProduct.product_id.in_(bindparam("product_ids", expanding=True))),
+).subquery("resolved")
+RESOLVE_MANY = select(_resolved_many).order_by(_resolved_many.c.precedence)
+
+# 全件: 通常マスタの行 → ローカル拡張の行の順（同じ商品コードは両方の行を含む）
+_all_rows = union_all(select(*_master_columns()), select(*_local_columns())).subquery("resolved")
+ALL_ROWS = select(_all_rows).order_by(_all_rows.c.precedence)
+
+
+def resolve_product(db: Session, product_id: str) -> Row | None:
+  """
+  商品コードから商品を解決する。
+
+  Returns:
+    (product_id, product_name, price, store_id, is_local, precedence) の行。見つからなければ None
+  """
+  return db.execute(RESOLVE_ONE, {"product_id": product_id}).first()
+
+
+def resolve_products(db: Session, product_ids: list[str]) -> dict[str, Row]:
+  """複数の商品コードを1回のクエリで解決し、{商品コード: 行} を返す（見つからない商品コードは含まない）。"""
+  if not product_ids:
+    return {}
+  resolved: dict[str, Row] = {}
+  for row in db.execute(RESOLVE_MANY, {"product_ids": list(set(product_ids))}):
+    # 優先順位の昇順に並んでいるため、最初の行を採用する
+    resolved.setdefault(row.product_id, row)
+  return resolved
+
+
+def all_product_rows(db: Session) -> list[Row]:
+  """両マスタの全行を1回のクエリで返す（通常マスタ → ローカル拡張の順）。"""
+  return db.execute(ALL_ROWS).all()
@@ -0,0 +1,72 @@
+"""
+同じキーの同時実行をまとめる（シングルフライト）。
+
+開店直後やカタログの価格更新の直後は、多数のレジが同じ人気商品を同時にスキャンし、
+リクエストごとに同じ商品検索のクエリが発行されます。同じキーの処理が実行中であれば、
+後から来たリクエストは新たにクエリを発行せず、実行中の処理の結果（または例外）を受け取ります。
+
+同期エンドポイントはスレッドプールで実行されるため、スレッド間で待ち合わせます。
+待機はそのリクエストの処理期限 (deadline) までで、超えた場合は DeadlineExceeded を送出します。
+結果はキャッシュしません（処理が終われば次のリクエストは新たに実行します）。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Hashable
+from threading import Event, Lock
+from typing import Generic, TypeVar
+
+from deadline import DeadlineExceeded, remaining
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+  __slots__ = ("done", "error", "result")
+
+  def __init__(self):
+    self.done = Event()
+    self.result: T | None = None
+    self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[T]):
+  """キーごとに、実行中の処理を1つだけにする。"""
+
+  def __init__(self):
+    self._lock = Lock()
+    self._calls: dict[Hashable, _Call[T]] = {}
+
+  def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+    """key の処理が実行中ならその結果を待って返し、なければ fn を実行する。"""
+    with self._lock:
+      call = self._calls.get(key)
+      leader = call is None
+      if leader:
+        call = self._calls[key] = _Call()
+
+    if not leader:
+      left = remaining()
+      if not call.done.wait(None if left is None else max(left, 0)):
+        raise DeadlineExceeded("処理時間の上限を超えました")
+      if isinstance(call.error, DeadlineExceeded):
+        # 先に実行したリクエストが自身の処理期限で打ち切られた場合は、改めて実行する
+        return self.do(key, fn)
+      if call.error is not None:
+        raise call.error
+      return call.result
+
+    try:
+      call.result = fn()
+    except BaseException as e:
+      call.error = e
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.done.set()
+    return call.result
+
+  def __len__(self) -> int:
+    """実行中のキーの数"""
+    return len(self._calls)
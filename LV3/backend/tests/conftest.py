@@ -1,4 +1,3 @@
-import os
 import sys
 from pathlib import Path
 
@@ -12,6 +11,7 @@ if str(ROOT) not in sys.path:
 from database import Base  # noqa: E402
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 
 @pytest.fixture
@@ -51,3 +51,52 @@ def test_db_engine():
   engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
   Base.metadata.create_all(bind=engine)
   return engine
+
+
+@pytest.fixture
+def engine_memory():
+  """
+  APIテスト用のインメモリSQLiteエンジン
+  StaticPool で1つの接続を共有するため、テストクライアントのスレッドからも同じテーブルが見えます
+  """
+  engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+  )
+  Base.metadata.create_all(bind=engine)
+  return engine
+
+
+@pytest.fixture
+def override_factory():
+  """エンジンを受け取り、get_db の差し替え用の依存関数を返す関数を提供するフィクスチャ"""
+
+  def _factory(engine):
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def _override():
+      db = session_local()
+      try:
+        yield db
+      finally:
+        db.close()
+
+    return _override
+
+  return _factory
+
+
+@pytest.fixture(autouse=True)
+def _clear_app_caches(request, monkeypatch):
+  """アプリを使うテスト (app をインポートしたモジュール) の間でプロセス内キャッシュが共有されないよう毎回クリアする"""
+  app = getattr(request.module, "app", None)
+  if app is None:
+    yield
+    return
+  from catalog import Catalog
+
+  app.receipt_cache.clear()
+  # カタログは変更履歴の連番も持つため、テストごとに新しいインスタンスに差し替える
+  monkeypatch.setattr(app, "catalog", Catalog())
+  yield
@@ -0,0 +1,68 @@
+import asyncio
+
+import app
+import pytest
+from admission import AdmissionLimiter, Overloaded
+from fastapi.testclient import TestClient
+
+client = TestClient(app.app)
+
+
+def test_limiter_queues_then_hands_slot_over_in_order():
+  limiter = AdmissionLimiter("test", max_concurrent=1, max_queue=2, queue_timeout=1.0)
+  order = []
+
+  async def worker(name):
+    await limiter.acquire()
+    order.append(name)
+    await asyncio.sleep(0.01)
+    limiter.release()
+
+  async def scenario():
+    await asyncio.gather(worker("a"), worker("b"), worker("c"))
+
+  asyncio.run(scenario())
+  assert order == ["a", "b", "c"]
+  assert limiter.stats()["active"] == 0
+  assert limiter.admitted == 3
+
+
+def test_limiter_rejects_when_queue_is_full_or_budget_exceeded():
+  limiter = AdmissionLimiter("test", max_concurrent=1, max_queue=1, queue_timeout=0.05)
+
+  async def scenario():
+    await limiter.acquire()  # 処理中の枠を占有したままにする
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+    with pytest.raises(Overloaded):
+      await limiter.acquire()  # 待ち行列が満杯なので即座に断る
+    with pytest.raises(Overloaded):
+      await waiting  # 待ち時間の上限を超える
+
+  asyncio.run(scenario())
+  assert (limiter.rejected, limiter.timed_out, limiter.queued, limiter.active) == (1, 1, 0, 1)
+
+
+@pytest.fixture
+def saturated_purchase_limiter(monkeypatch):
+  """購入APIのリミッタを満杯にする（カウンタはテスト後に元の値へ戻す）。"""
+  limiter = app.admission_limiters["purchases"]
+  for counter in ("admitted", "rejected", "timed_out"):
+    monkeypatch.setattr(limiter, counter, 0)
+  monkeypatch.setattr(limiter, "active", limiter.max_concurrent)
+  monkeypatch.setattr(limiter, "max_queue", 0)
+  return limiter
+
+
+def test_purchase_overload_returns_503_with_retry_after(saturated_purchase_limiter):
+  limiter = saturated_purchase_limiter
+  response = client.post("/api/v1/purchases", json={"items": [{"product_id": "P001", "quantity": 1}]})
+  assert response.status_code == 503
+  assert response.headers["retry-after"] == "1"
+
+  stats = client.get("/api/v1/admission").json()
+  assert stats["purchases"]["active"] == limiter.max_concurrent
+  assert stats["purchases"]["rejected"] == 1
+  # 購入処理が詰まっていても商品検索の枠は別
+  assert stats["products"]["active"] == 0
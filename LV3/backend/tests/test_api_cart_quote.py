@@ -0,0 +1,67 @@
+import app
+from database import LocalProduct, Product, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+
+client = TestClient(app.app)
+
+
+def seed_products(engine):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  with SessionLocal() as db:
+    db.add(Product(product_id="P001", product_name="商品A", price=300))
+    db.add(Product(product_id="DUP001", product_name="通常商品", price=100))
+    db.add(LocalProduct(product_id="DUP001", product_name="ローカル商品", price=150, store_id="S1"))
+    db.add(LocalProduct(product_id="LP003", product_name="ローカル商品C", price=155, store_id="S1"))
+    db.commit()
+
+
+def test_quote_matches_purchase_rules(engine_memory, override_factory):
+  seed_products(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  payload = {
+    "items": [
+      {"product_id": "P001", "quantity": 2},  # 600
+      {"product_id": "DUP001", "quantity": 1},  # 100（通常マスタ優先）
+      {"product_id": "LP003", "quantity": 3},  # 465
+    ],
+  }
+  quote = client.post("/api/v1/cart/quote", json=payload).json()
+  assert [line["line_total"] for line in quote["lines"]] == [600, 100, 465]
+  assert quote["subtotal"] == 1165
+  assert quote["tax_amount"] == 117  # 116.5 -> 四捨五入
+  assert quote["total"] == 1282
+
+  purchase = client.post("/api/v1/purchases", json=payload).json()
+  assert purchase["total_price_without_tax"] == quote["subtotal"]
+  assert purchase["total_price_with_tax"] == quote["total"]
+
+
+def test_quote_served_from_cached_catalog(engine_memory, override_factory):
+  seed_products(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  payload = {"items": [{"product_id": "P001", "quantity": 1}]}
+  assert client.post("/api/v1/cart/quote", json=payload).status_code == 200
+
+  statements = []
+
+  @event.listens_for(engine_memory, "before_cursor_execute")
+  def _count(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+    statements.append(statement)
+
+  for _ in range(5):
+    assert client.post("/api/v1/cart/quote", json=payload).json()["total"] == 330
+  assert statements == []
+
+
+def test_quote_rejects_invalid_items(engine_memory, override_factory):
+  seed_products(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.post("/api/v1/cart/quote", json={"items": []}).status_code == 400
+  response = client.post("/api/v1/cart/quote", json={"items": [{"product_id": "NOPE", "quantity": 1}]})
+  assert response.status_code == 400
+  assert "NOPE" in response.json()["detail"]
+  response = client.post("/api/v1/cart/quote", json={"items": [{"product_id": "P001", "quantity": 0}]})
+  assert "数量が不正" in response.json()["detail"]
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import app
+import pytest
+from database import LocalProduct, Product, bump_catalog_version
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture(autouse=True)
+def _fast_feed(monkeypatch):
+  monkeypatch.setattr(app, "CATALOG_FEED_POLL_SECONDS", 0.01)
+  monkeypatch.setattr(app.catalog, "refresh_seconds", 0)
+
+
+def parse_event(chunk):
+  fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+  return fields["event"], fields.get("id"), json.loads(fields["data"])
+
+
+def open_feed(db, cursor):
+  """変更フィードのイベント列を返す（TestClientはレスポンス全体を待つため、ジェネレータを直接読む）。"""
+
+  async def connected():
+    return False
+
+  return app.catalog_change_events(cursor, lambda: app.catalog.ensure_fresh(db), connected)
+
+
+def test_catalog_changes_diff_between_reloads(engine_memory):
+  SessionLocal = sessionmaker(bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Product(product_id="P001", product_name="商品A", price=100))
+    db.add(Product(product_id="P002", product_name="商品B", price=200))
+    db.commit()
+    app.catalog.ensure_fresh(db)
+    assert app.catalog.sequence == 0
+
+    db.query(Product).filter_by(product_id="P001").update({"price": 120})
+    db.query(Product).filter_by(product_id="P002").delete()
+    db.add(LocalProduct(product_id="LP001", product_name="ローカル", price=50, store_id="S1"))
+    db.commit()
+    app.catalog.ensure_fresh(db)
+    app.catalog.wait_for_reload()
+
+  changes = app.catalog.changes_since(0)
+  assert sorted((c.op, c.product_id) for c in changes) == [("delete", "P002"), ("upsert", "LP001"), ("upsert", "P001")]
+  assert app.catalog.changes_since(app.catalog.sequence) == []
+  assert app.catalog.changes_since(app.catalog.sequence + 1) is None  # 再起動後など未来の連番
+
+
+def test_change_feed_pushes_price_updates(engine_memory):
+  SessionLocal = sessionmaker(bind=engine_memory)
+
+  async def scenario():
+    with SessionLocal() as db:
+      db.add(Product(product_id="P001", product_name="商品A", price=100))
+      db.commit()
+      feed = open_feed(db, None)
+      first = parse_event(await anext(feed))
+
+      db.query(Product).filter_by(product_id="P001").update({"price": 150})
+      bump_catalog_version(db)  # 同じ秒の更新は最終更新日時が変わらないため、書き込み側が変更番号を増やす
+      db.commit()
+      second = parse_event(await anext(feed))
+      await feed.aclose()
+    return first, second
+
+  first, second = asyncio.run(scenario())
+  epoch = app.catalog.epoch
+  assert first == ("sync", f"{epoch}-0", {"sequence": 0})
+  assert second == ("upsert", f"{epoch}-1", {"PRD_ID": "P001", "PRD_NAME": "商品A", "PRD_PRICE": 150, "IS_LOCAL": False})
+
+
+def test_change_feed_resumes_from_sequence(engine_memory):
+  SessionLocal = sessionmaker(bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Product(product_id="P001", product_name="商品A", price=100))
+    db.commit()
+    app.catalog.ensure_fresh(db)
+    for price in (110, 120):
+      db.query(Product).filter_by(product_id="P001").update({"price": price})
+      bump_catalog_version(db)
+      db.commit()
+      app.catalog.ensure_fresh(db)
+      app.catalog.wait_for_reload()
+
+    async def first_event(cursor):
+      feed = open_feed(db, cursor)
+      try:
+        return parse_event(await anext(feed))
+      finally:
+        await feed.aclose()
+
+    epoch = app.catalog.epoch
+    # 連番1まで受け取っていたクライアントには連番2だけを送る
+    assert asyncio.run(first_event(app.catalog.parse_event_id(f"{epoch}-1"))) == (
+      "upsert",
+      f"{epoch}-2",
+      {"PRD_ID": "P001", "PRD_NAME": "商品A", "PRD_PRICE": 120, "IS_LOCAL": False},
+    )
+    # 履歴にない連番からは再開できないため reset を送る
+    assert asyncio.run(first_event(99)) == ("reset", f"{epoch}-2", {"sequence": 2})
+    # 別のワーカー・再起動前のイベントIDは、連番が範囲内でも再開しない
+    other = app.catalog.parse_event_id("0000beef-1")
+    assert other == -1
+    assert asyncio.run(first_event(other)) == ("reset", f"{epoch}-2", {"sequence": 2})
+
+
+def test_products_with_local_reports_feed_sequence(engine_memory):
+  from database import get_db
+  from fastapi.testclient import TestClient
+
+  SessionLocal = sessionmaker(bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Product(product_id="P001", product_name="商品A", price=100))
+    db.commit()
+
+  def _override():
+    with SessionLocal() as db:
+      yield db
+
+  app.app.dependency_overrides[get_db] = _override
+  response = TestClient(app.app).get("/api/v1/products-with-local")
+  assert response.headers["x-catalog-sequence"] == f"{app.catalog.epoch}-0"
+
+
+def test_parse_event_id_requires_same_epoch():
+  catalog = app.catalog
+  assert catalog.parse_event_id(catalog.event_id(5)) == 5
+  for foreign in ("5", "", f"{catalog.epoch}-", f"{catalog.epoch}-x", f"{catalog.epoch}0-5"):
+    assert catalog.parse_event_id(foreign) == -1
@@ -0,0 +1,55 @@
+import gzip
+import json
+from datetime import datetime
+
+import app
+from database import Product, Transaction, TransactionDetail, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+
+client = TestClient(app.app)
+
+
+def seed(engine):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  with SessionLocal() as db:
+    db.add_all([Product(product_id=f"P{i:03}", product_name=f"商品{i}", price=100 + i) for i in range(5)])
+    for code, created_at in [("TRN-A", datetime(2025, 1, 15, 10)), ("TRN-B", datetime(2025, 3, 1, 9))]:
+      t = Transaction(transaction_code=code, total_price=100, created_at=created_at)
+      t.details.append(TransactionDetail(product_id="P000", product_name="商品0", unit_price=100, quantity=1))
+      db.add(t)
+    db.commit()
+
+
+def test_export_products_csv(engine_memory, override_factory):
+  seed(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  response = client.get("/api/v1/exports/products")
+  assert response.status_code == 200
+  assert response.headers["content-type"].startswith("text/csv")
+  lines = response.text.splitlines()
+  assert lines[0] == "product_id,product_name,price,created_at,updated_at"
+  assert len(lines) == 6
+  assert lines[1].startswith("P000,商品0,100,")
+
+
+def test_export_transactions_ndjson_gzip_with_date_range(engine_memory, override_factory):
+  seed(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  response = client.get(
+    "/api/v1/exports/transaction_details",
+    params={"format": "ndjson", "gzip": "true", "date_from": "2025-02-01", "date_to": "2025-03-01"},
+  )
+  assert response.status_code == 200
+  assert response.headers["content-disposition"] == 'attachment; filename="transaction_details.ndjson.gz"'
+  rows = [json.loads(line) for line in gzip.decompress(response.content).decode("utf-8").splitlines()]
+  assert len(rows) == 1
+  assert rows[0]["transaction_id"] == 2
+
+
+def test_export_rejects_invalid_requests(engine_memory, override_factory):
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.get("/api/v1/exports/users").status_code == 404
+  assert client.get("/api/v1/exports/products", params={"format": "xml"}).status_code == 400
+  assert client.get("/api/v1/exports/products", params={"date_from": "2025-01-01"}).status_code == 400
@@ -1,65 +1,43 @@
+import threading
+from datetime import datetime
+
 import app
 import pytest
-from database import Base, LocalProduct, Product, get_db
+from catalog import CatalogSnapshot
+from database import LocalProduct, Product, bump_catalog_version, get_db
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import event, update
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-
-@pytest.fixture
-def test_engine():
-  """インメモリSQLiteエンジン (StaticPool) を提供して同一接続を共有しテーブルを保持。"""
-  engine = create_engine(
-    "sqlite://",
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-  )
-  Base.metadata.create_all(bind=engine)
-  return engine
 
 
 def make_session_factory(engine):
   return sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-def override_db_factory(engine):
-  session_local = make_session_factory(engine)
-
-  def _override():
-    db = session_local()
-    try:
-      yield db
-    finally:
-      db.close()
-
-  return _override
-
-
 client = TestClient(app.app)
 
 
-def test_get_product_success(test_engine):
-  session_local = make_session_factory(test_engine)
+def test_get_product_success(engine_memory, override_factory):
+  session_local = make_session_factory(engine_memory)
   with session_local() as db:
     db.add(Product(product_id="SEARCH001", product_name="検索商品", price=500))
     db.commit()
 
-  app.app.dependency_overrides[get_db] = override_db_factory(test_engine)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   response = client.get("/api/v1/products/SEARCH001")
   assert response.status_code == 200
   data = response.json()
   assert data == {"product_id": "SEARCH001", "product_name": "検索商品", "price": 500}
 
 
-def test_get_product_prefers_regular_over_local(test_engine):
-  session_local = make_session_factory(test_engine)
+def test_get_product_prefers_regular_over_local(engine_memory, override_factory):
+  session_local = make_session_factory(engine_memory)
   with session_local() as db:
     db.add(Product(product_id="DUP001", product_name="通常商品", price=100))
     db.add(LocalProduct(product_id="DUP001", product_name="ローカル商品", price=150, store_id="S1"))
     db.commit()
 
-  app.app.dependency_overrides[get_db] = override_db_factory(test_engine)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   response = client.get("/api/v1/products/DUP001")
   assert response.status_code == 200
   data = response.json()
@@ -67,8 +45,276 @@ def test_get_product_prefers_regular_over_local(test_engine):
   assert data["price"] == 100
 
 
-def test_get_product_not_found(test_engine):
-  app.app.dependency_overrides[get_db] = override_db_factory(test_engine)
+def test_get_product_not_found(engine_memory, override_factory):
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   response = client.get("/api/v1/products/NOPE001")
   assert response.status_code == 404
   assert response.json()["detail"] == "商品が見つかりません"
+
+
+def test_get_product_barcode_png_is_cached():
+  from barcode_image import barcode_cache
+
+  barcode_cache.clear()
+  response = client.get("/api/v1/products/4901991654011/barcode.png", params={"dpi": 150})
+  assert response.status_code == 200
+  assert response.headers["content-type"] == "image/png"
+  assert response.content.startswith(b"\x89PNG")
+  assert "immutable" not in response.headers["cache-control"]
+
+  again = client.get("/api/v1/products/4901991654011/barcode.png", params={"dpi": 150})
+  assert again.content == response.content
+  assert barcode_cache.hits == 1
+
+  not_modified = client.get(
+    "/api/v1/products/4901991654011/barcode.png",
+    params={"dpi": 150},
+    headers={"If-None-Match": response.headers["etag"]},
+  )
+  assert not_modified.status_code == 304
+
+
+def test_get_product_barcode_is_immutable_only_for_current_version():
+  import barcode_image
+
+  path = "/api/v1/products/4901991654011/barcode.png"
+  version = client.get(path).headers["x-barcode-render-version"]
+  assert version == barcode_image.RENDER_VERSION
+
+  current = client.get(path, params={"v": version})
+  assert "immutable" in current.headers["cache-control"]
+
+  old = client.get(path, params={"v": "old"})
+  assert "immutable" not in old.headers["cache-control"]
+  assert "must-revalidate" in old.headers["cache-control"]
+
+
+def test_barcode_cache_is_bounded_by_bytes(monkeypatch):
+  from barcode_image import barcode_cache, render_ean13_png
+
+  barcode_cache.clear()
+  png = render_ean13_png("4901991654011", 150)
+  monkeypatch.setattr(barcode_cache, "maxbytes", len(png) * 2)
+  for code in ("4901991654028", "4901991654035"):
+    render_ean13_png(code, 150)
+  assert barcode_cache.nbytes <= len(png) * 2
+  assert ("4901991654011", 150, True) not in barcode_cache  # 最も古い画像から追い出す
+  assert ("4901991654035", 150, True) in barcode_cache
+
+
+def test_barcode_etag_depends_on_render_options(monkeypatch):
+  import barcode_image
+
+  etag = barcode_image.barcode_etag("4901991654011", 300, True)
+  monkeypatch.setattr(barcode_image, "RENDER_VERSION", "changed")
+  assert barcode_image.barcode_etag("4901991654011", 300, True) != etag
+
+
+def test_get_product_barcode_rejects_invalid_jan():
+  response = client.get("/api/v1/products/4901991654012/barcode.png")
+  assert response.status_code == 400
+
+
+def test_get_product_returns_304_without_querying_db(engine_memory, override_factory):
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="ETAG001", product_name="ETag商品", price=200))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  response = client.get("/api/v1/products/ETAG001")
+  etag = response.headers["etag"]
+  assert response.headers["cache-control"] == f"public, max-age={app.PRODUCT_CACHE_MAX_AGE}"
+
+  statements = []
+  event.listen(engine_memory, "before_cursor_execute", lambda *args: statements.append(args[2]))
+  not_modified = client.get("/api/v1/products/ETAG001", headers={"If-None-Match": f"W/{etag}"})
+  assert not_modified.status_code == 304
+  assert not_modified.headers["etag"] == etag
+  assert statements == []
+
+
+def test_get_product_unknown_code_skips_product_query(engine_memory, override_factory):
+  session_local = make_session_factory(engine_memory)
+  written = datetime(2026, 1, 1)
+  with session_local() as db:
+    db.add(Product(product_id="4901234567894", product_name="登録商品", price=200, updated_at=written))
+    db.add(LocalProduct(product_id="LP001", product_name="ローカル商品", price=150, store_id="S1", updated_at=written))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.get("/api/v1/products/LP001").status_code == 200  # カタログの読み込み
+
+  statements = []
+  event.listen(engine_memory, "before_cursor_execute", lambda *args: statements.append(args[2]))
+  response = client.get("/api/v1/products/2900000012345")  # 会員カードなど
+  assert response.status_code == 404
+  assert response.json()["detail"] == "商品が見つかりません"
+  # フィルタ作成後の書き込みの確認だけで、商品のクエリは発行しない
+  assert len(statements) == 1
+  assert "UNION ALL" not in statements[0]
+
+  assert client.get("/api/v1/products/4901234567894").json()["product_name"] == "登録商品"
+  assert len(statements) == 2
+
+
+def test_repeated_unknown_codes_probe_for_writes_once(engine_memory, monkeypatch, override_factory):
+  monkeypatch.setattr(app.catalog, "refresh_seconds", 3600)
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="4901234567894", product_name="登録商品", price=200, updated_at=datetime(2026, 1, 1)))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.get("/api/v1/products/4901234567894").status_code == 200  # カタログの読み込み
+
+  statements = []
+  event.listen(engine_memory, "before_cursor_execute", lambda *args: statements.append(args[2]))
+  for i in range(5):
+    assert client.get(f"/api/v1/products/29000000{i:04d}1").status_code == 404
+  # 書き込みの確認は確認間隔に1回だけで、以降の未登録の商品コードはDBに問い合わせない
+  assert len(statements) == 1
+
+  monkeypatch.setattr(app.catalog, "refresh_seconds", 0)
+  monkeypatch.setattr(app.catalog, "_checked_at", float("inf"))  # カタログの確認は行わせない
+  assert client.get("/api/v1/products/2900000000051").status_code == 404
+  assert len(statements) == 2  # 確認間隔が過ぎたら確認し直す
+
+
+def test_get_product_finds_product_added_after_catalog_load(engine_memory, monkeypatch, override_factory):
+  monkeypatch.setattr(app.catalog, "refresh_seconds", 3600)
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="4901234567894", product_name="登録商品", price=200, updated_at=datetime(2026, 1, 1)))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.get("/api/v1/products/4901234567894").status_code == 200  # カタログの読み込み
+
+  # カタログの再読み込み前に追加された商品も、フィルタにないからといって404にしない
+  with session_local() as db:
+    db.add(Product(product_id="4909999999992", product_name="新商品", price=300))
+    db.commit()
+  assert "4909999999992" not in app.catalog.bloom
+  response = client.get("/api/v1/products/4909999999992")
+  assert response.status_code == 200
+  assert response.json()["product_name"] == "新商品"
+
+
+def test_catalog_etag_changes_when_products_change(engine_memory, override_factory):
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="ETAG002", product_name="ETag商品", price=200))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  first = client.get("/api/v1/products-with-local")
+  etag = first.headers["etag"]
+  assert client.get("/api/v1/products-with-local", headers={"If-None-Match": etag}).status_code == 304
+
+  with session_local() as db:
+    db.add(LocalProduct(product_id="LP100", product_name="追加商品", price=80, store_id="S1"))
+    db.commit()
+  app.catalog.invalidate()  # 確認間隔を待たずに変更を検出させる
+
+  changed = client.get("/api/v1/products-with-local", headers={"If-None-Match": etag})
+  assert changed.status_code == 200
+  assert changed.headers["etag"] != etag
+  assert len(changed.json()["products"]) == 2
+
+
+def test_catalog_reload_serves_previous_snapshot_until_swapped(engine_memory, monkeypatch, override_factory):
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="4901234567894", product_name="旧商品名", price=200))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  etag = client.get("/api/v1/products-with-local").headers["etag"]
+
+  # 圧縮（スナップショットの作成）が終わらない間も、変更に気づいたリクエストは待たずに前回の内容を返す
+  release = threading.Event()
+  build = CatalogSnapshot.build
+
+  def slow_build(content):
+    release.wait()
+    return build(content)
+
+  monkeypatch.setattr(CatalogSnapshot, "build", slow_build)
+  with session_local() as db:
+    db.execute(update(Product).values(product_name="新商品名", price=250))
+    bump_catalog_version(db)
+    db.commit()
+  app.catalog.refresh_seconds = 0
+
+  # 変更の確認もバックグラウンドのスレッドで行い、リクエストからはクエリを発行しない
+  statements = []
+  event.listen(
+    engine_memory,
+    "before_cursor_execute",
+    lambda *args: statements.append((threading.current_thread().name, args[2])),
+  )
+  detecting = client.get("/api/v1/products-with-local")
+  assert detecting.headers["etag"] == etag
+  assert detecting.json()["products"][0]["PRD_NAME"] == "旧商品名"
+  assert client.get("/api/v1/products-with-local", headers={"If-None-Match": etag}).status_code == 304
+
+  release.set()
+  app.catalog.wait_for_reload()
+  assert {thread for thread, _ in statements} == {"catalog-refresh"}
+  # フィンガープリントは索引で1行ずつ読むだけ（件数や合計のための全件走査をしない）
+  fingerprint = statements[0][1].lower()
+  assert "max(" in fingerprint
+  assert "count(" not in fingerprint
+  assert "sum(" not in fingerprint
+  swapped = client.get("/api/v1/products-with-local")
+  assert swapped.headers["etag"] != etag
+  assert swapped.json()["products"][0]["PRD_NAME"] == "新商品名"
+
+
+def test_catalog_detects_name_only_edit_within_the_same_second(engine_memory, override_factory):
+  # MySQLの DATETIME は秒単位のため、同じ秒の商品名だけの修正は最終更新日時に現れない。
+  # 書き込み側が変更番号 (catalog_version) を増やせば検出できる
+  written = datetime(2026, 1, 1, 9, 0, 0)
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="4901234567894", product_name="誤記商品", price=200, updated_at=written))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  etag = client.get("/api/v1/products-with-local").headers["etag"]
+
+  with session_local() as db:
+    db.execute(update(Product).values(product_name="正しい商品名", updated_at=written))
+    bump_catalog_version(db)
+    db.commit()
+  app.catalog.refresh_seconds = 0  # invalidate() と違い、フィンガープリントの比較で変更を検出させる
+  client.get("/api/v1/products-with-local")
+  app.catalog.wait_for_reload()
+
+  changed = client.get("/api/v1/products-with-local", headers={"If-None-Match": etag})
+  assert changed.status_code == 200
+  assert changed.headers["etag"] != etag
+  assert client.get("/api/v1/products/4901234567894").json()["product_name"] == "正しい商品名"
+
+
+@pytest.mark.parametrize(
+  ("accept_encoding", "expected"),
+  [("gzip, deflate, br", "br"), ("gzip", "gzip"), ("br;q=0, gzip;q=0.5", "gzip"), ("identity", None)],
+)
+def test_products_with_local_serves_precompressed_snapshot(engine_memory, accept_encoding, expected, override_factory):
+  session_local = make_session_factory(engine_memory)
+  with session_local() as db:
+    db.add(Product(product_id="SNAP001", product_name="圧縮商品", price=120))
+    db.add(LocalProduct(product_id="SNAP001", product_name="ローカル圧縮商品", price=130, store_id="S1"))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  response = client.get("/api/v1/products-with-local", headers={"Accept-Encoding": accept_encoding})
+  assert response.status_code == 200
+  assert response.headers.get("content-encoding") == expected
+  assert "Accept-Encoding" in response.headers["vary"]
+  # httpx が展開した本文は、どの圧縮形式でも同じJSONになる
+  products = response.json()["products"]
+  assert [(p["PRD_NAME"], p["IS_LOCAL"]) for p in products] == [("圧縮商品", False), ("ローカル圧縮商品", True)]
+
+  not_modified = client.get(
+    "/api/v1/products-with-local",
+    headers={"Accept-Encoding": accept_encoding, "If-None-Match": response.headers["etag"]},
+  )
+  assert not_modified.status_code == 304
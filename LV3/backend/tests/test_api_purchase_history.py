@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import app
+from database import Transaction, TransactionDetail, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+
+client = TestClient(app.app)
+
+
+def seed_transactions(engine, count=7):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  base = datetime(2025, 10, 1, 9, 0)
+  with SessionLocal() as db:
+    for i in range(count):
+      # 2件ずつ同じ時刻にして、created_at が同じ場合も id で順序が決まることを確認する
+      t = Transaction(transaction_code=f"TRN-{i:04}", total_price=100 * (i + 1), created_at=base + timedelta(hours=i // 2))
+      for _ in range(i % 3 + 1):
+        t.details.append(TransactionDetail(product_id="P001", product_name="商品A", unit_price=100, quantity=2))
+      db.add(t)
+    db.commit()
+
+
+def test_list_purchases_keyset_pagination(engine_memory, override_factory):
+  seed_transactions(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  codes = []
+  cursor = None
+  while True:
+    params = {"limit": 3}
+    if cursor:
+      params["cursor"] = cursor
+    data = client.get("/api/v1/purchases", params=params).json()
+    codes += [item["transaction_code"] for item in data["items"]]
+    cursor = data["next_cursor"]
+    if cursor is None:
+      break
+
+  assert codes == [f"TRN-{i:04}" for i in reversed(range(7))]
+
+
+def test_list_purchases_filters_and_summary(engine_memory, override_factory):
+  seed_transactions(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  response = client.get(
+    "/api/v1/purchases",
+    params={"min_total": 200, "max_total": 400, "include_summary": "true"},
+  )
+  assert response.status_code == 200
+  items = response.json()["items"]
+  assert [i["transaction_code"] for i in items] == ["TRN-0003", "TRN-0002", "TRN-0001"]
+  assert [(i["line_count"], i["item_quantity"]) for i in items] == [(1, 2), (3, 6), (2, 4)]
+
+  response = client.get("/api/v1/purchases", params={"date_from": "2025-10-02"})
+  assert response.json()["items"] == []
+
+
+def test_list_purchases_invalid_cursor(engine_memory, override_factory):
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  assert client.get("/api/v1/purchases", params={"cursor": "!!!"}).status_code == 400
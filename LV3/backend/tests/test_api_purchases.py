@@ -1,34 +1,8 @@
 import app
-import pytest
-from database import Base, LocalProduct, Product, get_db
+from database import LocalProduct, Product, get_db
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-
-@pytest.fixture
-def engine_memory():
-  engine = create_engine(
-    "sqlite://",
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-  )
-  Base.metadata.create_all(bind=engine)
-  return engine
-
-
-def override_factory(engine):
-  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-  def _override():
-    db = SessionLocal()
-    try:
-      yield db
-    finally:
-      db.close()
-
-  return _override
 
 
 client = TestClient(app.app)
@@ -43,7 +17,7 @@ def seed_products(engine):
     db.commit()
 
 
-def test_purchase_success(engine_memory):
+def test_purchase_success(engine_memory, override_factory):
   seed_products(engine_memory)
   app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   payload = {
@@ -69,7 +43,7 @@ def test_purchase_success(engine_memory):
   assert data["transaction_code"] == data["transaction_id"]
 
 
-def test_purchase_nonexistent_product(engine_memory):
+def test_purchase_nonexistent_product(engine_memory, override_factory):
   seed_products(engine_memory)
   app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   payload = {"items": [{"product_id": "NOPE", "quantity": 1}]}
@@ -78,7 +52,7 @@ def test_purchase_nonexistent_product(engine_memory):
   assert "NOPE" in response.json()["detail"]
 
 
-def test_purchase_invalid_quantity(engine_memory):
+def test_purchase_invalid_quantity(engine_memory, override_factory):
   seed_products(engine_memory)
   app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   payload = {"items": [{"product_id": "P001", "quantity": 0}]}
@@ -87,9 +61,112 @@ def test_purchase_invalid_quantity(engine_memory):
   assert "数量が不正" in response.json()["detail"]
 
 
-def test_purchase_empty_items(engine_memory):
+def test_purchase_empty_items(engine_memory, override_factory):
   app.app.dependency_overrides[get_db] = override_factory(engine_memory)
   payload = {"items": []}
   response = client.post("/api/v1/purchases", json=payload)
   assert response.status_code == 400
   assert response.json()["detail"].startswith("リクエストが無効です。itemsが空")
+
+
+def test_get_purchase_receipt_single_query_and_cached(engine_memory, override_factory):
+  seed_products(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  payload = {"items": [{"product_id": "P001", "quantity": 2}, {"product_id": "LP003", "quantity": 1}]}
+  code = client.post("/api/v1/purchases", json=payload).json()["transaction_code"]
+
+  statements = []
+
+  @event.listens_for(engine_memory, "before_cursor_execute")
+  def _count(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+    statements.append(statement)
+
+  response = client.get(f"/api/v1/purchases/{code}")
+  assert response.status_code == 200
+  data = response.json()
+  assert data["transaction_code"] == code
+  assert data["total_price_without_tax"] == 750
+  assert data["tax_amount"] == 75
+  assert data["total_price_with_tax"] == 825
+  assert [(i["product_id"], i["line_total"]) for i in data["items"]] == [("P001", 600), ("LP003", 150)]
+  assert len(statements) == 1  # ヘッダと明細を1回のクエリで取得
+
+  # 2回目以降はキャッシュから返す（DBアクセスなし）
+  assert client.get(f"/api/v1/purchases/{code}").json() == data
+  assert len(statements) == 1
+
+
+def test_get_purchase_not_found(engine_memory, override_factory):
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  response = client.get("/api/v1/purchases/TRN-00000000-0000")
+  assert response.status_code == 404
+
+
+def test_purchase_decrements_stock_in_one_statement(engine_memory, override_factory):
+  from database import Stock
+
+  seed_products(engine_memory)
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Stock(store_id="default_store", product_id="P001", quantity=5))
+    db.add(Stock(store_id="S1", product_id="LP003", quantity=3))
+    db.commit()
+
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  payload = {
+    "items": [
+      {"product_id": "P001", "quantity": 2},
+      {"product_id": "P001", "quantity": 1},  # 同じ商品は合算して引き当て
+      {"product_id": "P002", "quantity": 1},  # 在庫行なし（在庫管理対象外）
+      {"product_id": "LP003", "quantity": 3},  # ローカル商品は店舗S1の在庫
+    ],
+  }
+  response = client.post("/api/v1/purchases", json=payload)
+  assert response.status_code == 200
+
+  with SessionLocal() as db:
+    assert db.get(Stock, ("default_store", "P001")).quantity == 2
+    assert db.get(Stock, ("S1", "LP003")).quantity == 0
+
+
+def test_purchase_insufficient_stock_rolls_back(engine_memory, override_factory):
+  from database import Stock, Transaction
+
+  seed_products(engine_memory)
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Stock(store_id="default_store", product_id="P001", quantity=5))
+    db.add(Stock(store_id="S1", product_id="LP003", quantity=1))
+    db.commit()
+
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  payload = {"items": [{"product_id": "P001", "quantity": 2}, {"product_id": "LP003", "quantity": 2}]}
+  response = client.post("/api/v1/purchases", json=payload)
+  assert response.status_code == 409
+  assert "LP003" in response.json()["detail"]
+
+  with SessionLocal() as db:
+    # どの在庫も減っておらず、取引も作成されていない
+    assert db.get(Stock, ("default_store", "P001")).quantity == 5
+    assert db.get(Stock, ("S1", "LP003")).quantity == 1
+    assert db.query(Transaction).count() == 0
+
+
+def test_insufficient_stock_does_not_rely_on_check_constraint(engine_memory, override_factory):
+  from database import Stock
+
+  seed_products(engine_memory)
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Stock(store_id="default_store", product_id="P001", quantity=1))
+    db.commit()
+
+  # MySQLではCHECK制約の違反が OperationalError (errno 3819) になるため、DBのエラーを経由せずに判定する
+  errors = []
+  event.listen(engine_memory, "handle_error", errors.append)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+  response = client.post("/api/v1/purchases", json={"items": [{"product_id": "P001", "quantity": 2}]})
+  assert response.status_code == 409
+  assert errors == []
+  with SessionLocal() as db:
+    assert db.get(Stock, ("default_store", "P001")).quantity == 1
@@ -0,0 +1,47 @@
+import app
+from database import LocalProduct, Product, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+
+client = TestClient(app.app)
+
+
+def seed_products(engine):
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  with SessionLocal() as db:
+    db.add(Product(product_id="DUP001", product_name="通常商品", price=100))
+    db.add(LocalProduct(product_id="DUP001", product_name="ローカル商品", price=150, store_id="S1"))
+    db.add(LocalProduct(product_id="LP003", product_name="ローカル商品C", price=155, store_id="S1"))
+    db.commit()
+
+
+def test_scan_channel_pipelines_lookups(engine_memory, override_factory):
+  seed_products(engine_memory)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  with client.websocket_connect("/api/v1/scan") as ws:
+    # 応答を待たずに続けて送信する
+    ws.send_json({"id": 1, "product_id": "DUP001"})
+    ws.send_json({"id": 2, "product_id": "LP003"})
+    ws.send_json({"id": "scan-3", "product_id": "NOPE001"})
+    replies = [ws.receive_json() for _ in range(3)]
+
+  assert replies == [
+    {"id": 1, "status": 200, "product": {"product_id": "DUP001", "product_name": "通常商品", "price": 100}},
+    {"id": 2, "status": 200, "product": {"product_id": "LP003", "product_name": "ローカル商品C", "price": 155}},
+    {"id": "scan-3", "status": 404, "detail": "商品が見つかりません"},
+  ]
+
+
+def test_scan_channel_rejects_invalid_messages(engine_memory, override_factory):
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  with client.websocket_connect("/api/v1/scan") as ws:
+    ws.send_text("not json")
+    assert ws.receive_json()["status"] == 400
+    ws.send_json({"id": 7})
+    assert ws.receive_json() == {"id": 7, "status": 400, "detail": "product_id を指定してください"}
+    # 不正なメッセージの後も接続は維持される
+    ws.send_json({"id": 8, "product_id": "NOPE001"})
+    assert ws.receive_json()["status"] == 404
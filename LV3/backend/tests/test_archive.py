@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import app
+from archive import archive_transactions
+from database import Transaction, TransactionArchive, TransactionDetail, TransactionDetailArchive, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+NOW = datetime(2026, 10, 1, 12, 0, 0)
+
+client = TestClient(app.app)
+
+
+def seed_transactions(engine, ages_in_days):
+  SessionLocal = sessionmaker(bind=engine)
+  with SessionLocal() as db:
+    for i, age in enumerate(ages_in_days, start=1):
+      t = Transaction(
+        id=i,
+        transaction_code=f"TRN-{i:04d}",
+        total_price=100 * i,
+        created_at=NOW - timedelta(days=age),
+      )
+      t.details = [
+        TransactionDetail(product_id="P001", product_name="商品A", unit_price=100, quantity=i),
+        TransactionDetail(product_id="P002", product_name="商品B", unit_price=50, quantity=1),
+      ]
+      db.add(t)
+    db.commit()
+
+
+def count(engine, model):
+  with engine.connect() as conn:
+    return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_archive_moves_old_transactions_in_chunks(engine_memory):
+  seed_transactions(engine_memory, [200, 150, 120, 100, 10, 1])
+
+  report = archive_transactions(bind=engine_memory, retention_days=90, chunk_size=3, now=NOW)
+
+  assert (report.transactions, report.details, report.chunks) == (4, 8, 2)
+  assert count(engine_memory, Transaction) == 2
+  assert count(engine_memory, TransactionDetail) == 4
+  assert count(engine_memory, TransactionArchive) == 4
+  assert count(engine_memory, TransactionDetailArchive) == 8
+
+  # 再実行しても移動するものはない
+  assert archive_transactions(bind=engine_memory, retention_days=90, now=NOW).transactions == 0
+
+
+def test_archive_keeps_latest_transaction(engine_memory):
+  # すべて保持期間外でも、最新の取引はホットテーブルに残す（id の再利用を防ぐ）
+  seed_transactions(engine_memory, [300, 200])
+  assert archive_transactions(bind=engine_memory, retention_days=90, now=NOW).transactions == 1
+  with engine_memory.connect() as conn:
+    assert conn.execute(select(Transaction.id)).scalars().all() == [2]
+
+
+def test_read_apis_include_archived_transactions(engine_memory, override_factory):
+  seed_transactions(engine_memory, [200, 150, 10, 1])
+  archive_transactions(bind=engine_memory, retention_days=90, now=NOW)
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  hot = client.get("/api/v1/purchases").json()
+  assert [item["transaction_code"] for item in hot["items"]] == ["TRN-0004", "TRN-0003"]
+
+  # アーカイブを含めても新しい順のキーセットページングが続く
+  page1 = client.get("/api/v1/purchases", params={"include_archive": True, "limit": 3, "include_summary": True}).json()
+  assert [item["transaction_code"] for item in page1["items"]] == ["TRN-0004", "TRN-0003", "TRN-0002"]
+  assert page1["items"][2]["item_quantity"] == 3
+  page2 = client.get("/api/v1/purchases", params={"include_archive": True, "limit": 3, "cursor": page1["next_cursor"]})
+  assert [item["transaction_code"] for item in page2.json()["items"]] == ["TRN-0001"]
+  assert page2.json()["next_cursor"] is None
+
+  receipt = client.get("/api/v1/purchases/TRN-0001")
+  assert receipt.status_code == 200
+  assert receipt.json()["items_count"] == 2
+
+  export = client.get("/api/v1/exports/transactions_archive")
+  assert export.status_code == 200
+  assert len(export.text.strip().splitlines()) == 3  # ヘッダ + 2件
@@ -0,0 +1,26 @@
+from bloom import BloomFilter, hash_key, hash_keys
+
+CODES = [str(4900000000000 + i * 7) for i in range(20_000)] + ["LP003", "0123", "123"]
+
+
+def test_scalar_and_vectorized_hashes_agree():
+  assert hash_keys(CODES).tolist() == [hash_key(code) for code in CODES]
+  assert hash_key("0123") != hash_key("123")
+
+
+def test_no_false_negatives():
+  bloom = BloomFilter.build(CODES, 0.01)
+  assert all(code in bloom for code in CODES)
+
+
+def test_false_positive_rate_is_near_target():
+  bloom = BloomFilter.build(CODES, 0.01)
+  unknown = [str(4800000000000 + i) for i in range(20_000)]
+  rate = sum(code in bloom for code in unknown) / len(unknown)
+  assert rate < 0.02
+
+
+def test_empty_filter_rejects_everything():
+  bloom = BloomFilter.build([], 0.01)
+  assert "4901234567894" not in bloom
+  assert "LP003" not in bloom
@@ -0,0 +1,64 @@
+import catalog_import
+import pytest
+from database import CatalogVersion, LocalProduct, Product
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import sessionmaker
+
+
+def test_import_products_upserts_in_chunks(engine_memory, tmp_path):
+  SessionLocal = sessionmaker(bind=engine_memory)
+  with SessionLocal() as db:
+    db.add(Product(product_id="4901991654011", product_name="旧名称", price=50))
+    db.commit()
+
+  src = tmp_path / "catalog.csv"
+  src.write_text(
+    "product_id,product_name,price\n"
+    "4901991654011,MONO消しゴム,100\n"
+    "4901991654028,MONO消しゴム 小,80\n"
+    "4901991654029,チェックディジット誤り,80\n"
+    "4901991654035,価格不正,abc\n",
+    encoding="utf-8",
+  )
+
+  report = catalog_import.import_catalog(src, bind=engine_memory, chunk_size=2)
+
+  assert (report.total, report.upserted, report.skipped) == (4, 2, 2)
+  assert [line for line, _ in report.skipped_rows] == [4, 5]
+  with SessionLocal() as db:
+    updated = db.get(Product, "4901991654011")
+    assert (updated.product_name, updated.price) == ("MONO消しゴム", 100)
+    assert db.query(Product).count() == 2
+    # チャンクごとにカタログの変更番号を増やす（同じ秒の上書きもアプリのカタログが検出できる）
+    assert db.get(CatalogVersion, 1).version == 1
+
+
+def test_import_local_products_tsv_with_fix(engine_memory, tmp_path):
+  src = tmp_path / "store.tsv"
+  src.write_text("JAN\t名称\t価格\n4901992201017\t限定ペン\t400\n490199220102\t限定のり\t250\n", encoding="utf-8")
+
+  report = catalog_import.import_catalog(
+    src,
+    table_name="local_products",
+    bind=engine_memory,
+    jan_column="JAN",
+    name_column="名称",
+    price_column="価格",
+    store_id="S1",
+    fix_check_digit=True,
+  )
+
+  assert (report.upserted, report.fixed) == (2, 2)
+  SessionLocal = sessionmaker(bind=engine_memory)
+  with SessionLocal() as db:
+    rows = {lp.product_id: lp.store_id for lp in db.query(LocalProduct).all()}
+  assert rows == {"4901992201016": "S1", "4901992201023": "S1"}
+
+
+def test_upsert_statement_per_dialect():
+  stmt = catalog_import.build_upsert("sqlite", "products")
+  assert "ON CONFLICT (product_id) DO UPDATE" in str(stmt.compile(dialect=sqlite.dialect()))
+  stmt = catalog_import.build_upsert("mysql", "local_products")
+  assert "ON DUPLICATE KEY UPDATE" in str(stmt.compile(dialect=mysql.dialect()))
+  with pytest.raises(ValueError):
+    catalog_import.build_upsert("postgresql", "products")
@@ -0,0 +1,175 @@
+import threading
+
+import pytest
+from bloom import BloomFilter
+from catalog import Catalog
+from catalog_segment import (
+  CatalogEntry,
+  build_lock,
+  CatalogSegment,
+  encode_segment,
+  numeric_keys,
+  open_segment,
+  publish_segment,
+  segment_path,
+)
+from database import Base, LocalProduct, Product
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+ROWS = [
+  ("4901234567894", "通常商品", 100, False),
+  ("4901234567894", "ローカル商品", 150, True),
+  ("4900000000001", "お茶", 120, False),
+  ("LP003", "ローカル商品C", 155, True),
+]
+
+
+@pytest.fixture
+def db():
+  engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+  )
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  with SessionLocal() as session:
+    session.add(Product(product_id="4901234567894", product_name="通常商品", price=100))
+    session.add(LocalProduct(product_id="4901234567894", product_name="ローカル商品", price=150, store_id="S1"))
+    session.add(LocalProduct(product_id="LP003", product_name="ローカル商品C", price=155, store_id="S1"))
+    session.commit()
+    yield session
+
+
+def test_segment_resolves_master_first():
+  segment = CatalogSegment(encode_segment(ROWS))
+
+  assert segment["4901234567894"] == CatalogEntry("4901234567894", "通常商品", 100, False)
+  assert segment["LP003"] == CatalogEntry("LP003", "ローカル商品C", 155, True)
+  assert segment.get("4909999999999") is None
+  assert segment.get("49012345678941") is None  # 13桁を超える商品コード
+  assert len(segment) == 3
+  assert list(segment) == ["4900000000001", "4901234567894", "LP003"]
+
+
+def test_segment_rows_keep_both_masters():
+  rows = list(CatalogSegment(encode_segment(ROWS)).rows())
+  assert [(row.product_id, row.is_local) for row in rows] == [
+    ("4900000000001", False),
+    ("4901234567894", False),
+    ("4901234567894", True),
+    ("LP003", True),
+  ]
+
+
+def test_segment_widens_keys_for_long_codes():
+  rows = [*ROWS, ("49012345678941", "14桁", 10, True), ("店舗限定おにぎり", "おにぎり", 130, True)]
+  segment = CatalogSegment(encode_segment(rows))
+
+  assert segment.width == len("店舗限定おにぎり".encode())
+  assert segment["49012345678941"].price == 10  # 先頭13桁の商品と取り違えない
+  assert segment["4901234567894"].price == 100
+  assert segment["店舗限定おにぎり"].product_name == "おにぎり"
+  assert segment.get("店舗限定おにぎりX") is None
+  assert segment.get_many(["49012345678941", "店舗限定おにぎり"]) == [segment["49012345678941"], segment["店舗限定おにぎり"]]
+  assert "49012345678941" in segment.product_ids().tolist()
+
+
+def test_segment_stores_bloom_bits():
+  bloom = BloomFilter.build(["4900000000001", "4901234567894", "LP003"], 0.01)
+  segment = CatalogSegment(encode_segment(ROWS, bloom))
+
+  shared = BloomFilter(segment.bloom_bits, *segment.bloom_params)
+  assert shared.bits == bloom.bits
+  assert all(product_id in shared for product_id in segment)
+  assert CatalogSegment(encode_segment(ROWS)).bloom_params == (0, 0, 0)
+
+
+def test_empty_segment():
+  segment = CatalogSegment(encode_segment([]))
+  assert len(segment) == 0
+  assert segment.get("4901234567894") is None
+  assert list(segment.rows()) == []
+
+
+def test_numeric_keys_keep_leading_zeros():
+  keys, valid = numeric_keys(["0123", "123", "LP003", "", "49012345678941", "4901234567894"])
+  assert valid.tolist() == [True, True, False, False, False, True]
+  assert keys[0] != keys[1]
+
+
+def test_find_many_matches_single_lookups():
+  segment = CatalogSegment(encode_segment([*ROWS, ("0123", "先頭0", 10, False), ("123", "3桁", 20, True)]))
+  basket = ["4901234567894", "LP003", "0123", "123", "4909999999999", "LP999", "", "49012345678941", "4901234567894"]
+
+  assert segment.get_many(basket) == [segment.get(product_id) for product_id in basket]
+  assert segment.find_many(basket).tolist()[4:8] == [-1, -1, -1, -1]
+  assert [entry.price for entry in segment.get_many(["0123", "123"])] == [10, 20]
+  assert CatalogSegment(encode_segment([])).get_many(["4901234567894", "LP003"]) == [None, None]
+
+
+def test_publish_replaces_old_segments(tmp_path):
+  old = publish_segment(tmp_path, "old", encode_segment(ROWS[:1]))
+  new = publish_segment(tmp_path, "new", encode_segment(ROWS))
+
+  assert not old.exists()
+  assert new == segment_path(tmp_path, "new")
+  assert open_segment(new)["4900000000001"].price == 120
+  assert list(tmp_path.iterdir()) == [new]  # 一時ファイルは残らない
+
+
+def test_catalogs_share_published_segment(db, tmp_path):
+  statements = []
+  event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+  first = Catalog(segment_dir=tmp_path)
+  first.ensure_fresh(db)
+  loaded = len(statements)
+
+  # 別ワーカーのカタログは、同じ etag のセグメントを開くだけで全件を読み込まない
+  second = Catalog(segment_dir=tmp_path)
+  second.ensure_fresh(db)
+
+  assert len(statements) - loaded == 1  # フィンガープリントの確認のみ
+  assert second.etag == first.etag
+  assert second.get("4901234567894") == first.get("4901234567894")
+  assert second.snapshot.identity == first.snapshot.identity
+  assert second.bloom.bits == first.bloom.bits  # セグメント内のビット配列を参照する
+  assert [path.name for path in tmp_path.glob("*.seg")] == [f"catalog-{first.etag}.seg"]
+
+
+def test_waiting_worker_opens_segment_built_by_lock_holder(db, tmp_path):
+  first = Catalog(segment_dir=tmp_path)
+  first.ensure_fresh(db)
+  path = segment_path(tmp_path, first.etag)
+  data = path.read_bytes()
+  path.unlink()
+
+  statements = []
+  event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+  second = Catalog(segment_dir=tmp_path)
+  # 他のワーカーがセグメントを作成中（ロックを保持）の間に変更に気づき、完成を待つ
+  with build_lock(tmp_path):
+    worker = threading.Thread(target=second.ensure_fresh, args=(db,))
+    worker.start()
+    worker.join(0.2)
+    assert worker.is_alive()
+    publish_segment(tmp_path, first.etag, data)
+  worker.join()
+
+  assert len(statements) == 1  # フィンガープリントの確認のみ
+  assert second.get("LP003") == first.get("LP003")
+
+
+def test_catalog_rebuilds_segment_in_old_format(db, tmp_path):
+  first = Catalog(segment_dir=tmp_path)
+  first.ensure_fresh(db)
+  path = segment_path(tmp_path, first.etag)
+  path.write_bytes(b"POSCAT00" + path.read_bytes()[8:])
+
+  second = Catalog(segment_dir=tmp_path)
+  second.ensure_fresh(db)
+  assert second.get_many(["4901234567894", "LP003"]) == first.get_many(["4901234567894", "LP003"])
+  assert open_segment(path)["LP003"].price == 155
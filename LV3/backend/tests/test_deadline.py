@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import app
+import pytest
+from database import Product, get_db
+from deadline import DeadlineExceeded, RouteDeadline, install_statement_timeouts
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+SLOW_QUERY = text("WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r WHERE x < 100000000) SELECT count(*) FROM r")
+
+client = TestClient(app.app)
+
+
+def test_sqlite_statement_is_interrupted_at_deadline(engine_memory):
+  install_statement_timeouts()
+
+  async def scenario():
+    await RouteDeadline("test", 0.05)()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded), engine_memory.connect() as conn:
+      conn.execute(SLOW_QUERY)
+    return time.monotonic() - start
+
+  assert asyncio.run(scenario()) < 1.0
+  # 期限のないSQLは中断されず、接続も引き続き使える
+  with engine_memory.connect() as conn:
+    assert conn.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_request_past_deadline_returns_504(engine_memory, monkeypatch, override_factory):
+  with sessionmaker(bind=engine_memory)() as db:
+    db.add(Product(product_id="P001", product_name="商品A", price=100))
+    db.commit()
+  app.app.dependency_overrides[get_db] = override_factory(engine_memory)
+
+  monkeypatch.setattr(app.route_deadlines["products"], "seconds", 1e-9)
+  response = client.get("/api/v1/products/P001")
+  assert response.status_code == 504
+  assert response.json()["detail"].startswith("処理時間の上限を超えました")
+
+  # 期限内であれば通常どおり処理され、処理期限は次のリクエストへ持ち越されない
+  monkeypatch.setattr(app.route_deadlines["products"], "seconds", 2.0)
+  assert client.get("/api/v1/products/P001").status_code == 200
+  assert client.get("/api/v1/products-with-local").status_code == 200
@@ -0,0 +1,30 @@
+import ean13
+import numpy as np
+
+
+def test_validate_mixed_codes():
+  codes = ["4901991654011", "4901991654012", "490199165401", "49019916540111", "49019916540A1", ""]
+  assert ean13.validate(codes).tolist() == [True, False, False, False, False, False]
+
+
+def test_fix_appends_or_repairs_check_digit():
+  fixed, ok = ean13.fix(["4901991654017", "490199165401", "4901991654011", "ABC"])
+  assert ok.tolist() == [True, True, True, False]
+  assert fixed.tolist() == ["4901991654011", "4901991654011", "4901991654011", ""]
+
+
+def test_validate_empty():
+  assert ean13.validate([]).shape == (0,)
+  assert isinstance(ean13.validate(["4901991654011"]), np.ndarray)
+
+
+def test_validate_csv_in_chunks(tmp_path):
+  src = tmp_path / "catalog.csv"
+  src.write_text("商品名,JANコード\nA,4901991654017\nB,4901991654028\nC,xxx\n", encoding="utf-8")
+  out = tmp_path / "fixed.csv"
+
+  report = ean13.validate_csv(src, "JANコード", fix_output=out, chunk_size=2)
+
+  assert (report.total, report.valid, report.fixed, report.invalid) == (3, 1, 1, 1)
+  assert report.invalid_rows == [(4, "xxx")]
+  assert out.read_text(encoding="utf-8").splitlines()[1] == "A,4901991654011"
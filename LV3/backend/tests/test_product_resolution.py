@@ -0,0 +1,53 @@
+import pytest
+from database import Base, LocalProduct, Product
+from product_resolution import all_product_rows, resolve_product, resolve_products
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture
+def db():
+  engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+  )
+  Base.metadata.create_all(bind=engine)
+  SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  with SessionLocal() as session:
+    session.add(Product(product_id="DUP001", product_name="通常商品", price=100))
+    session.add(LocalProduct(product_id="DUP001", product_name="ローカル商品", price=150, store_id="S1"))
+    session.add(LocalProduct(product_id="LP003", product_name="ローカル商品C", price=155, store_id="S1"))
+    session.commit()
+    yield session
+
+
+def count_statements(session):
+  statements = []
+  event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+  return statements
+
+
+def test_resolve_product_prefers_master_in_one_query(db):
+  statements = count_statements(db)
+  master = resolve_product(db, "DUP001")
+  local = resolve_product(db, "LP003")  # 通常マスタにない商品も1クエリで見つかる
+  missing = resolve_product(db, "NOPE001")
+
+  assert (master.product_name, master.is_local, master.store_id) == ("通常商品", False, None)
+  assert (local.product_name, local.is_local, local.store_id) == ("ローカル商品C", True, "S1")
+  assert missing is None
+  assert len(statements) == 3
+
+
+def test_resolve_products_resolves_basket_in_one_query(db):
+  statements = count_statements(db)
+  resolved = resolve_products(db, ["DUP001", "LP003", "DUP001", "NOPE001"])
+  assert {pid: row.price for pid, row in resolved.items()} == {"DUP001": 100, "LP003": 155}
+  assert len(statements) == 1
+
+
+def test_all_product_rows_lists_master_rows_first(db):
+  rows = all_product_rows(db)
+  assert [(row.product_id, row.is_local) for row in rows] == [("DUP001", False), ("DUP001", True), ("LP003", True)]
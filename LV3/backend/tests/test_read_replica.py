@@ -0,0 +1,105 @@
+import shutil
+
+import app
+import database
+import pytest
+from database import Base, Product, get_db
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+def make_engine(product_name, url="sqlite://"):
+  engine = create_engine(
+    url,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+  )
+  Base.metadata.create_all(bind=engine)
+  with sessionmaker(bind=engine)() as db:
+    db.add(Product(product_id="P001", product_name=product_name, price=100))
+    db.commit()
+  return engine
+
+
+client = TestClient(app.app)
+
+
+@pytest.fixture
+def primary_and_replica(monkeypatch, override_factory):
+  primary = make_engine("プライマリ")
+  replica = make_engine("レプリカ")
+  app.app.dependency_overrides[get_db] = override_factory(primary)
+  use_replica(monkeypatch, replica)
+  return primary, replica
+
+
+def use_replica(monkeypatch, replica):
+  ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica, class_=database.ReadSession)
+  monkeypatch.setattr(database, "ReadSessionLocal", ReadSessionLocal)
+  monkeypatch.setattr(database, "_replica_down_until", 0.0)
+
+
+def test_reads_use_primary_without_replica(monkeypatch, override_factory):
+  monkeypatch.setattr(database, "ReadSessionLocal", None)
+  app.app.dependency_overrides[get_db] = override_factory(make_engine("プライマリ"))
+  assert client.get("/api/v1/products/P001").json()["product_name"] == "プライマリ"
+
+
+def test_product_lookup_is_routed_to_replica(primary_and_replica):
+  assert client.get("/api/v1/products/P001").json()["product_name"] == "レプリカ"
+  names = {p["PRD_NAME"] for p in client.get("/api/v1/products-with-local").json()["products"]}
+  assert names == {"レプリカ"}
+
+
+def test_purchase_is_written_to_primary(primary_and_replica):
+  primary, replica = primary_and_replica
+  res = client.post("/api/v1/purchases", json={"items": [{"product_id": "P001", "quantity": 1}]})
+  assert res.status_code == 200
+  code = res.json()["transaction_code"]
+  # 書き込みとレシート取得はプライマリ
+  assert client.get(f"/api/v1/purchases/{code}").status_code == 200
+  with sessionmaker(bind=replica)() as db:
+    assert db.query(database.Transaction).count() == 0
+
+
+def test_falls_back_to_primary_when_replica_is_down(monkeypatch, tmp_path, override_factory):
+  broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+  app.app.dependency_overrides[get_db] = override_factory(make_engine("プライマリ"))
+  use_replica(monkeypatch, broken)
+
+  assert client.get("/api/v1/products/P001").json()["product_name"] == "プライマリ"
+  # 一定時間はレプリカへの再接続を試みない
+  assert database._replica_down_until > 0
+
+
+def test_reads_from_replica_do_not_open_a_primary_session(monkeypatch, override_factory):
+  opened = []
+  primary = override_factory(make_engine("プライマリ"))
+
+  def counting_primary():
+    opened.append(True)
+    yield from primary()
+
+  app.app.dependency_overrides[get_db] = counting_primary
+  use_replica(monkeypatch, make_engine("レプリカ"))
+
+  assert client.get("/api/v1/products/P001").json()["product_name"] == "レプリカ"
+  assert opened == []
+
+
+def test_falls_back_to_primary_when_replica_fails_mid_request(monkeypatch, tmp_path, override_factory):
+  # 直前のリクエストまでは正常だったレプリカが停止した場合も、そのリクエストはプライマリで応答する
+  (tmp_path / "replica").mkdir()
+  replica = make_engine("レプリカ", f"sqlite:///{tmp_path / 'replica' / 'replica.db'}")
+  app.app.dependency_overrides[get_db] = override_factory(make_engine("プライマリ"))
+  use_replica(monkeypatch, replica)
+  assert client.get("/api/v1/products/P001").json()["product_name"] == "レプリカ"
+
+  replica.dispose()
+  shutil.rmtree(tmp_path / "replica")
+  res = client.get("/api/v1/products/P001")
+  assert res.status_code == 200
+  assert res.json()["product_name"] == "プライマリ"
+  assert database._replica_down_until > 0
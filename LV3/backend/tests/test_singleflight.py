@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from deadline import DeadlineExceeded, RouteDeadline
+from singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, count):
+  results, errors = [], []
+
+  def worker():
+    try:
+      results.append(flight.do(key, fn))
+    except Exception as e:  # noqa: BLE001
+      errors.append(e)
+
+  threads = [threading.Thread(target=worker) for _ in range(count)]
+  for thread in threads:
+    thread.start()
+  return threads, results, errors
+
+
+def wait_for_waiters(flight, threads):
+  # 先頭のスレッドが実行を始め、残りが待機に入るまで待つ
+  for _ in range(100):
+    if len(flight) and sum(thread.is_alive() for thread in threads) == len(threads):
+      break
+    threading.Event().wait(0.01)
+
+
+def test_concurrent_calls_share_one_execution():
+  flight = SingleFlight()
+  release = threading.Event()
+  calls = []
+
+  def fetch():
+    calls.append(1)
+    release.wait(5)
+    return "商品"
+
+  threads, results, errors = run_concurrently(flight, "4901234567894", fetch, 8)
+  wait_for_waiters(flight, threads)
+  threading.Event().wait(0.05)
+  release.set()
+  for thread in threads:
+    thread.join()
+
+  assert calls == [1]
+  assert results == ["商品"] * 8
+  assert errors == []
+  assert len(flight) == 0
+  assert flight.do("4901234567894", lambda: "再検索") == "再検索"  # 結果はキャッシュしない
+
+
+def test_error_is_shared_with_waiters():
+  flight = SingleFlight()
+  release = threading.Event()
+
+  def fail():
+    release.wait(5)
+    raise RuntimeError("DB障害")
+
+  threads, results, errors = run_concurrently(flight, "key", fail, 4)
+  wait_for_waiters(flight, threads)
+  threading.Event().wait(0.05)
+  release.set()
+  for thread in threads:
+    thread.join()
+
+  assert results == []
+  assert [str(e) for e in errors] == ["DB障害"] * 4
+
+
+def test_waiter_gives_up_at_its_deadline():
+  flight = SingleFlight()
+  release = threading.Event()
+  leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait(5)))
+  leader.start()
+
+  async def scenario():
+    await RouteDeadline("test", 0.05)()
+    with pytest.raises(DeadlineExceeded):
+      flight.do("key", lambda: "実行されない")
+
+  try:
+    wait_for_waiters(flight, [leader])
+    asyncio.run(scenario())
+  finally:
+    release.set()
+    leader.join()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+外部ライブラリに依存しないEAN-13エンコーダ
+JANコードからバーパターンを計算し、SVGまたは1ビットPNGを直接出力する
+
+python-barcode + PIL の経路と同じ余白・モジュール幅の指定に対応する。
+ベンチマーク: python ean13_native.py --benchmark 10000
+"""
+
+import argparse
+import random
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import List
+
+# 左側データの符号化（L: 奇数パリティ）。Rは L のビット反転、G は R の左右反転
+L_CODES = ["0001101", "0011001", "0010011", "0111101", "0100011",
+           "0110001", "0101111", "0111011", "0110111", "0001011"]
+R_CODES = ["".join("1" if b == "0" else "0" for b in c) for c in L_CODES]
+G_CODES = [c[::-1] for c in R_CODES]
+
+# 先頭桁ごとの左側6桁のパリティパターン
+PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+          "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+START_END_GUARD = "101"
+CENTER_GUARD = "01010"
+
+# 印字用の5x7ドット数字フォント（各行5ビット）
+DIGIT_FONT = {
+    "0": ["01110", "10001", "10011", "10101", "11001", "10001", "01110"],
+    "1": ["00100", "01100", "00100", "00100", "00100", "00100", "01110"],
+    "2": ["01110", "10001", "00001", "00010", "00100", "01000", "11111"],
+    "3": ["11111", "00010", "00100", "00010", "00001", "10001", "01110"],
+    "4": ["00010", "00110", "01010", "10010", "11111", "00010", "00010"],
+    "5": ["11111", "10000", "11110", "00001", "00001", "10001", "01110"],
+    "6": ["00110", "01000", "10000", "11110", "10001", "10001", "01110"],
+    "7": ["11111", "00001", "00010", "00100", "01000", "01000", "01000"],
+    "8": ["01110", "10001", "10001", "01110", "10001", "10001", "01110"],
+    "9": ["01110", "10001", "10001", "01111", "00001", "00010", "01100"],
+}
+
+# generate_barcodes.py の python-barcode 設定と同じ既定値
+DEFAULT_OPTIONS = {
+    'module_width': 0.4,  # バーの幅（mm）
+    'module_height': 15.0,  # バーの高さ（mm）
+    'quiet_zone': 6.5,  # 余白（mm）
+    'font_size': 10,
+    'text_distance': 5,
+    'write_text': True,
+    'dpi': 300,
+}
+
+
+def validate_ean13(code: str) -> bool:
+    """EAN-13のチェックディジットを検証"""
+    if len(code) != 13 or not code.isdigit():
+        return False
+
+    digits = [int(d) for d in code[:12]]
+    odd_sum = sum(digits[i] for i in range(0, 12, 2))
+    even_sum = sum(digits[i] for i in range(1, 12, 2))
+    check_digit = (10 - ((odd_sum + even_sum * 3) % 10)) % 10
+
+    return check_digit == int(code[12])
+
+
+def encode(code: str) -> str:
+    """
+    JANコードを95モジュールのバーパターンに変換
+
+    Args:
+        code: JANコード（13桁）
+
+    Returns:
+        '1'（黒）と'0'（白）からなる95文字の文字列
+    """
+    if not validate_ean13(code):
+        raise ValueError(f"Invalid EAN-13 code: {code}")
+
+    parity = PARITY[int(code[0])]
+    left = "".join(
+        (L_CODES if p == "L" else G_CODES)[int(d)] for p, d in zip(parity, code[1:7], strict=True)
+    )
+    right = "".join(R_CODES[int(d)] for d in code[7:])
+    return START_END_GUARD + left + CENTER_GUARD + right + START_END_GUARD
+
+
+def _mm_to_px(mm: float, dpi: int) -> int:
+    return max(1, round(mm * dpi / 25.4))
+
+
+def render_svg(code: str, **options) -> str:
+    """
+    EAN-13バーコードをSVG文字列として出力（単位: mm）
+
+    Args:
+        code: JANコード（13桁）
+        **options: module_width, module_height, quiet_zone, font_size, text_distance, write_text
+
+    Returns:
+        SVG文字列
+    """
+    opts = {**DEFAULT_OPTIONS, **options}
+    pattern = encode(code)
+    mw = opts['module_width']
+    qz = opts['quiet_zone']
+    bar_h = opts['module_height']
+    text_h = opts['font_size'] * 25.4 / 72 if opts['write_text'] else 0
+    width = qz * 2 + mw * len(pattern)
+    height = bar_h + (opts['text_distance'] * 0.5 + text_h if opts['write_text'] else 0) + 1
+
+    rects = []
+    i = 0
+    while i < len(pattern):
+        if pattern[i] == "1":
+            start = i
+            while i < len(pattern) and pattern[i] == "1":
+                i += 1
+            rects.append(
+                f'<rect x="{qz + start * mw:.3f}" y="0" width="{(i - start) * mw:.3f}" height="{bar_h:.3f}"/>'
+            )
+        else:
+            i += 1
+
+    texts = []
+    if opts['write_text']:
+        baseline = bar_h + opts['text_distance'] * 0.5 + text_h * 0.8
+        for x, digit in _text_positions(code):
+            texts.append(
+                f'<text x="{qz + x * mw:.3f}" y="{baseline:.3f}">{digit}</text>'
+            )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.3f}mm" height="{height:.3f}mm" '
+        f'viewBox="0 0 {width:.3f} {height:.3f}">'
+        f'<rect width="100%" height="100%" fill="white"/>'
+        f'<g fill="black">{"".join(rects)}</g>'
+        f'<g font-family="monospace" font-size="{text_h:.3f}" text-anchor="middle">{"".join(texts)}</g>'
+        f'</svg>'
+    )
+
+
+def _text_positions(code: str) -> List[tuple]:
+    """印字する各桁の中心位置（モジュール単位、左ガードの開始を0とする）"""
+    positions = [(-4.0, code[0])]
+    positions += [(3 + 7 * i + 3.5, d) for i, d in enumerate(code[1:7])]
+    positions += [(50 + 7 * i + 3.5, d) for i, d in enumerate(code[7:])]
+    return positions
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def render_png(code: str, **options) -> bytes:
+    """
+    EAN-13バーコードを1ビット（白黒2値）のPNGとして直接出力
+
+    PILを使わず、同一のバー行を繰り返してラスタを組み立てる。
+
+    Args:
+        code: JANコード（13桁）
+        **options: module_width, module_height, quiet_zone, font_size, text_distance, write_text, dpi
+
+    Returns:
+        PNG画像のバイト列
+    """
+    opts = {**DEFAULT_OPTIONS, **options}
+    dpi = opts['dpi']
+    pattern = encode(code)
+    module_px = _mm_to_px(opts['module_width'], dpi)
+    quiet_px = _mm_to_px(opts['quiet_zone'], dpi)
+    bar_px = _mm_to_px(opts['module_height'], dpi)
+    width = quiet_px * 2 + module_px * len(pattern)
+
+    # 1ビット: 1=白, 0=黒
+    bar_bits = "1" * quiet_px + "".join(
+        ("0" if m == "1" else "1") * module_px for m in pattern
+    ) + "1" * quiet_px
+
+    rows = [bar_bits] * bar_px
+
+    if opts['write_text']:
+        # フォントサイズ(pt)から文字の高さを決め、1モジュール7つ分の枠に収まるよう拡大率を調整
+        scale = max(1, min(round(opts['font_size'] * dpi / 72 * 0.7 / 7), module_px * 7 // 6))
+        rows += ["1" * width] * _mm_to_px(opts['text_distance'] * 0.5, dpi)
+        text_rows = [["1"] * width for _ in range(7 * scale)]
+        for center, digit in _text_positions(code):
+            # 余白が狭いと先頭桁（ガードの左）は画像の外にはみ出すため、左端に寄せる
+            left = min(max(0, quiet_px + round(center * module_px) - (5 * scale) // 2), width - 5 * scale)
+            for y, line in enumerate(DIGIT_FONT[digit]):
+                for x, bit in enumerate(line):
+                    if bit == "1":
+                        for dy in range(scale):
+                            row = text_rows[y * scale + dy]
+                            row[left + x * scale:left + (x + 1) * scale] = ["0"] * scale
+        rows += ["".join(r) for r in text_rows]
+        rows += ["1" * width] * scale * 2
+
+    # 行ごとにバイト列へ変換（先頭にフィルタ種別0、末尾は白で8ビット境界まで埋める）
+    pad = "1" * (-width % 8)
+    packed = {}
+    raw = bytearray()
+    for row in rows:
+        if row not in packed:
+            bits = row + pad
+            packed[row] = b"\x00" + int(bits, 2).to_bytes(len(bits) // 8, "big")
+        raw += packed[row]
+
+    ppm = round(dpi / 0.0254)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, len(rows), 1, 0, 0, 0, 0)),
+        _png_chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1)),
+        _png_chunk(b"IDAT", zlib.compress(bytes(raw), 6)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+def benchmark(count: int = 10000) -> None:
+    """python-barcode + PIL の経路とネイティブエンコーダの生成速度を比較"""
+    codes = []
+    for _ in range(count):
+        body = "".join(random.choice("0123456789") for _ in range(12))
+        digits = [int(d) for d in body]
+        check = (10 - (sum(digits[0::2]) + sum(digits[1::2]) * 3) % 10) % 10
+        codes.append(body + str(check))
+
+    start = time.perf_counter()
+    for code in codes:
+        render_png(code)
+    native_png = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for code in codes:
+        render_svg(code)
+    native_svg = time.perf_counter() - start
+
+    print(f"{count}件のEAN-13を生成")
+    print(f"  native PNG     : {native_png:.2f}秒 ({count / native_png:,.0f}件/秒)")
+    print(f"  native SVG     : {native_svg:.2f}秒 ({count / native_svg:,.0f}件/秒)")
+
+    try:
+        import io
+
+        import barcode
+        from barcode.writer import ImageWriter
+    except ImportError:
+        print("  python-barcode : 未インストールのため比較をスキップ")
+        return
+
+    options = {**DEFAULT_OPTIONS, 'background': 'white', 'foreground': 'black'}
+    start = time.perf_counter()
+    for code in codes:
+        barcode.get('ean13', code, writer=ImageWriter()).write(io.BytesIO(), options=options)
+    reference = time.perf_counter() - start
+    print(f"  python-barcode : {reference:.2f}秒 ({count / reference:,.0f}件/秒)")
+    print(f"  高速化率 (PNG) : {reference / native_png:.1f}倍")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="依存ライブラリなしのEAN-13エンコーダ")
+    parser.add_argument("code", nargs="?", help="JANコード（13桁）")
+    parser.add_argument("-o", "--output", type=Path, help="出力ファイル（.svg または .png）")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="N件で生成速度を比較")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not args.code or not args.output:
+        parser.error("JANコードと --output を指定してください")
+
+    if args.output.suffix.lower() == ".svg":
+        args.output.write_text(render_svg(args.code), encoding="utf-8")
+    else:
+        args.output.write_bytes(render_png(args.code))
+    print(f"✓ {args.code} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
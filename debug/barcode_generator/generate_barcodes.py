@@ -2,40 +2,67 @@
 """
 EAN-13バーコード画像を一括生成するスクリプト
 標準準拠のバーコードを生成し、印刷に適した形式で出力
+
+画像の生成は既定でCPUコア数のプロセスで並列に行う（以前は直列処理）。
+従来どおり1プロセスで実行する場合は --workers 1 を指定する。
 """
 
+import argparse
 import csv
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 try:
-    import barcode
-    from barcode.writer import ImageWriter
     from PIL import Image, ImageDraw, ImageFont
 except ImportError:
     print("必要なライブラリをインストールしています...")
     import subprocess
-    subprocess.run(["pip", "install", "python-barcode", "pillow"], check=True)
-    import barcode
-    from barcode.writer import ImageWriter
+    subprocess.run(["pip", "install", "pillow"], check=True)
     from PIL import Image, ImageDraw, ImageFont
 
+import ean13
+import ean13_native
+from ean13_native import validate_ean13
+
+RENDERERS = ("native", "python-barcode")
+
+# バーコード生成設定
+BARCODE_OPTIONS = {
+    'module_width': 0.4,  # バーの幅（mm）
+    'module_height': 15.0,  # バーの高さ（mm）
+    'quiet_zone': 6.5,  # 余白（mm）
+    'font_size': 10,
+    'text_distance': 5,
+    'background': 'white',
+    'foreground': 'black',
+    'write_text': True,
+    'dpi': 300,  # 高解像度で印刷品質を向上
+}
+
+MANIFEST_NAME = "manifest.json"
 
-def validate_ean13(code: str) -> bool:
-    """EAN-13のチェックディジットを検証"""
-    if len(code) != 13 or not code.isdigit():
-        return False
-    
-    digits = [int(d) for d in code[:12]]
-    odd_sum = sum(digits[i] for i in range(0, 12, 2))
-    even_sum = sum(digits[i] for i in range(1, 12, 2))
-    check_digit = (10 - ((odd_sum + even_sum * 3) % 10)) % 10
-    
-    return check_digit == int(code[12])
 
+def _load_python_barcode():
+    """python-barcode を必要になった時点で読み込む（未インストールならインストール）"""
+    try:
+        import barcode
+        from barcode.writer import ImageWriter
+    except ImportError:
+        print("必要なライブラリをインストールしています...")
+        import subprocess
+        subprocess.run(["pip", "install", "python-barcode"], check=True)
+        import barcode
+        from barcode.writer import ImageWriter
+    return barcode, ImageWriter
 
-def generate_barcode(jan_code: str, product_name: str, output_dir: Path) -> Path:
+
+def generate_barcode(
+    jan_code: str, product_name: str, output_dir: Path, renderer: str = "python-barcode"
+) -> Path:
     """
     標準準拠のEAN-13バーコード画像を生成
     
@@ -43,6 +70,7 @@ def generate_barcode(jan_code: str, product_name: str, output_dir: Path) -> Path
         jan_code: JANコード（13桁）
         product_name: 商品名
         output_dir: 出力ディレクトリ
+        renderer: "python-barcode"（ImageWriter経由）または "native"（1ビットPNGを直接出力）
     
     Returns:
         生成された画像のパス
@@ -51,57 +79,119 @@ def generate_barcode(jan_code: str, product_name: str, output_dir: Path) -> Path
     if not validate_ean13(jan_code):
         raise ValueError(f"Invalid EAN-13 code: {jan_code}")
     
-    # バーコード生成設定
-    options = {
-        'module_width': 0.4,  # バーの幅（mm）
-        'module_height': 15.0,  # バーの高さ（mm）
-        'quiet_zone': 6.5,  # 余白（mm）
-        'font_size': 10,
-        'text_distance': 5,
-        'background': 'white',
-        'foreground': 'black',
-        'write_text': True,
-        'dpi': 300,  # 高解像度で印刷品質を向上
-    }
+    options = BARCODE_OPTIONS
+    generated_path = barcode_output_path(jan_code, product_name, output_dir)
+    barcode_path = generated_path.with_suffix("")
+    
+    if renderer == "native":
+        generated_path.write_bytes(ean13_native.render_png(
+            jan_code,
+            **{k: v for k, v in options.items() if k not in ('background', 'foreground')},
+        ))
+        return generated_path
     
     # バーコード生成
+    barcode, ImageWriter = _load_python_barcode()
     ean = barcode.get('ean13', jan_code, writer=ImageWriter())
     
-    # ファイル名を安全な形式に変換
-    safe_name = "".join(c if c.isalnum() or c in (' ', '_', '-') else '_' for c in product_name)
-    filename = f"{safe_name}_{jan_code}"
-    
-    # バーコード画像を生成（拡張子なしで指定）
-    barcode_path = output_dir / filename
+    # バーコード画像を生成（拡張子なしで指定、.pngが自動追加される）
     ean.save(str(barcode_path), options=options)
     
-    # 生成されたファイルのパス（.pngが自動追加される）
-    generated_path = Path(f"{barcode_path}.png")
-    
     return generated_path
 
 
-def create_printable_sheet(barcodes: List[Tuple[str, str, Path]], output_path: Path):
+def barcode_output_path(jan_code: str, product_name: str, output_dir: Path) -> Path:
+    """商品名とJANコードから個別バーコード画像の出力パスを決める"""
+    # ファイル名を安全な形式に変換
+    safe_name = "".join(c if c.isalnum() or c in (' ', '_', '-') else '_' for c in product_name)
+    return output_dir / f"{safe_name}_{jan_code}.png"
+
+
+def content_hash(*parts) -> str:
+    """出力内容を決める要素（JANコード、商品名、描画設定など）のハッシュ値"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """前回実行時のマニフェスト（出力ファイル名 → ハッシュ値）を読み込む"""
+    manifest_path = output_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {"barcodes": {}, "sheets": {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.setdefault("barcodes", {})
+    manifest.setdefault("sheets", {})
+    return manifest
+
+
+def save_manifest(output_dir: Path, manifest: dict):
+    """マニフェストを書き出す（途中で中断しても壊れないよう一時ファイル経由で置き換える）"""
+    manifest_path = output_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def remove_orphans(output_dir: Path, previous: dict, current: dict) -> List[str]:
+    """前回のマニフェストにあって今回存在しない出力ファイルを削除する"""
+    removed = []
+    for name in sorted(set(previous) - set(current)):
+        path = output_dir / name
+        if path.exists():
+            path.unlink()
+            removed.append(name)
+    return removed
+
+
+# A4サイズ（210mm x 297mm）を300dpiで計算
+A4_WIDTH = int(210 * 300 / 25.4)  # 2480px
+A4_HEIGHT = int(297 * 300 / 25.4)  # 3508px
+
+# 余白
+SHEET_MARGIN = 100
+SHEET_SPACING = 50
+
+# 日本語フォントの候補（優先順位順）
+FONT_PATHS = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/takao-gothic/TakaoPGothic.ttf",
+    "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
+]
+
+
+def load_label_font(size: int = 18):
     """
-    複数のバーコードを1枚の印刷用シートにまとめる
+    商品名表示用の日本語フォントを読み込む
     
-    Args:
-        barcodes: (商品名, JANコード, 画像パス)のリスト
-        output_path: 出力画像パス
+    Returns:
+        (フォント, 日本語フォントが見つかったか)
     """
-    # A4サイズ（210mm x 297mm）を300dpiで計算
-    a4_width = int(210 * 300 / 25.4)  # 2480px
-    a4_height = int(297 * 300 / 25.4)  # 3508px
-    
-    # 余白
-    margin = 100
-    spacing = 50
+    for font_path in FONT_PATHS:
+        try:
+            # NotoSansCJK-Regular.ttcの場合はインデックス指定が必要
+            if "NotoSansCJK" in font_path:
+                return ImageFont.truetype(font_path, size, index=0), True  # index 0 = JP
+            return ImageFont.truetype(font_path, size), True
+        except Exception:
+            continue
+    return ImageFont.load_default(), False
+
+
+def layout_pages(barcodes: List[Tuple[str, str, Path]]) -> List[List[Tuple[str, str, Path, int, int, int]]]:
+    """
+    バーコードをA4ページに割り付ける（画像はヘッダのみ読み込み、描画はしない）
     
-    # 白背景のシートを作成
-    sheet = Image.new('RGB', (a4_width, a4_height), 'white')
+    Args:
+        barcodes: (商品名, JANコード, 画像パス)のリスト
     
-    # バーコードを配置
-    x, y = margin, margin
+    Returns:
+        ページごとの (商品名, JANコード, 画像パス, x, y, 画像の高さ) のリスト
+    """
+    pages = [[]]
+    x, y = SHEET_MARGIN, SHEET_MARGIN
     max_height = 0
     
     for product_name, jan_code, barcode_path in barcodes:
@@ -109,70 +199,159 @@ def create_printable_sheet(barcodes: List[Tuple[str, str, Path]], output_path: P
             print(f"Warning: {barcode_path} not found")
             continue
         
-        # バーコード画像を読み込み
-        barcode_img = Image.open(barcode_path)
+        with Image.open(barcode_path) as barcode_img:
+            width, height = barcode_img.size
         
         # 次の行に移動が必要かチェック
-        if x + barcode_img.width + margin > a4_width:
-            x = margin
-            y += max_height + spacing
+        if x + width + SHEET_MARGIN > A4_WIDTH:
+            x = SHEET_MARGIN
+            y += max_height + SHEET_SPACING
             max_height = 0
         
-        # ページに収まらない場合は終了
-        if y + barcode_img.height + margin > a4_height:
-            print(f"Warning: Not enough space for all barcodes. Stopping at {product_name}")
-            break
-        
-        # バーコードを貼り付け
-        sheet.paste(barcode_img, (x, y))
+        # ページに収まらない場合は次のページへ
+        if y + height + SHEET_MARGIN > A4_HEIGHT and pages[-1]:
+            pages.append([])
+            x, y = SHEET_MARGIN, SHEET_MARGIN
+            max_height = 0
         
-        # 商品名を追加（日本語フォント対応）
-        draw = ImageDraw.Draw(sheet)
+        pages[-1].append((product_name, jan_code, barcode_path, x, y, height))
         
-        # 日本語フォントを試す（優先順位順）
-        font = None
-        font_paths = [
-            "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-            "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
-            "/usr/share/fonts/truetype/takao-gothic/TakaoPGothic.ttf",
-            "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
-        ]
+        # 次の位置を計算
+        x += width + SHEET_SPACING
+        max_height = max(max_height, height + 30)
+    
+    return [page for page in pages if page]
+
+
+def sheet_page_paths(output_path: Path, page_count: int) -> List[Path]:
+    """印刷用シートの出力パス（PDFは1ファイル、PNGはページごとの連番）"""
+    if output_path.suffix.lower() == ".pdf":
+        return [output_path]
+    return [output_path.with_name(f"{output_path.stem}_{i + 1:03d}.png") for i in range(page_count)]
+
+
+def create_printable_sheet(
+    barcodes: List[Tuple[str, str, Path]],
+    output_path: Path,
+    pages: Optional[List[List[Tuple[str, str, Path, int, int, int]]]] = None,
+    skip_pages: Iterable[int] = (),
+) -> List[Path]:
+    """
+    複数のバーコードを印刷用シートにまとめる（A4複数ページ対応）
+    
+    1ページ分の画像だけをメモリに保持し、埋まったページから順にディスクへ書き出す。
+    出力先の拡張子が .pdf の場合は複数ページのPDF、それ以外は連番のPNG
+    （例: printable_sheet_001.png, printable_sheet_002.png）を出力する。
+    
+    Args:
+        barcodes: (商品名, JANコード, 画像パス)のリスト
+        output_path: 出力パス（.pdf または .png）
+        pages: layout_pages() の結果（省略時はここで割り付ける）
+        skip_pages: 再描画を省略するページ番号（PNG出力時のみ有効）
+    
+    Returns:
+        印刷用シートのファイルパスのリスト
+    """
+    if pages is None:
+        pages = layout_pages(barcodes)
+    
+    is_pdf = output_path.suffix.lower() == ".pdf"
+    if is_pdf and output_path.exists():
+        output_path.unlink()  # PDFはページを追記していくため既存ファイルを削除
+    skip_pages = set() if is_pdf else set(skip_pages)
+    page_paths = sheet_page_paths(output_path, len(pages))
+    
+    # フォントと描画ハンドルは実行ごとに1回だけ用意し、ページ間で使い回す
+    font, has_cjk_font = load_label_font()
+    sheet = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), 'white')
+    draw = ImageDraw.Draw(sheet)
+    
+    for index, page in enumerate(pages):
+        if index in skip_pages:
+            continue
         
-        for font_path in font_paths:
-            try:
-                # NotoSansCJK-Regular.ttcの場合はインデックス指定が必要
-                if "NotoSansCJK" in font_path:
-                    font = ImageFont.truetype(font_path, 18, index=0)  # index 0 = JP
-                else:
-                    font = ImageFont.truetype(font_path, 18)
-                break
-            except Exception as e:
-                continue
+        for product_name, jan_code, barcode_path, x, y, height in page:
+            # バーコードを貼り付け
+            with Image.open(barcode_path) as barcode_img:
+                sheet.paste(barcode_img, (x, y))
+            
+            # 商品名を追加（日本語フォントが見つからない場合はJANコードのみ表示）
+            text_to_display = product_name if has_cjk_font else jan_code
+            draw.text((x, y + height + 5), text_to_display, fill='black', font=font)
         
-        # フォントが見つからない場合はJANコードのみ表示
-        if font is None:
-            font = ImageFont.load_default()
-            text_to_display = jan_code
+        # ページを書き出し、白紙に戻す
+        if is_pdf:
+            sheet.save(output_path, "PDF", resolution=300, append=output_path.exists())
         else:
-            text_to_display = product_name
-        
-        text_y = y + barcode_img.height + 5
-        draw.text((x, text_y), text_to_display, fill='black', font=font)
-        
-        # 次の位置を計算
-        x += barcode_img.width + spacing
-        max_height = max(max_height, barcode_img.height + 30)
+            sheet.save(page_paths[index], dpi=(300, 300))
+        print(f"Printable sheet page saved: {page_paths[0] if is_pdf else page_paths[index]}")
+        draw.rectangle((0, 0, A4_WIDTH, A4_HEIGHT), fill='white')
+    
+    return page_paths
+
+
+def _generate_task(task: Tuple[str, str, Path, str]) -> Tuple[str, str, Optional[Path], Optional[str]]:
+    """
+    1件分のバーコード生成（ワーカープロセスで実行）
+    
+    例外はプロセス間で受け渡せるよう文字列に変換して返す
+    """
+    product_name, jan_code, output_dir, renderer = task
+    try:
+        return product_name, jan_code, generate_barcode(jan_code, product_name, output_dir, renderer), None
+    except Exception as e:
+        return product_name, jan_code, None, str(e)
+
+
+def generate_all(
+    tasks: List[Tuple[str, str, Path, str]], workers: int
+) -> Iterator[Tuple[str, str, Optional[Path], Optional[str]]]:
+    """
+    バーコードをまとめて生成し、CSVの行順で結果を返す
+    
+    Args:
+        tasks: (商品名, JANコード, 出力ディレクトリ, 描画方式)のリスト
+        workers: ワーカープロセス数（1以下の場合は直列処理）
     
-    # シートを保存
-    sheet.save(output_path, dpi=(300, 300))
-    print(f"Printable sheet saved: {output_path}")
+    Yields:
+        (商品名, JANコード, 画像パス or None, エラーメッセージ or None)
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(_generate_task, tasks)
+        return
+    
+    # CSVをコア数に応じたまとまりに分割して各プロセスへ配る（結果は入力順で返る）
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_generate_task, tasks, chunksize=chunksize)
 
 
 def main():
     """メイン処理"""
     script_dir = Path(__file__).parent
-    csv_path = script_dir / "barcodes.csv"
-    output_dir = script_dir / "output"
+    
+    parser = argparse.ArgumentParser(description="EAN-13バーコード画像を一括生成")
+    parser.add_argument("--csv", type=Path, default=script_dir / "barcodes.csv", help="入力CSV")
+    parser.add_argument("--output", type=Path, default=script_dir / "output", help="出力ディレクトリ")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="並列生成のプロセス数（デフォルト: CPUコア数、1で直列処理）",
+    )
+    parser.add_argument(
+        "--renderer", choices=RENDERERS, default="python-barcode",
+        help="バーコードの描画方式（native: 内蔵エンコーダ, python-barcode: ImageWriter）",
+    )
+    parser.add_argument(
+        "--sheet-format", choices=["png", "pdf"], default="png",
+        help="印刷用シートの形式（png: ページごとの連番PNG, pdf: 複数ページPDF）",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="マニフェストを無視してすべての画像と印刷用シートを再生成する",
+    )
+    args = parser.parse_args()
+    csv_path = args.csv
+    output_dir = args.output
     
     # 出力ディレクトリを作成
     output_dir.mkdir(exist_ok=True)
@@ -188,39 +367,115 @@ def main():
     error_count = 0
     
     with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            product_name = row['商品名']
-            jan_code = row['JANコード']
-            
-            try:
-                # バーコード生成
-                barcode_path = generate_barcode(jan_code, product_name, output_dir)
-                barcodes.append((product_name, jan_code, barcode_path))
+        rows = list(csv.DictReader(f))
+    
+    # JANコード列をまとめて検証し、不正なコードは画像生成前に除外
+    valid_flags = ean13.validate([row['JANコード'] for row in rows])
+    
+    # 前回のマニフェストと比較し、内容が変わっていない画像は再生成しない
+    manifest = load_manifest(output_dir)
+    if args.force:
+        manifest = {"barcodes": {}, "sheets": {}}
+    render_options = {**BARCODE_OPTIONS, 'renderer': args.renderer}
+    current_barcodes = {}
+    pending = []
+    for row, is_valid in zip(rows, valid_flags, strict=True):
+        if not is_valid:
+            pending.append(None)
+            continue
+        barcode_path = barcode_output_path(row['JANコード'], row['商品名'], output_dir)
+        digest = content_hash(row['JANコード'], row['商品名'], render_options)
+        current_barcodes[barcode_path.name] = digest
+        unchanged = manifest["barcodes"].get(barcode_path.name) == digest and barcode_path.exists()
+        pending.append(barcode_path if unchanged else False)
+    
+    tasks = [
+        (row['商品名'], row['JANコード'], output_dir, args.renderer)
+        for row, state in zip(rows, pending, strict=True) if state is False
+    ]
+    results = generate_all(tasks, args.workers)
+    errors = []
+    skipped_count = 0
+    
+    print(f"並列数: {args.workers}, 再生成: {len(tasks)}件")
+    # 結果はCSVの行順で受け取り、不正なコードの行と合わせて順番どおりに表示する
+    for row, state in zip(rows, pending, strict=True):
+        if state is False:
+            product_name, jan_code, barcode_path, error = next(results)
+        elif state is None:
+            product_name, jan_code, barcode_path = row['商品名'], row['JANコード'], None
+            error = f"Invalid EAN-13 code: {jan_code}"
+        else:
+            product_name, jan_code, barcode_path, error = row['商品名'], row['JANコード'], state, None
+        
+        if error is None:
+            barcodes.append((product_name, jan_code, barcode_path))
+            if state is False:
                 print(f"✓ {product_name}: {jan_code}")
-                success_count += 1
-            except Exception as e:
-                print(f"✗ {product_name}: {jan_code} - Error: {e}")
-                error_count += 1
+            else:
+                skipped_count += 1
+            success_count += 1
+        else:
+            print(f"✗ {product_name}: {jan_code} - Error: {error}")
+            errors.append((product_name, jan_code, error))
+            current_barcodes.pop(barcode_output_path(jan_code, product_name, output_dir).name, None)
+            error_count += 1
     
     print()
-    print(f"生成完了: {success_count}個成功, {error_count}個失敗")
+    print(f"生成完了: {success_count}個成功（うち変更なし {skipped_count}個）, {error_count}個失敗")
+    if errors:
+        print("失敗一覧:")
+        for product_name, jan_code, message in errors:
+            print(f"  ✗ {product_name}: {jan_code} - {message}")
     
-    # 印刷用シートを作成
-    if barcodes:
+    # 今回のCSVに存在しない古い画像を削除
+    for name in remove_orphans(output_dir, manifest["barcodes"], current_barcodes):
+        print(f"削除: {name}")
+    manifest["barcodes"] = current_barcodes
+    
+    # 印刷用シートを作成（PNGの場合は内容が変わったページだけ再描画）
+    sheet_path = output_dir / f"printable_sheet.{args.sheet_format}"
+    pages = layout_pages(barcodes)
+    page_paths = sheet_page_paths(sheet_path, len(pages))
+    current_sheets = {}
+    if args.sheet_format == "pdf":
+        if pages:
+            current_sheets[sheet_path.name] = content_hash(
+                [[(current_barcodes[p.name], x, y) for _, _, p, x, y, _ in page] for page in pages]
+            )
+    else:
+        for page_path, page in zip(page_paths, pages, strict=True):
+            current_sheets[page_path.name] = content_hash(
+                [(current_barcodes[p.name], x, y) for _, _, p, x, y, _ in page]
+            )
+    unchanged_pages = {
+        i for i, page_path in enumerate(page_paths)
+        if page_path.exists() and manifest["sheets"].get(page_path.name) == current_sheets.get(page_path.name)
+    }
+    for name in remove_orphans(output_dir, manifest["sheets"], current_sheets):
+        print(f"削除: {name}")
+    manifest["sheets"] = current_sheets
+    
+    if pages:
         print()
-        print("印刷用シートを作成中...")
-        sheet_path = output_dir / "printable_sheet.png"
-        create_printable_sheet(barcodes, sheet_path)
+        if len(unchanged_pages) == len(page_paths):
+            print("印刷用シートに変更はありません")
+            sheet_pages = page_paths
+        else:
+            print("印刷用シートを作成中...")
+            sheet_pages = create_printable_sheet(barcodes, sheet_path, pages, unchanged_pages)
+    save_manifest(output_dir, manifest)
+    
+    if pages:
         print()
         print("=" * 60)
         print("すべて完了しました！")
         print()
         print(f"個別バーコード: {output_dir}")
-        print(f"印刷用シート: {sheet_path}")
+        print(f"印刷用シート: {', '.join(p.name for p in sheet_pages)}")
         print()
         print("印刷手順:")
-        print("1. printable_sheet.png を開く")
+        print(f"1. {sheet_pages[0].name} を開く")
         print("2. A4用紙に印刷（推奨: カラー、高品質モード）")
         print("3. または、個別の画像をGoogleスプレッドシートに挿入")
 
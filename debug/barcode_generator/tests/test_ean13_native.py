@@ -0,0 +1,41 @@
+import struct
+import zlib
+
+import pytest
+
+import ean13_native
+from ean13_native import DEFAULT_OPTIONS, _mm_to_px, render_png
+
+CODE = "4901234567894"
+
+
+def png_size(data: bytes) -> tuple:
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    return struct.unpack(">II", data[16:24])
+
+
+@pytest.mark.parametrize("quiet_zone", [0.5, 1.0, 2.0, 6.5])
+def test_render_png_supports_narrow_quiet_zones(quiet_zone):
+    dpi = DEFAULT_OPTIONS["dpi"]
+    width, _ = png_size(render_png(CODE, quiet_zone=quiet_zone))
+    assert width == _mm_to_px(quiet_zone, dpi) * 2 + _mm_to_px(DEFAULT_OPTIONS["module_width"], dpi) * 95
+
+
+@pytest.mark.parametrize("quiet_zone", [0.5, 1.0, 2.0, 6.5])
+def test_text_rows_keep_image_width(quiet_zone):
+    # 先頭桁の文字が画像の外にはみ出しても、全行が同じ幅で描画される
+    with_text = png_size(render_png(CODE, quiet_zone=quiet_zone))
+    without_text = png_size(render_png(CODE, quiet_zone=quiet_zone, write_text=False))
+    assert with_text[0] == without_text[0]
+    assert with_text[1] > without_text[1]
+    # 画像データは「フィルタ種別1バイト + 1行分のビット列」× 行数になる
+    data = render_png(CODE, quiet_zone=quiet_zone)
+    idat = data.index(b"IDAT")
+    length = struct.unpack(">I", data[idat - 4:idat])[0]
+    raw = zlib.decompress(data[idat + 4:idat + 4 + length])
+    assert len(raw) == with_text[1] * (1 + (with_text[0] + 7) // 8)
+
+
+def test_encode_rejects_invalid_check_digit():
+    with pytest.raises(ValueError):
+        ean13_native.encode("4901234567890")